@@ -2,6 +2,7 @@
 
 import re
 import os
+import time
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
@@ -16,9 +17,11 @@ except ImportError:
 from langchain_groq import ChatGroq
 
 from tools import get_tools_for_model
-from memory import get_memory_namespace, get_memories
+from memory import get_memory_namespace, get_memories, memory_model
 from prompts import JAYLA_SYSTEM_PROMPT, JAYLA_USER_CONTEXT_KNOWN, JAYLA_USER_CONTEXT_UNKNOWN
-from rag import retrieve as rag_retrieve
+from rag import CONTEXT_MAX_TOKENS, MMR_LAMBDA, RELATIVE_CUTOFF, embedding_model as rag_embedding_model, retrieve_scored as rag_retrieve_scored
+from retrieval_gate import MIN_SIMILARITY, decide as gate_retrieval, record as record_gate
+from embeddings import embed_query
 
 MAX_CONTENT_CHARS = int(os.environ.get("PA_MAX_CONTENT_CHARS", "3500"))
 
@@ -116,20 +119,39 @@ def _get_model():
     )
 
 
+def _embed_last_user_text(text: str, model: str) -> list[float] | None:
+    """Embed text with the shared model; None when empty or embedding is unavailable (callers then skip or embed themselves)."""
+    if not text:
+        return None
+    try:
+        return embed_query(text, model)
+    except Exception as e:
+        print(f"[agent] Query embedding failed: {e}", flush=True)
+        return None
+
+
 def call_agent(state: JaylaState, config: RunnableConfig, *, store=None):
     messages = state["messages"]
     # Store comes from config if not passed (webhook/pa_cli set config["configurable"]["store"])
     store = store or (config.get("configurable") or {}).get("store")
+    last_user_text = ""
+    for m in reversed(messages):
+        if getattr(m, "type", None) == "human" and getattr(m, "content", None):
+            last_user_text = (m.content if isinstance(m.content, str) else str(m.content)).strip()
+            break
+    # Embed the last user message only when something searches with it: memory search embeds it here and the same
+    # vector feeds RAG retrieve (embeddings.py) while both stores use the same model (embedding_models.py; they differ
+    # mid-migration, then memory embeds its own). Otherwise rag embeds it after the gate, if the gate lets it through.
+    query_vector = None
     memory_context = ""
     if store:
         namespace, _ = get_memory_namespace(config)
         print(f"[agent] DEBUG: Memory store available, namespace={namespace}", flush=True)
-        last_user = next(
-            (m for m in reversed(messages) if getattr(m, "type", None) == "human"),
-            None,
-        )
-        if last_user:
-            memories = get_memories(store, namespace, str(last_user.content))
+        if last_user_text:
+            rag_model = rag_embedding_model()
+            if memory_model() == rag_model:
+                query_vector = _embed_last_user_text(last_user_text, rag_model)
+            memories = get_memories(store, namespace, last_user_text, vector=query_vector)
             memory_context = "\n".join(f"- {m}" for m in memories) if memories else ""
             print(f"[agent] DEBUG: Retrieved {len(memories)} memories", flush=True)
     conf = config.get("configurable") or {}
@@ -162,13 +184,27 @@ def call_agent(state: JaylaState, config: RunnableConfig, *, store=None):
     # DEBUG: Log datetime context
     print(f"[agent] DEBUG: datetime_context={dt_ctx}", flush=True)
     # RAG: retrieve top-k chunks for last user message and inject as document context (ONBOARDING_PLAN.md §5, Phase 3)
-    last_user_text = ""
-    for m in reversed(messages):
-        if getattr(m, "type", None) == "human" and getattr(m, "content", None):
-            last_user_text = (m.content if isinstance(m.content, str) else str(m.content)).strip()
-            break
     user_id_rag = conf.get("user_id") or os.environ.get("EMAIL", "") or (conf.get("thread_id") if isinstance(conf.get("thread_id"), str) else "")
-    doc_chunks = rag_retrieve(last_user_text, user_id=user_id_rag or None, limit=5) if last_user_text else []
+    # Gate first (retrieval_gate.py): small talk, task/calendar commands and users with no documents skip RAG
+    do_retrieve, gate_reason = gate_retrieval(last_user_text, user_id_rag or None)
+    doc_chunks = []
+    if do_retrieve:
+        t0 = time.perf_counter()
+        # Adaptive top-k (rag.select_context): similarity cutoffs, MMR against near-duplicate chunks, token budget
+        hits = rag_retrieve_scored(
+            last_user_text,
+            user_id=user_id_rag or None,
+            limit=5,
+            query_vector=query_vector,  # None: rag embeds it (or reuses query_cache's vector)
+            min_similarity=MIN_SIMILARITY,
+            relative_cutoff=RELATIVE_CUTOFF,
+            mmr_lambda=MMR_LAMBDA,
+            max_tokens=CONTEXT_MAX_TOKENS,
+        )
+        doc_chunks = [h["content"] for h in hits]
+        record_gate(True, gate_reason, (time.perf_counter() - t0) * 1000, len(doc_chunks), sum(len(c) for c in doc_chunks))
+    else:
+        record_gate(False, gate_reason)
     print(f"[agent] DEBUG: RAG retrieved {len(doc_chunks)} chunks", flush=True)
     document_context = (
         "Document context (use to ground answers):\n" + "\n\n---\n\n".join(doc_chunks)
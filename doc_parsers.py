@@ -0,0 +1,197 @@
+# Fast parsers for plain-text and structured uploads (RAG ingest, rag.py). A registry maps file extensions to
+# lightweight parsers that stream text sections (a block of lines/rows) in milliseconds, so only layout-heavy
+# formats (PDF, DOCX, PPTX) go through Docling. Each section becomes one "page" window of the streaming ingest,
+# which keeps memory bounded and lets a job resume at a section (rag._iter_page_windows).
+
+import csv
+import io
+import json
+from html.parser import HTMLParser
+from typing import Callable, Iterator
+
+# Approximate characters per section for free text (txt/md/html/json); CSV/XLSX sections are ROWS_PER_SECTION rows
+SECTION_CHARS = 20000
+ROWS_PER_SECTION = 200
+
+PARSERS: dict[str, Callable[[bytes], Iterator[str]]] = {}
+
+
+def register(*extensions: str):
+    """Decorator: register a parser (bytes -> iterator of text sections) for the given lower-case extensions."""
+    def _wrap(fn: Callable[[bytes], Iterator[str]]):
+        for ext in extensions:
+            PARSERS[ext] = fn
+        return fn
+    return _wrap
+
+
+def _extension(filename: str) -> str:
+    name = (filename or "").lower()
+    return name[name.rfind("."):] if "." in name else ""
+
+
+def parser_for(filename: str) -> Callable[[bytes], Iterator[str]] | None:
+    """Registered fast parser for filename's extension, or None (PDF/Office/unknown: Docling or fallbacks)."""
+    return PARSERS.get(_extension(filename))
+
+
+def iter_sections(bytes_content: bytes, filename: str) -> Iterator[str]:
+    """Text sections of a document with a registered parser. Raises ValueError when none is registered."""
+    parser = parser_for(filename)
+    if parser is None:
+        raise ValueError(f"No fast parser for {filename!r}")
+    for section in parser(bytes_content):
+        if section.strip():
+            yield section.strip()
+
+
+def decode_text(bytes_content: bytes) -> str:
+    """UTF-8 (with or without BOM), else Windows-1252, else Latin-1 (never fails)."""
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            return bytes_content.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return bytes_content.decode("latin-1")
+
+
+def _blocks(lines: Iterator[str], size: int = SECTION_CHARS) -> Iterator[str]:
+    """Group lines into sections of about size characters, breaking only between lines."""
+    buf: list[str] = []
+    n = 0
+    for line in lines:
+        buf.append(line)
+        n += len(line) + 1
+        if n >= size:
+            yield "\n".join(buf)
+            buf, n = [], 0
+    if buf:
+        yield "\n".join(buf)
+
+
+@register(".txt", ".text", ".log", ".md", ".markdown", ".rst")
+def parse_text(bytes_content: bytes) -> Iterator[str]:
+    yield from _blocks(iter(decode_text(bytes_content).splitlines()))
+
+
+def _rows_to_sections(rows: Iterator[list], title: str = "") -> Iterator[str]:
+    """Render rows as 'header: value | ...' lines (first non-empty row is the header), ROWS_PER_SECTION per section.
+    Every section repeats the title so a chunk keeps its context."""
+    header: list[str] | None = None
+    buf: list[str] = []
+    emitted = False
+    for row in rows:
+        cells = ["" if c is None else str(c).strip() for c in row]
+        if not any(cells):
+            continue
+        if header is None:
+            header = [c or f"column {i + 1}" for i, c in enumerate(cells)]
+            continue
+        buf.append(" | ".join(f"{h}: {v}" for h, v in zip(header, cells) if v))
+        if len(buf) >= ROWS_PER_SECTION:
+            yield "\n".join(([title] if title else []) + buf)
+            buf, emitted = [], True
+    if buf:
+        yield "\n".join(([title] if title else []) + buf)
+    elif header is not None and not emitted:
+        # Header-only table: keep the column names so the sheet is still findable
+        yield "\n".join(([title] if title else []) + [" | ".join(header)])
+
+
+@register(".csv", ".tsv")
+def parse_csv(bytes_content: bytes) -> Iterator[str]:
+    text = decode_text(bytes_content)
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    yield from _rows_to_sections(csv.reader(io.StringIO(text), dialect))
+
+
+class _TextExtractor(HTMLParser):
+    """Visible text from HTML: drops script/style/head, puts block-level elements on their own lines."""
+
+    _SKIP = {"script", "style", "head", "noscript", "template"}
+    _BLOCK = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article", "table", "ul", "ol", "pre", "blockquote"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip_depth += 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def drain(self) -> list[str]:
+        """Completed non-empty lines so far; keeps the trailing partial line for the next feed."""
+        text = "".join(self.parts)
+        lines = text.split("\n")
+        self.parts = [lines.pop()]
+        return [" ".join(line.split()) for line in lines if line.strip()]
+
+
+@register(".html", ".htm", ".xhtml")
+def parse_html(bytes_content: bytes) -> Iterator[str]:
+    text = decode_text(bytes_content)
+    extractor = _TextExtractor()
+
+    def _lines() -> Iterator[str]:
+        for i in range(0, len(text), 65536):
+            extractor.feed(text[i:i + 65536])
+            yield from extractor.drain()
+        extractor.close()
+        extractor.parts.append("\n")
+        yield from extractor.drain()
+
+    yield from _blocks(_lines())
+
+
+def _flatten_json(value, path: str = "") -> Iterator[str]:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            yield from _flatten_json(v, f"{path}.{k}" if path else str(k))
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            yield from _flatten_json(v, f"{path}[{i}]")
+    else:
+        yield f"{path or 'value'}: {'' if value is None else value}"
+
+
+@register(".json")
+def parse_json(bytes_content: bytes) -> Iterator[str]:
+    yield from _blocks(_flatten_json(json.loads(decode_text(bytes_content))))
+
+
+@register(".jsonl", ".ndjson")
+def parse_json_lines(bytes_content: bytes) -> Iterator[str]:
+    def _lines() -> Iterator[str]:
+        for n, line in enumerate(decode_text(bytes_content).splitlines()):
+            if line.strip():
+                yield from _flatten_json(json.loads(line), f"[{n}]")
+
+    yield from _blocks(_lines())
+
+
+@register(".xlsx", ".xlsm")
+def parse_xlsx(bytes_content: bytes) -> Iterator[str]:
+    # Read-only mode streams rows instead of building the whole workbook
+    from openpyxl import load_workbook
+    workbook = load_workbook(io.BytesIO(bytes_content), read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield from _rows_to_sections(sheet.iter_rows(values_only=True), f"## {sheet.title}")
+    finally:
+        workbook.close()
@@ -0,0 +1,136 @@
+# Long-lived Docling converters for RAG parsing (rag.py). Building a DocumentConverter and its first conversion
+# load the layout/table models, which costs seconds per document when done per call. Here converters are created
+# lazily, kept for the life of the process and handed out from a small pool (PA_DOCLING_POOL_SIZE) so concurrent
+# ingests do not share one pipeline. Input is an in-memory DocumentStream (no temp files). Model artifacts are
+# downloaded once to PA_DOCLING_ARTIFACTS and loaded from local disk afterwards.
+# Raises ImportError when Docling is not installed (Railway slim image); callers fall back to PyPDF2/docx2txt.
+
+import io
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+POOL_SIZE = max(1, int(os.environ.get("PA_DOCLING_POOL_SIZE", "1")))
+# Local artifact cache; empty string = let Docling use its default Hugging Face cache
+ARTIFACTS_PATH = os.environ.get(
+    "PA_DOCLING_ARTIFACTS", os.path.join(os.path.expanduser("~"), ".cache", "jayla-pa", "docling")
+)
+
+_idle: "queue.LifoQueue" = queue.LifoQueue()
+_created = 0
+_lock = threading.Lock()
+_stats: dict = {"converters": 0, "init_seconds": [], "conversions": 0, "first_convert_seconds": None, "last_convert_seconds": None}
+
+
+def _artifacts_path() -> str | None:
+    """Local model directory, downloading the Docling models into it on first use. None = Docling default cache."""
+    if not ARTIFACTS_PATH:
+        return None
+    if os.path.isdir(ARTIFACTS_PATH) and os.listdir(ARTIFACTS_PATH):
+        return ARTIFACTS_PATH
+    try:
+        from pathlib import Path
+        from docling.utils.model_downloader import download_models
+        os.makedirs(ARTIFACTS_PATH, exist_ok=True)
+        download_models(output_dir=Path(ARTIFACTS_PATH), progress=False)
+        print(f"[docling_pool] Downloaded Docling models to {ARTIFACTS_PATH}", flush=True)
+        return ARTIFACTS_PATH
+    except Exception as e:
+        # Older Docling without model_downloader, or offline: use the default cache
+        print(f"[docling_pool] Artifact cache unavailable ({e}); using Docling default.", flush=True)
+        return None
+
+
+def _new_converter():
+    from docling.document_converter import DocumentConverter
+    t0 = time.perf_counter()
+    converter = None
+    artifacts = _artifacts_path()
+    if artifacts:
+        try:
+            from docling.datamodel.base_models import InputFormat
+            from docling.datamodel.pipeline_options import PdfPipelineOptions
+            from docling.document_converter import PdfFormatOption
+            options = PdfPipelineOptions(artifacts_path=artifacts)
+            converter = DocumentConverter(format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=options)})
+        except Exception as e:
+            print(f"[docling_pool] Could not use artifacts at {artifacts} ({e}); using defaults.", flush=True)
+    if converter is None:
+        converter = DocumentConverter()
+    try:
+        # Load the PDF pipeline (layout/table models) now rather than inside the first convert()
+        from docling.datamodel.base_models import InputFormat
+        converter.initialize_pipeline(InputFormat.PDF)
+    except Exception:
+        pass
+    elapsed = time.perf_counter() - t0
+    with _lock:
+        _stats["converters"] += 1
+        _stats["init_seconds"].append(round(elapsed, 3))
+    print(f"[docling_pool] Converter ready in {elapsed:.2f}s", flush=True)
+    return converter
+
+
+@contextmanager
+def converter() -> Iterator:
+    """Check out a converter for one conversion, creating up to POOL_SIZE lazily; blocks while all are busy."""
+    global _created
+    conv = None
+    try:
+        conv = _idle.get_nowait()
+    except queue.Empty:
+        with _lock:
+            create = _created < POOL_SIZE
+            if create:
+                _created += 1
+        if create:
+            try:
+                conv = _new_converter()
+            except BaseException:
+                with _lock:
+                    _created -= 1
+                raise
+        else:
+            conv = _idle.get()
+    try:
+        yield conv
+    finally:
+        _idle.put(conv)
+
+
+def convert(bytes_content: bytes, filename: str = "document.pdf", page_range: tuple[int, int] | None = None) -> str:
+    """Convert in-memory document bytes to markdown. page_range is 1-based inclusive (Docling convention)."""
+    from docling.datamodel.base_models import DocumentStream
+    source = DocumentStream(name=os.path.basename(filename) or "document.pdf", stream=io.BytesIO(bytes_content))
+    with converter() as conv:
+        t0 = time.perf_counter()
+        if page_range:
+            result = conv.convert(source, page_range=page_range)
+        else:
+            result = conv.convert(source)
+        text = (result.document.export_to_markdown() or "").strip()
+        elapsed = time.perf_counter() - t0
+    with _lock:
+        _stats["conversions"] += 1
+        if _stats["first_convert_seconds"] is None:
+            _stats["first_convert_seconds"] = round(elapsed, 3)
+        _stats["last_convert_seconds"] = round(elapsed, 3)
+    return text
+
+
+def warm_up() -> dict | None:
+    """Create one converter (and its models) ahead of the first upload. Returns stats, or None without Docling."""
+    try:
+        with converter():
+            pass
+    except ImportError:
+        return None
+    return stats()
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, init_seconds=list(_stats["init_seconds"]), pool_size=POOL_SIZE, idle=_idle.qsize())
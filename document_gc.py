@@ -0,0 +1,290 @@
+# Expired-document garbage collector. The "week" retention choice sets documents.expires_at; rag filters expired
+# rows at query time, and sweep() deletes them: BATCH_SIZE rows per short transaction (FOR UPDATE SKIP LOCKED,
+# lock_timeout, PAUSE_MS between batches) so ingestion and searches never wait behind one long DELETE. Expired
+# document_sources rows go too (chunks a permanent upload still uses are moved to it first, as in rag.delete_document).
+# Each sweep reports rows and bytes reclaimed; when the deletions are a large share of the table it runs
+# VACUUM (ANALYZE) documents, and once deletions since the last rebuild pass REINDEX_RATIO it rebuilds the HNSW index
+# (REINDEX CONCURRENTLY; deleted rows otherwise linger in the graph and slow searches). That churn count is kept in
+# document_gc_state (sql/13-document-gc-state.sql) so restarts and several workers share it. gc_loop() runs in the
+# webhook lifespan every INTERVAL_SECONDS (PA_DOCUMENT_GC=0 disables it); a pg advisory lock keeps several
+# processes from sweeping at once. Each sweep first applies per-user storage quotas (document_usage.enforce_quotas,
+# PA_RAG_USER_QUOTA_MB), whose evicted chunks are deleted in the same pass. One-off / cron: python scripts/gc_documents.py.
+
+import asyncio
+import os
+import threading
+import time
+
+import document_usage
+
+try:
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    _HAS_PG = True
+except ImportError:
+    _HAS_PG = False
+
+ENABLED = (os.environ.get("PA_DOCUMENT_GC") or "1").strip() != "0"
+INTERVAL_SECONDS = float(os.environ.get("PA_DOCUMENT_GC_INTERVAL_SECONDS", "3600"))
+BATCH_SIZE = int(os.environ.get("PA_DOCUMENT_GC_BATCH", "500"))
+PAUSE_MS = float(os.environ.get("PA_DOCUMENT_GC_PAUSE_MS", "200"))
+MAX_BATCHES = int(os.environ.get("PA_DOCUMENT_GC_MAX_BATCHES", "200"))  # per sweep; the rest waits for the next one
+VACUUM_RATIO = float(os.environ.get("PA_DOCUMENT_GC_VACUUM_RATIO", "0.1"))
+REINDEX_RATIO = float(os.environ.get("PA_DOCUMENT_GC_REINDEX_RATIO", "0.3"))
+LOCK_TIMEOUT = "2s"
+_ADVISORY_KEY = 0x6A61_7963  # arbitrary constant shared by every process sweeping this database
+
+_state_supported = True  # False once document_gc_state is found missing: churn is then counted per process
+
+_lock = threading.Lock()
+_stats = {
+    "sweeps": 0, "rows": 0, "bytes": 0, "sources": 0, "vacuums": 0, "reindexes": 0,
+    "churn_since_reindex": 0, "last": None, "last_error": None,
+}
+
+_DELETE_CHUNKS_SQL = """WITH doomed AS (
+  SELECT id FROM documents WHERE expires_at < NOW()
+  ORDER BY expires_at LIMIT %s FOR UPDATE SKIP LOCKED
+), del AS (
+  DELETE FROM documents d USING doomed WHERE d.id = doomed.id
+  RETURNING d.user_id, pg_column_size(d.*) AS bytes
+)
+SELECT user_id, count(*) AS n, COALESCE(sum(bytes), 0) AS bytes FROM del GROUP BY user_id"""
+
+# Chunks of an expired upload that another live upload lists (content-addressed reuse) move to that upload;
+# the rest of its live chunks are detached rather than cascaded away.
+_DETACH_SQL = """UPDATE documents d SET source_id = (
+    SELECT o.id FROM document_sources o
+    WHERE o.user_id = d.user_id AND o.id <> d.source_id AND d.id = ANY(o.chunk_ids)
+      AND (o.expires_at IS NULL OR o.expires_at > NOW())
+    ORDER BY o.id LIMIT 1)
+WHERE d.source_id = ANY(%s)"""
+
+
+def _get_conn():
+    if not _HAS_PG:
+        return None
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        return None
+    try:
+        return psycopg2.connect(url, cursor_factory=RealDictCursor)
+    except Exception:
+        return None
+
+
+def needs_vacuum(deleted: int, live: int, dead: int, ratio: float = VACUUM_RATIO) -> bool:
+    """VACUUM when this sweep (or dead tuples autovacuum has not reached yet) is at least ratio of the live rows."""
+    if deleted <= 0 and dead <= 0:
+        return False
+    return max(deleted, dead) >= ratio * max(1, live)
+
+
+def needs_reindex(churn: int, live: int, ratio: float = REINDEX_RATIO) -> bool:
+    """Rebuild the HNSW index once rows deleted since the last rebuild reach ratio of the live rows."""
+    return churn > 0 and churn >= ratio * max(1, live)
+
+
+def _delete_batch(conn, batch_size: int) -> dict[str, tuple[int, int]]:
+    """Delete up to batch_size expired chunks in one transaction; {user_id: (rows, bytes)}."""
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT,))
+        cur.execute(_DELETE_CHUNKS_SQL, (batch_size,))
+        out = {r["user_id"]: (int(r["n"]), int(r["bytes"])) for r in cur.fetchall()}
+    conn.commit()
+    return out
+
+
+def _delete_sources(conn) -> tuple[int, set[str]]:
+    """Delete expired document_sources rows (after their expired chunks are gone). (rows, user_ids); (0, set())
+    without sql/10-document-sources.sql."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT,))
+            cur.execute("SELECT id FROM document_sources WHERE expires_at < NOW() FOR UPDATE SKIP LOCKED")
+            ids = [r["id"] for r in cur.fetchall()]
+            users: set[str] = set()
+            if ids:
+                cur.execute(_DETACH_SQL, (ids,))
+                cur.execute("DELETE FROM document_sources WHERE id = ANY(%s) RETURNING user_id", (ids,))
+                users = {r["user_id"] for r in cur.fetchall()}
+        conn.commit()
+        return len(ids), users
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        return 0, set()
+
+
+def _add_churn(conn, rows: int) -> int:
+    """Add rows to the deletions since the last HNSW rebuild and return the total: the shared count in
+    document_gc_state, or this process's own count without sql/13-document-gc-state.sql."""
+    global _state_supported
+    if _state_supported:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """INSERT INTO document_gc_state AS s (id, churn_since_reindex) VALUES (TRUE, %s)
+                       ON CONFLICT (id) DO UPDATE
+                       SET churn_since_reindex = s.churn_since_reindex + EXCLUDED.churn_since_reindex, updated_at = NOW()
+                       RETURNING churn_since_reindex""",
+                    (rows,),
+                )
+                churn = int(cur.fetchone()["churn_since_reindex"])
+            conn.commit()
+            with _lock:
+                _stats["churn_since_reindex"] = churn
+            return churn
+        except psycopg2.errors.UndefinedTable:
+            conn.rollback()
+            _state_supported = False
+            print("[document_gc] document_gc_state missing (run sql/13-document-gc-state.sql); churn is counted per process.", flush=True)
+    with _lock:
+        _stats["churn_since_reindex"] += rows
+        return _stats["churn_since_reindex"]
+
+
+def _reset_churn(conn) -> None:
+    with _lock:
+        _stats["churn_since_reindex"] = 0
+    if _state_supported:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE document_gc_state SET churn_since_reindex = 0, reindexed_at = NOW(), updated_at = NOW()")
+        conn.commit()
+
+
+def _table_stats(conn) -> dict:
+    with conn.cursor() as cur:
+        cur.execute(
+            """SELECT pg_total_relation_size('documents') AS total_bytes, COALESCE(s.n_live_tup, 0) AS live,
+                      COALESCE(s.n_dead_tup, 0) AS dead
+               FROM (SELECT 1) one LEFT JOIN pg_stat_user_tables s ON s.relid = 'documents'::regclass"""
+        )
+        row = dict(cur.fetchone())
+    conn.commit()
+    return row
+
+
+def _hnsw_indexes(conn) -> list[str]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'documents' AND indexdef ILIKE '%hnsw%'")
+        names = [r["indexname"] for r in cur.fetchall()]
+    conn.commit()
+    return names
+
+
+def _maintenance(conn, deleted: int, churn: int, vacuum: bool | None, reindex: bool | None) -> tuple[bool, list[str]]:
+    """Run VACUUM / REINDEX when forced (True), skipped (False) or justified by the churn (None)."""
+    table = _table_stats(conn)
+    do_vacuum = needs_vacuum(deleted, table["live"], table["dead"]) if vacuum is None else vacuum
+    do_reindex = needs_reindex(churn, table["live"]) if reindex is None else reindex
+    reindexed: list[str] = []
+    conn.autocommit = True  # VACUUM and REINDEX CONCURRENTLY cannot run inside a transaction
+    try:
+        with conn.cursor() as cur:
+            if do_vacuum:
+                t0 = time.perf_counter()
+                cur.execute("VACUUM (ANALYZE) documents")
+                print(f"[document_gc] VACUUM (ANALYZE) documents in {time.perf_counter() - t0:.1f}s", flush=True)
+            if do_reindex:
+                cur.execute("SET maintenance_work_mem = %s", (os.environ.get("PA_INDEX_MAINTENANCE_WORK_MEM", "256MB"),))
+                for name in _hnsw_indexes(conn):
+                    t0 = time.perf_counter()
+                    cur.execute(f'REINDEX INDEX CONCURRENTLY "{name}"')
+                    reindexed.append(name)
+                    print(f"[document_gc] REINDEX {name} in {time.perf_counter() - t0:.1f}s (churn {churn} rows)", flush=True)
+    finally:
+        conn.autocommit = False
+    if reindexed:
+        _reset_churn(conn)
+    with _lock:
+        _stats["vacuums"] += int(do_vacuum)
+        _stats["reindexes"] += int(bool(reindexed))
+    return do_vacuum, reindexed
+
+
+def sweep(
+    batch_size: int = BATCH_SIZE,
+    max_batches: int = MAX_BATCHES,
+    pause_ms: float = PAUSE_MS,
+    vacuum: bool | None = None,
+    reindex: bool | None = None,
+) -> dict:
+    """Delete expired chunks and uploads in bounded batches, then VACUUM / REINDEX if justified (None) or forced.
+    Returns rows, bytes (row sizes of the deleted chunks), sources, batches, users, table size before/after and
+    what maintenance ran; {"skipped": reason} without a database or while another process is sweeping."""
+    conn = _get_conn()
+    if not conn:
+        return {"skipped": "no_database"}
+    import rag
+    t0 = time.perf_counter()
+    result = {"rows": 0, "bytes": 0, "sources": 0, "batches": 0, "users": 0, "evicted": 0, "vacuumed": False, "reindexed": []}
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s) AS ok", (_ADVISORY_KEY,))
+            locked = cur.fetchone()["ok"]
+        conn.commit()
+        if not locked:
+            return {"skipped": "locked"}
+        result["table_bytes_before"] = _table_stats(conn)["total_bytes"]
+        # Users over their storage quota get their coldest chunks expired now, so this sweep reclaims them
+        result["evicted"] = document_usage.enforce_quotas(conn)["chunks"]
+        users: set[str] = set()
+        while result["batches"] < max_batches:
+            deleted = _delete_batch(conn, batch_size)
+            result["batches"] += 1
+            n = sum(rows for rows, _ in deleted.values())
+            result["rows"] += n
+            result["bytes"] += sum(b for _, b in deleted.values())
+            users.update(deleted)
+            if n < batch_size:
+                break
+            time.sleep(pause_ms / 1000.0)
+        result["sources"], source_users = _delete_sources(conn)
+        users |= source_users
+        for uid in users:
+            rag._corpus_changed(uid)
+        result["users"] = len(users)
+        churn = _add_churn(conn, result["rows"])
+        if result["rows"] or vacuum or reindex:
+            result["vacuumed"], result["reindexed"] = _maintenance(conn, result["rows"], churn, vacuum, reindex)
+        result["table_bytes_after"] = _table_stats(conn)["total_bytes"]
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_ADVISORY_KEY,))
+        conn.commit()
+    finally:
+        conn.close()
+    result["seconds"] = round(time.perf_counter() - t0, 2)
+    with _lock:
+        _stats["sweeps"] += 1
+        _stats["rows"] += result["rows"]
+        _stats["bytes"] += result["bytes"]
+        _stats["sources"] += result["sources"]
+        _stats["last"] = dict(result, at=time.time())
+    if result["rows"] or result["sources"]:
+        print(
+            f"[document_gc] Deleted {result['rows']} expired chunk(s) (~{result['bytes'] / 1e6:.1f} MB) and "
+            f"{result['sources']} upload(s) for {result['users']} user(s) in {result['batches']} batch(es), "
+            f"{result['seconds']}s.",
+            flush=True,
+        )
+    return result
+
+
+async def gc_loop(interval_seconds: float = INTERVAL_SECONDS) -> None:
+    """Sweep every interval_seconds until cancelled (first sweep right away); errors are logged, not raised."""
+    print(f"[document_gc] Sweeper started (every {interval_seconds:.0f}s).", flush=True)
+    while True:
+        try:
+            await asyncio.to_thread(sweep)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            with _lock:
+                _stats["last_error"] = f"{type(e).__name__}: {e}"
+            print(f"[document_gc] Sweep failed: {e}", flush=True)
+        await asyncio.sleep(interval_seconds)
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, enabled=ENABLED, interval_seconds=INTERVAL_SECONDS, batch_size=BATCH_SIZE)
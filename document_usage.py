@@ -0,0 +1,235 @@
+# Retrieval hit tracking and per-user storage quotas (sql/11-document-hits.sql). rag.retrieve_scored calls record()
+# with the chunk ids it returned: a dict update under a lock, no I/O on the retrieve path. flush() upserts the
+# buffered counts into document_hits in one batched statement; flush_loop() runs it every FLUSH_SECONDS in the
+# webhook lifespan (and a background flush starts early once MAX_PENDING chunks are waiting). Hits still buffered when
+# a process dies are lost, which only makes those chunks look slightly colder.
+# enforce_quotas() (called by document_gc.sweep) finds users whose live chunks exceed QUOTA_MB and offloads their
+# coldest chunks (oldest last hit, else oldest upload; fewest hits breaks ties) by setting expires_at = NOW(): they
+# leave search at once and document_gc deletes them in batches. Chunks younger than GRACE_DAYS are never evicted.
+# PA_RAG_USER_QUOTA_MB=0 (default) disables quotas; hit tracking is on unless PA_RAG_HIT_TRACKING=0.
+
+import asyncio
+import os
+import threading
+import time
+
+try:
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    _HAS_PG = True
+except ImportError:
+    _HAS_PG = False
+
+TRACKING = (os.environ.get("PA_RAG_HIT_TRACKING") or "1").strip() != "0"
+FLUSH_SECONDS = float(os.environ.get("PA_RAG_HIT_FLUSH_SECONDS", "30"))
+MAX_PENDING = int(os.environ.get("PA_RAG_HIT_MAX_PENDING", "5000"))
+QUOTA_MB = float(os.environ.get("PA_RAG_USER_QUOTA_MB", "0"))
+GRACE_DAYS = float(os.environ.get("PA_RAG_QUOTA_GRACE_DAYS", "7"))
+
+_pending: dict[int, list] = {}  # document id -> [user_id, hits, last hit epoch]
+_lock = threading.Lock()
+_flushing = False
+_hits_supported = True
+_stats = {"recorded": 0, "flushed": 0, "flushes": 0, "dropped": 0, "evicted_chunks": 0, "evicted_bytes": 0, "last_error": None}
+
+_FLUSH_SQL = """INSERT INTO document_hits (document_id, user_id, hit_count, last_hit_at)
+SELECT v.document_id, v.user_id, v.hits, v.last_hit
+FROM (VALUES %s) AS v(document_id, user_id, hits, last_hit)
+JOIN documents d ON d.id = v.document_id
+ON CONFLICT (document_id) DO UPDATE SET
+  hit_count = document_hits.hit_count + EXCLUDED.hit_count,
+  last_hit_at = GREATEST(document_hits.last_hit_at, EXCLUDED.last_hit_at)"""
+
+_OVER_QUOTA_SQL = """SELECT user_id, count(*) AS chunks, sum(pg_column_size(d.*)) AS bytes
+FROM documents d WHERE expires_at IS NULL OR expires_at > NOW()
+GROUP BY user_id HAVING sum(pg_column_size(d.*)) > %s
+ORDER BY bytes DESC"""
+
+# Running total of chunk sizes from the hottest chunk down; every chunk past the quota is offloaded (coldest first)
+_EVICT_SQL = """WITH ranked AS (
+  SELECT d.id, d.created_at, pg_column_size(d.*) AS bytes,
+         sum(pg_column_size(d.*)) OVER (
+           ORDER BY COALESCE(h.last_hit_at, d.created_at) DESC, COALESCE(h.hit_count, 0) DESC, d.id DESC
+         ) AS running
+  FROM documents d LEFT JOIN document_hits h ON h.document_id = d.id
+  WHERE d.user_id = %(user_id)s AND (d.expires_at IS NULL OR d.expires_at > NOW())
+)
+UPDATE documents d SET expires_at = NOW()
+FROM ranked r
+WHERE d.id = r.id AND r.running > %(quota)s AND r.created_at < NOW() - make_interval(secs => %(grace)s)
+RETURNING r.bytes"""
+
+# Uploads left without any live chunk expire too, so listings match what search can still find
+_EXPIRE_EMPTY_SOURCES_SQL = """UPDATE document_sources s SET expires_at = NOW(), updated_at = NOW()
+WHERE s.user_id = %s AND (s.expires_at IS NULL OR s.expires_at > NOW()) AND s.status = 'ready'
+  AND NOT EXISTS (
+    SELECT 1 FROM documents d WHERE d.id = ANY(s.chunk_ids) AND (d.expires_at IS NULL OR d.expires_at > NOW()))"""
+
+
+def _get_conn():
+    if not _HAS_PG:
+        return None
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        return None
+    try:
+        return psycopg2.connect(url, cursor_factory=RealDictCursor)
+    except Exception:
+        return None
+
+
+def record(user_id: str, document_ids: list[int]) -> None:
+    """Count one retrieval hit for each documents row id (session chunks, with negative ids, are ignored)."""
+    global _flushing
+    if not TRACKING or not _hits_supported or not document_ids:
+        return
+    now = time.time()
+    with _lock:
+        for doc_id in document_ids:
+            if doc_id is None or doc_id <= 0:
+                continue
+            entry = _pending.get(doc_id)
+            if entry is None:
+                _pending[doc_id] = [user_id, 1, now]
+            else:
+                entry[1] += 1
+                entry[2] = now
+            _stats["recorded"] += 1
+        start = len(_pending) >= MAX_PENDING and not _flushing
+        if start:
+            _flushing = True
+    if start:
+        threading.Thread(target=flush, daemon=True, name="hit-flush").start()
+
+
+def flush() -> int:
+    """Upsert buffered hits into document_hits in one batch. Returns rows written; on failure the batch is put back
+    (up to MAX_PENDING chunks, the rest is dropped)."""
+    global _flushing, _hits_supported
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    try:
+        if not batch:
+            return 0
+        conn = _get_conn()
+        if not conn:
+            with _lock:
+                _stats["dropped"] += len(batch)
+            return 0
+        try:
+            from psycopg2.extras import execute_values
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
+                    _FLUSH_SQL,
+                    [(doc_id, uid, hits, last) for doc_id, (uid, hits, last) in sorted(batch.items())],
+                    template="(%s::bigint, %s::text, %s::bigint, to_timestamp(%s))",
+                    page_size=1000,
+                )
+            conn.commit()
+        finally:
+            conn.close()
+        with _lock:
+            _stats["flushed"] += len(batch)
+            _stats["flushes"] += 1
+        return len(batch)
+    except Exception as e:
+        if "document_hits" in str(e) and "does not exist" in str(e):
+            _hits_supported = False
+            print("[document_usage] document_hits missing (run sql/11-document-hits.sql); hit tracking off.", flush=True)
+            return 0
+        with _lock:
+            _stats["last_error"] = f"{type(e).__name__}: {e}"
+            for doc_id, (uid, hits, last) in batch.items():
+                if len(_pending) >= MAX_PENDING:
+                    _stats["dropped"] += 1
+                    continue
+                entry = _pending.setdefault(doc_id, [uid, 0, last])
+                entry[1] += hits
+                entry[2] = max(entry[2], last)
+        print(f"[document_usage] Hit flush failed ({len(batch)} chunk(s) kept for the next flush): {e}", flush=True)
+        return 0
+    finally:
+        with _lock:
+            _flushing = False
+
+
+async def flush_loop(interval_seconds: float = FLUSH_SECONDS) -> None:
+    """Flush buffered hits every interval_seconds until cancelled (the webhook flushes once more on shutdown)."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await asyncio.to_thread(flush)
+
+
+def enforce_quotas(conn=None, quota_mb: float | None = None, grace_days: float | None = None) -> dict:
+    """Offload the coldest chunks of every user over quota_mb (default QUOTA_MB; 0 = no quota). Uses conn when given
+    (commits per user), else its own connection. Returns {"users": {user_id: (chunks, bytes)}, "chunks", "bytes"}."""
+    quota_mb = QUOTA_MB if quota_mb is None else quota_mb
+    grace_days = GRACE_DAYS if grace_days is None else grace_days
+    result = {"users": {}, "chunks": 0, "bytes": 0}
+    if quota_mb <= 0:
+        return result
+    own = conn is None
+    conn = conn or _get_conn()
+    if not conn:
+        return result
+    import rag
+    quota = int(quota_mb * 1024 * 1024)
+    flush()  # rank with the latest hits
+    try:
+        with conn.cursor() as cur:
+            cur.execute(_OVER_QUOTA_SQL, (quota,))
+            over = cur.fetchall()
+        conn.commit()
+        for row in over:
+            user_id = row["user_id"]
+            with conn.cursor() as cur:
+                cur.execute(_EVICT_SQL, {"user_id": user_id, "quota": quota, "grace": grace_days * 86400})
+                sizes = [int(r["bytes"]) for r in cur.fetchall()]
+                if sizes:
+                    try:
+                        cur.execute("SAVEPOINT sources")
+                        cur.execute(_EXPIRE_EMPTY_SOURCES_SQL, (user_id,))
+                    except Exception:
+                        cur.execute("ROLLBACK TO SAVEPOINT sources")  # no document_sources table (sql/10)
+            conn.commit()
+            if sizes:
+                rag._corpus_changed(user_id)
+                result["users"][user_id] = (len(sizes), sum(sizes))
+                result["chunks"] += len(sizes)
+                result["bytes"] += sum(sizes)
+                print(
+                    f"[document_usage] {user_id} over {quota_mb:.0f} MB quota ({int(row['bytes']) / 1e6:.1f} MB): "
+                    f"offloaded {len(sizes)} cold chunk(s), {sum(sizes) / 1e6:.1f} MB",
+                    flush=True,
+                )
+    finally:
+        if own:
+            conn.close()
+    with _lock:
+        _stats["evicted_chunks"] += result["chunks"]
+        _stats["evicted_bytes"] += result["bytes"]
+    return result
+
+
+def usage(conn, user_id: str | None = None, limit: int = 20) -> list[dict]:
+    """Per-user live chunks, bytes, chunks never hit and the latest hit (largest users first)."""
+    where = "AND d.user_id = %(user_id)s" if user_id else ""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""SELECT d.user_id, count(*) AS chunks, sum(pg_column_size(d.*)) AS bytes,
+                       count(*) FILTER (WHERE h.document_id IS NULL) AS never_hit, max(h.last_hit_at) AS last_hit
+                FROM documents d LEFT JOIN document_hits h ON h.document_id = d.id
+                WHERE (d.expires_at IS NULL OR d.expires_at > NOW()) {where}
+                GROUP BY d.user_id ORDER BY bytes DESC LIMIT %(limit)s""",
+            {"user_id": user_id, "limit": limit},
+        )
+        rows = [dict(r) for r in cur.fetchall()]
+    conn.commit()
+    return rows
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, tracking=TRACKING and _hits_supported, pending=len(_pending), quota_mb=QUOTA_MB)
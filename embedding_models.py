@@ -0,0 +1,102 @@
+# Active embedding model per vector store (sql/12-embedding-models.sql): which model produced documents.embedding
+# ("documents") and the long-term memory vectors ("memory"), with their dimension and location (column or Qdrant
+# collection). scripts/migrate_embeddings.py backfills a second column / collection with a new model while readers
+# keep using this row, then switches the row (for documents in the same transaction as the column swap), so every
+# process embeds queries with the model that produced the vectors it searches. Rows are cached for TTL_SECONDS:
+# active(target, conn) re-reads on the caller's connection once stale; active(target) without a connection returns
+# the stale row and refreshes it in the background. Without the table or DATABASE_URL, the defaults are
+# embeddings.DEFAULT_MODEL / EMBEDDING_DIM (PA_EMBED_MODEL / PA_EMBED_DIM).
+
+import os
+import threading
+import time
+
+from embeddings import DEFAULT_MODEL, EMBEDDING_DIM
+
+TTL_SECONDS = float(os.environ.get("PA_EMBED_MODEL_TTL", "30"))
+DEFAULT_LOCATIONS = {"documents": "embedding", "memory": "long_term_memory"}
+
+_cache: dict[str, tuple[dict, float]] = {}
+_refreshing: set[str] = set()
+_lock = threading.Lock()
+
+
+def defaults(target: str) -> dict:
+    return {"target": target, "model": DEFAULT_MODEL, "dim": EMBEDDING_DIM, "location": DEFAULT_LOCATIONS.get(target, "")}
+
+
+def read(conn, target: str) -> dict | None:
+    """The embedding_models row for target (model, dim, location and any next_* migration in progress), or None
+    when there is no row or no table. conn must use RealDictCursor; its transaction is ended either way."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT target, model, dim, location, next_model, next_dim, next_location, switched_at
+                   FROM embedding_models WHERE target = %s""",
+                (target,),
+            )
+            row = cur.fetchone()
+        conn.commit()
+        return dict(row) if row else None
+    except Exception as e:
+        conn.rollback()
+        if "embedding_models" not in str(e):
+            raise
+        return None
+
+
+def _get_conn():
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        return None
+    try:
+        import psycopg2
+        from psycopg2.extras import RealDictCursor
+        return psycopg2.connect(url, cursor_factory=RealDictCursor)
+    except Exception:
+        return None
+
+
+def _load(target: str, conn=None) -> dict:
+    own = conn is None
+    conn = conn or _get_conn()
+    info = None
+    try:
+        if conn is not None:
+            info = read(conn, target)
+    except Exception as e:
+        print(f"[embedding_models] Could not read {target} model: {e}", flush=True)
+        cached = _cache.get(target)
+        info = cached[0] if cached else None
+    finally:
+        if own and conn is not None:
+            conn.close()
+        with _lock:
+            _refreshing.discard(target)
+    info = dict(defaults(target), **{k: v for k, v in (info or {}).items() if v is not None})
+    with _lock:
+        _cache[target] = (info, time.time())
+    return info
+
+
+def active(target: str, conn=None) -> dict:
+    """{"model", "dim", "location", ...} in use for target ("documents" or "memory")."""
+    now = time.time()
+    with _lock:
+        cached = _cache.get(target)
+        if cached is not None and now - cached[1] < TTL_SECONDS:
+            return cached[0]
+        background = conn is None and cached is not None
+        if background:
+            if target in _refreshing:
+                return cached[0]
+            _refreshing.add(target)
+    if background:
+        threading.Thread(target=_load, args=(target,), daemon=True, name="embedding-model-refresh").start()
+        return cached[0]
+    return _load(target, conn)
+
+
+def invalidate() -> None:
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,98 @@
+# Optional shared embedding server: one sentence-transformers model for every uvicorn worker on the host.
+# Workers set PA_EMBED_SOCKET to the same path; embeddings.submit_texts() then encodes here and falls back to
+# in-process embedding when the socket is unreachable. See embeddings.py.
+#
+# Run before uvicorn (same container):
+#   python embedding_server.py --socket /tmp/jayla-embed.sock &
+#   PA_EMBED_SOCKET=/tmp/jayla-embed.sock uvicorn telegram_bot.webhook:app --workers 4
+#
+# Protocol (one request per line, many per connection): JSON request line
+#   {"op": "embed", "model": "all-mpnet-base-v2", "texts": [...]}  or  {"op": "ping"}
+# → JSON header line {"n": N, "dim": D, "bytes": N*D*4} followed by N*D native float32 values
+#   (ping: header only; failures: {"error": "..."}).
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from array import array
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+import embeddings
+
+DEFAULT_SOCKET = "/tmp/jayla-embed.sock"
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                req = json.loads(line)
+                op = req.get("op", "embed")
+                name = req.get("model") or embeddings.DEFAULT_MODEL
+                if op == "ping":
+                    header = {"ok": True, "model": name, "bytes": 0, "stats": embeddings.load_stats()}
+                    body = b""
+                elif op == "embed":
+                    texts = [str(t) for t in (req.get("texts") or [])]
+                    # Server-side executor micro-batches requests from all connected workers into shared encodes.
+                    # Cancelling this task (client gone) cancels the queued future; the executor skips it unencoded.
+                    vectors = await asyncio.wrap_future(embeddings.get_executor(name).submit(texts))
+                    dim = len(vectors[0]) if vectors else 0
+                    flat = array("f")
+                    for v in vectors:
+                        flat.extend(v)
+                    body = flat.tobytes()
+                    header = {"n": len(vectors), "dim": dim, "bytes": len(body)}
+                else:
+                    header, body = {"error": f"unknown op {op!r}"}, b""
+            except Exception as e:
+                header, body = {"error": f"{type(e).__name__}: {e}"}, b""
+            writer.write(json.dumps(header).encode("utf-8") + b"\n" + body)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(path: str = DEFAULT_SOCKET, model: str = embeddings.DEFAULT_MODEL) -> None:
+    """Load the model once, then serve embed requests on a Unix domain socket until cancelled."""
+    # Never route our own encodes back to the socket
+    os.environ.pop("PA_EMBED_SOCKET", None)
+    await asyncio.get_running_loop().run_in_executor(None, embeddings.warm_up, model)
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(_handle, path=path)
+    os.chmod(path, 0o660)
+    print(f"[embedding_server] Serving {model} on {path}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Shared embedding server for jayla-pa uvicorn workers.")
+    parser.add_argument("--socket", default=os.environ.get("PA_EMBED_SOCKET") or DEFAULT_SOCKET)
+    parser.add_argument("--model", default=embeddings.DEFAULT_MODEL)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.socket, args.model))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
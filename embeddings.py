@@ -0,0 +1,316 @@
+# Process-wide embedding service shared by RAG (rag.py) and long-term memory (memory.py). See PERSONAL_ASSISTANT_PATTERNS.md §8.5, C.6.
+# One SentenceTransformer per model name per process: loaded lazily (thread-safe) and warmed in webhook _lifespan
+# so the first Telegram message does not pay the multi-second model load. Encodes run on one dedicated worker
+# thread that micro-batches concurrent requests (EmbeddingExecutor). Optionally, several uvicorn workers share one
+# out-of-process model via embedding_server.py over a Unix socket (PA_EMBED_SOCKET), falling back to in-process.
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Model for a new install: all-mpnet-base-v2 (768d, as created by sql/2-rag-documents.sql and scripts/init_qdrant.py).
+# Once stores hold vectors, embedding_models.py records which model produced them; change models with
+# scripts/migrate_embeddings.py rather than by editing these (PA_EMBED_MODEL then only picks what is warmed up).
+DEFAULT_MODEL = (os.environ.get("PA_EMBED_MODEL") or "all-mpnet-base-v2").strip()
+EMBEDDING_DIM = int(os.environ.get("PA_EMBED_DIM", "768"))
+
+# Micro-batching: requests arriving within this window are encoded together (see EmbeddingExecutor)
+BATCH_WINDOW_MS = float(os.environ.get("PA_EMBED_BATCH_WINDOW_MS", "5"))
+MAX_BATCH = int(os.environ.get("PA_EMBED_MAX_BATCH", "64"))
+# torch intra-op threads for the embedding worker; 0 = leave torch default. Keeps the uvicorn worker from oversubscribing.
+TORCH_THREADS = int(os.environ.get("PA_EMBED_TORCH_THREADS", str(min(4, os.cpu_count() or 1))))
+
+# Client timeout for the optional shared embedding server (PA_EMBED_SOCKET, see embedding_server.py)
+REMOTE_TIMEOUT_S = float(os.environ.get("PA_EMBED_SOCKET_TIMEOUT", "30"))
+
+# Backend: "torch" (default) or "onnx" = int8-quantized ONNX export of the same model (same 768d output, so
+# EMBEDDING_DIM / memory.VECTOR_SIZE stay valid; needs sentence-transformers[onnx]). Falls back to torch if unavailable.
+BACKEND = (os.environ.get("PA_EMBED_BACKEND") or "torch").strip().lower()
+ONNX_FILE = os.environ.get("PA_EMBED_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+
+_models: dict = {}
+_executors: dict[str, "EmbeddingExecutor"] = {}
+_remote_pool = None
+_load_stats: dict[str, dict] = {}
+_lock = threading.RLock()
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MB (0.0 when unavailable, e.g. non-Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except Exception:
+        pass
+    try:
+        import resource
+        # ru_maxrss is peak KB on Linux; best effort elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except Exception:
+        return 0.0
+
+
+def _load(name: str, backend: str):
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(name, backend="onnx", model_kwargs={"file_name": ONNX_FILE}), "onnx"
+        except Exception as e:
+            # ImportError (no onnxruntime/optimum), missing export file, or an old sentence-transformers without backend=
+            print(f"[embeddings] ONNX backend unavailable for {name} ({e}); using torch.", flush=True)
+    return SentenceTransformer(name), "torch"
+
+
+def model_key(name: str, backend: str) -> str:
+    """Registry / load_stats() key for a model and backend."""
+    return name if backend == "torch" else f"{name}:{backend}"
+
+
+def get_model(name: str = DEFAULT_MODEL, backend: str | None = None):
+    """Return the shared SentenceTransformer for name, loading it once per process.
+    backend defaults to PA_EMBED_BACKEND ("torch" or "onnx").
+    Raises ImportError when sentence-transformers is not installed (e.g. Railway slim image)."""
+    key = model_key(name, backend or BACKEND)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _lock:
+        model = _models.get(key)
+        if model is not None:
+            return model
+        rss_before = _rss_mb()
+        t0 = time.perf_counter()
+        model, used = _load(name, backend or BACKEND)
+        load_s = time.perf_counter() - t0
+        rss_after = _rss_mb()
+        _load_stats[key] = {
+            "model": name,
+            "backend": used,
+            "load_seconds": round(load_s, 3),
+            "rss_before_mb": round(rss_before, 1),
+            "rss_after_mb": round(rss_after, 1),
+            "rss_delta_mb": round(rss_after - rss_before, 1),
+        }
+        _models[key] = model
+        print(
+            f"[embeddings] Loaded {name} ({used}) in {load_s:.2f}s (RSS {rss_before:.0f} MB -> {rss_after:.0f} MB)",
+            flush=True,
+        )
+        return model
+
+
+def is_loaded(name: str = DEFAULT_MODEL, backend: str | None = None) -> bool:
+    return model_key(name, backend or BACKEND) in _models
+
+
+def load_stats() -> dict[str, dict]:
+    """Load time and resident memory per loaded model (for logs / health checks)."""
+    return {k: dict(v) for k, v in _load_stats.items()}
+
+
+def _to_lists(vectors) -> list[list[float]]:
+    return vectors.tolist() if hasattr(vectors, "tolist") else [list(v) for v in vectors]
+
+
+class EmbeddingExecutor:
+    """Dedicated worker thread that micro-batches encode requests.
+
+    Requests arriving within BATCH_WINDOW_MS of each other (up to MAX_BATCH texts) are encoded in one
+    model.encode call, so concurrent chats share a forward pass instead of oversubscribing torch threads.
+    submit() returns a concurrent.futures.Future resolving to one vector per input text."""
+
+    def __init__(self, name: str = DEFAULT_MODEL, window_ms: float | None = None, max_batch: int | None = None, torch_threads: int | None = None):
+        self.name = name
+        self.window_s = (window_ms if window_ms is not None else BATCH_WINDOW_MS) / 1000.0
+        self.max_batch = max_batch or MAX_BATCH
+        self.torch_threads = torch_threads if torch_threads is not None else TORCH_THREADS
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+
+    def submit(self, texts: list[str]) -> Future:
+        fut: Future = Future()
+        if not texts:
+            fut.set_result([])
+            return fut
+        self._ensure_started()
+        self._queue.put(([t or " " for t in texts], fut))
+        return fut
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"embed-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> list[tuple[list[str], Future]]:
+        batch = [self._queue.get()]
+        count = len(batch[0][0])
+        deadline = time.monotonic() + self.window_s
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            count += len(item[0])
+        return batch
+
+    def _run(self) -> None:
+        if self.torch_threads > 0:
+            try:
+                import torch
+                torch.set_num_threads(self.torch_threads)
+            except Exception:
+                pass
+        while True:
+            # Claim each future; ones cancelled while queued (client gone) are dropped and can no longer be cancelled
+            batch = [(texts, fut) for texts, fut in self._collect() if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            flat = [t for texts, _ in batch for t in texts]
+            try:
+                vectors = _to_lists(get_model(self.name).encode(flat, show_progress_bar=False))
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(flat)
+            start = 0
+            for texts, fut in batch:
+                fut.set_result(vectors[start:start + len(texts)])
+                start += len(texts)
+
+
+def get_executor(name: str = DEFAULT_MODEL) -> EmbeddingExecutor:
+    """Return the per-process EmbeddingExecutor for name (one worker thread per model)."""
+    executor = _executors.get(name)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = _executors[name] = EmbeddingExecutor(name)
+    return executor
+
+
+def _remote_socket() -> str:
+    """Path of the shared embedding server socket (embedding_server.py), or "" when not configured."""
+    return (os.environ.get("PA_EMBED_SOCKET") or "").strip()
+
+
+def _remote_request(path: str, payload: dict, timeout: float = REMOTE_TIMEOUT_S) -> tuple[dict, bytes]:
+    """One request/response on the embedding server socket: JSON line out; JSON header line (+ raw body) back."""
+    import json
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as f:
+            header = json.loads(f.readline() or b"{}")
+            size = int(header.get("bytes") or 0)
+            body = f.read(size) if size else b""
+    if "error" in header:
+        raise RuntimeError(f"embedding server: {header['error']}")
+    if len(body) != size:
+        raise OSError("embedding server closed the connection mid-response")
+    return header, body
+
+
+def _remote_embed(path: str, texts: list[str], name: str) -> list[list[float]]:
+    """Embed via the shared server; falls back to the in-process executor when the server is unreachable."""
+    from array import array
+    try:
+        header, body = _remote_request(path, {"op": "embed", "model": name, "texts": texts})
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"[embeddings] Embedding server at {path} unavailable ({e}); embedding in-process.", flush=True)
+        return get_executor(name).submit(texts).result()
+    flat = array("f")
+    flat.frombytes(body)
+    dim = int(header["dim"])
+    values = flat.tolist()
+    return [values[i:i + dim] for i in range(0, len(values), dim)]
+
+
+def _get_remote_pool():
+    global _remote_pool
+    if _remote_pool is None:
+        with _lock:
+            if _remote_pool is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _remote_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="embed-client")
+    return _remote_pool
+
+
+def submit_texts(texts: list[str], name: str = DEFAULT_MODEL) -> Future:
+    """Queue texts for a batched encode; the Future resolves to list[list[float]] (or raises ImportError
+    when sentence-transformers is missing). Lets callers overlap e.g. the Neon connect with the encode.
+    When PA_EMBED_SOCKET is set, encodes on the shared embedding server (one model for all uvicorn workers)."""
+    path = _remote_socket()
+    if path and texts:
+        return _get_remote_pool().submit(_remote_embed, path, [t or " " for t in texts], name)
+    return get_executor(name).submit(texts)
+
+
+def submit_query(text: str, name: str = DEFAULT_MODEL) -> Future:
+    """Like submit_texts for one text; the Future resolves to a single vector."""
+    inner = submit_texts([text], name)
+    outer: Future = Future()
+
+    def _done(f: Future) -> None:
+        exc = f.exception()
+        if exc is not None:
+            outer.set_exception(exc)
+        else:
+            outer.set_result(f.result()[0])
+
+    inner.add_done_callback(_done)
+    return outer
+
+
+def embed_texts(texts: list[str], name: str = DEFAULT_MODEL) -> list[list[float]]:
+    """Embed a batch of texts with the shared model. Raises ImportError when sentence-transformers is missing."""
+    return submit_texts(texts, name).result()
+
+
+def embed_query(text: str, name: str = DEFAULT_MODEL) -> list[float]:
+    """Embed one query (e.g. the last user message). Embed once per turn and pass the vector to
+    memory.get_memories(..., vector=) and rag.retrieve(..., query_vector=)."""
+    return embed_texts([text], name)[0]
+
+
+def warm_up(name: str = DEFAULT_MODEL) -> dict | None:
+    """Load the model and run one tiny encode so the first real request is fast.
+    Returns load stats (plus first-encode time), or None when sentence-transformers is not installed.
+    With PA_EMBED_SOCKET set, pings the shared embedding server instead of loading a model in this worker."""
+    path = _remote_socket()
+    if path:
+        try:
+            header, _ = _remote_request(path, {"op": "ping"})
+            print(f"[embeddings] Using embedding server at {path}: {header}", flush=True)
+            return header
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"[embeddings] Embedding server at {path} not reachable ({e}); warming in-process model.", flush=True)
+    try:
+        get_model(name)
+    except ImportError:
+        print("[embeddings] sentence-transformers not installed; skipping warm-up.", flush=True)
+        return None
+    t0 = time.perf_counter()
+    get_executor(name).submit(["warm up"]).result()  # also starts the batching worker (and applies PA_EMBED_TORCH_THREADS)
+    stats = dict(_load_stats.get(model_key(name, BACKEND)) or {"model": name})
+    stats["first_encode_seconds"] = round(time.perf_counter() - t0, 3)
+    stats["rss_mb"] = round(_rss_mb(), 1)
+    print(f"[embeddings] Warm-up done: {stats}", flush=True)
+    return stats
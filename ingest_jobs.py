@@ -0,0 +1,221 @@
+# Durable document ingestion queue (sql/9-ingest-jobs.sql). The Telegram webhook enqueues a job and returns at once;
+# worker_loop() runs inside the app and claims jobs with FOR UPDATE SKIP LOCKED, so several uvicorn workers can share
+# the queue and a redelivered update (same update_id) never ingests the same document twice.
+# Progress (resume_page, document_ids) is saved after each committed page window; a job whose worker died is
+# reclaimed after PA_INGEST_JOB_STALE_SECONDS and resumes from its last page window (rag.ingest_document start_page).
+
+import asyncio
+import os
+from typing import Awaitable, Callable
+
+try:
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    _HAS_PG = True
+except ImportError:
+    _HAS_PG = False
+
+POLL_SECONDS = float(os.environ.get("PA_INGEST_POLL_SECONDS", "5"))
+STALE_SECONDS = int(os.environ.get("PA_INGEST_JOB_STALE_SECONDS", "900"))
+MAX_ATTEMPTS = int(os.environ.get("PA_INGEST_JOB_MAX_ATTEMPTS", "3"))
+
+_wake: asyncio.Event | None = None
+_wake_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _get_conn():
+    if not _HAS_PG:
+        return None
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        return None
+    try:
+        return psycopg2.connect(url, cursor_factory=RealDictCursor)
+    except Exception:
+        return None
+
+
+def enqueue(
+    chat_id: str,
+    user_id: str,
+    file_id: str,
+    filename: str = "",
+    file_unique_id: str | None = None,
+    update_id: int | None = None,
+) -> tuple[int | None, bool]:
+    """Queue a document for ingestion. Returns (job_id, created). created=False means the update was redelivered or
+    the same file is already queued/running for this chat. job_id is None when the queue is unavailable (no DB)."""
+    conn = _get_conn()
+    if not conn:
+        return (None, False)
+    try:
+        with conn.cursor() as cur:
+            if file_unique_id:
+                cur.execute(
+                    """SELECT id FROM ingest_jobs WHERE chat_id = %s AND file_unique_id = %s
+                       AND status IN ('queued', 'running') LIMIT 1""",
+                    (chat_id, file_unique_id),
+                )
+                row = cur.fetchone()
+                if row:
+                    return (row["id"], False)
+            cur.execute(
+                """INSERT INTO ingest_jobs (chat_id, user_id, file_id, file_unique_id, filename, update_id)
+                   VALUES (%s, %s, %s, %s, %s, %s)
+                   ON CONFLICT (update_id) DO NOTHING RETURNING id""",
+                (chat_id, user_id, file_id, file_unique_id, filename, update_id),
+            )
+            row = cur.fetchone()
+            if not row:
+                cur.execute("SELECT id FROM ingest_jobs WHERE update_id = %s", (update_id,))
+                existing = cur.fetchone()
+                conn.commit()
+                return (existing["id"] if existing else None, False)
+        conn.commit()
+        notify()
+        return (row["id"], True)
+    except Exception as e:
+        print(f"[ingest_jobs] enqueue error: {e}", flush=True)
+        return (None, False)
+    finally:
+        conn.close()
+
+
+def claim() -> dict | None:
+    """Claim the oldest queued job (or a running job whose worker stopped heartbeating). Returns the job row or None."""
+    conn = _get_conn()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cur:
+            # Stale jobs that already used every attempt are given up rather than retried forever
+            cur.execute(
+                """UPDATE ingest_jobs SET status = 'failed', result = COALESCE(result, 'Gave up after repeated failures.'),
+                          updated_at = NOW()
+                   WHERE status = 'running' AND attempts >= %s AND locked_at < NOW() - make_interval(secs => %s)""",
+                (MAX_ATTEMPTS, STALE_SECONDS),
+            )
+            cur.execute(
+                """UPDATE ingest_jobs SET status = 'running', attempts = attempts + 1, locked_at = NOW(), updated_at = NOW()
+                   WHERE id = (
+                     SELECT id FROM ingest_jobs
+                     WHERE (status = 'queued' OR (status = 'running' AND locked_at < NOW() - make_interval(secs => %s)))
+                       AND attempts < %s
+                     ORDER BY created_at
+                     FOR UPDATE SKIP LOCKED
+                     LIMIT 1
+                   )
+                   RETURNING *""",
+                (STALE_SECONDS, MAX_ATTEMPTS),
+            )
+            row = cur.fetchone()
+        conn.commit()
+        return dict(row) if row else None
+    except Exception as e:
+        print(f"[ingest_jobs] claim error: {e}", flush=True)
+        return None
+    finally:
+        conn.close()
+
+
+def save_progress(job_id: int, resume_page: int, total_pages: int | None, document_ids: list[int]) -> None:
+    """Record the last committed page window; also refreshes locked_at so a long job is not reclaimed as stale."""
+    conn = _get_conn()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """UPDATE ingest_jobs SET resume_page = %s, total_pages = %s, document_ids = %s,
+                          locked_at = NOW(), updated_at = NOW()
+                   WHERE id = %s""",
+                (resume_page, total_pages, list(document_ids), job_id),
+            )
+        conn.commit()
+    except Exception as e:
+        print(f"[ingest_jobs] save_progress error: {e}", flush=True)
+    finally:
+        conn.close()
+
+
+def finish(job_id: int, result: str, document_ids: list[int], failed: bool = False) -> None:
+    """Mark a job done (or failed, for a permanent error such as an unparseable file)."""
+    conn = _get_conn()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """UPDATE ingest_jobs SET status = %s, result = %s, document_ids = %s, locked_at = NULL, updated_at = NOW()
+                   WHERE id = %s""",
+                ("failed" if failed else "done", result, list(document_ids), job_id),
+            )
+        conn.commit()
+    except Exception as e:
+        print(f"[ingest_jobs] finish error: {e}", flush=True)
+    finally:
+        conn.close()
+
+
+def release(job_id: int, error: str) -> bool:
+    """Return a job that hit a transient error to the queue, or fail it once MAX_ATTEMPTS is used. True if requeued."""
+    conn = _get_conn()
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """UPDATE ingest_jobs SET status = CASE WHEN attempts < %s THEN 'queued' ELSE 'failed' END,
+                          result = %s, locked_at = NULL, updated_at = NOW()
+                   WHERE id = %s RETURNING status""",
+                (MAX_ATTEMPTS, error[:500], job_id),
+            )
+            row = cur.fetchone()
+        conn.commit()
+        return bool(row and row["status"] == "queued")
+    except Exception as e:
+        print(f"[ingest_jobs] release error: {e}", flush=True)
+        return False
+    finally:
+        conn.close()
+
+
+def notify() -> None:
+    """Wake the worker in this process now instead of at the next poll (safe from any thread; no-op without a worker)."""
+    if _wake is None or _wake_loop is None:
+        return
+    try:
+        _wake_loop.call_soon_threadsafe(_wake.set)
+    except RuntimeError:
+        pass
+
+
+async def worker_loop(process: Callable[[dict], Awaitable[None]], poll_seconds: float = POLL_SECONDS) -> None:
+    """Claim and process jobs one at a time until cancelled. process(job) owns user messaging and calls finish/release;
+    an exception escaping it requeues the job."""
+    global _wake, _wake_loop
+    _wake = asyncio.Event()
+    _wake_loop = asyncio.get_running_loop()
+    print("[ingest_jobs] Worker started.", flush=True)
+    try:
+        while True:
+            job = await asyncio.to_thread(claim)
+            if job is None:
+                _wake.clear()
+                try:
+                    await asyncio.wait_for(_wake.wait(), timeout=poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            print(f"[ingest_jobs] Claimed job {job['id']} ({job.get('filename')!r}, attempt {job['attempts']}).", flush=True)
+            try:
+                await process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                requeued = await asyncio.to_thread(release, job["id"], f"{type(e).__name__}: {e}")
+                print(f"[ingest_jobs] Job {job['id']} failed ({e}); {'requeued' if requeued else 'giving up'}.", flush=True)
+    finally:
+        _wake = _wake_loop = None
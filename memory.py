@@ -6,8 +6,12 @@ import os
 import uuid
 from langchain_core.runnables import RunnableConfig
 
+from embeddings import EMBEDDING_DIM
+
+# Collection and model for a new install (scripts/init_qdrant.py); after scripts/migrate_embeddings.py memory, the
+# embedding_models "memory" row names the collection and model in use
 COLLECTION_NAME = "long_term_memory"
-VECTOR_SIZE = 768  # all-mpnet-base-v2 (match scripts/init_qdrant.py)
+VECTOR_SIZE = EMBEDDING_DIM
 
 
 def get_memory_namespace(config: RunnableConfig) -> tuple:
@@ -19,19 +23,26 @@ def get_memory_namespace(config: RunnableConfig) -> tuple:
     return ("memories", safe), user_id
 
 
-def get_memories(store, namespace: tuple, query: str, limit: int = 5) -> list:
-    """Return list of memory strings for the given namespace and query. Sync; used by agent."""
+def get_memories(store, namespace: tuple, query: str, limit: int = 5, vector: list[float] | None = None) -> list:
+    """Return list of memory strings for the given namespace and query. Sync; used by agent.
+    Pass vector (embeddings.embed_query(query, memory_model())) to reuse an embedding already computed this turn."""
     if store is None:
         return []
     try:
         # Prefer sync search (QdrantMemoryStore); fallback for LangGraph Store would need async
         if hasattr(store, "search_sync"):
-            return store.search_sync(namespace, query, limit)
+            return store.search_sync(namespace, query, limit, vector=vector)
         return []
     except Exception:
         return []
 
 
+def memory_model() -> str:
+    """Model the memory collection in use is embedded with (embedding_models.py)."""
+    import embedding_models
+    return embedding_models.active("memory")["model"]
+
+
 async def put_memory(store, namespace: tuple, data: str) -> None:
     if store is None:
         return
@@ -47,23 +58,27 @@ async def put_memory(store, namespace: tuple, data: str) -> None:
 class QdrantMemoryStore:
     """Sync Qdrant-backed store for agent memory. Use get_memory_store() to obtain an instance."""
 
-    def __init__(self, url: str, api_key: str | None, collection: str = COLLECTION_NAME):
+    def __init__(self, url: str, api_key: str | None, collection: str | None = None):
         from qdrant_client import QdrantClient
         self._client = QdrantClient(url=url, api_key=api_key)
-        self._collection = collection
-        self._embed_fn = None  # lazy init
+        self._fixed_collection = collection  # None = follow the embedding_models "memory" row
+
+    @property
+    def _collection(self) -> str:
+        if self._fixed_collection:
+            return self._fixed_collection
+        import embedding_models
+        return embedding_models.active("memory")["location"] or COLLECTION_NAME
 
     def _embed(self, text: str) -> list[float]:
-        if self._embed_fn is None:
-            from sentence_transformers import SentenceTransformer
-            # Must match init_qdrant.py VECTOR_SIZE (768)
-            self._embed_fn = SentenceTransformer("sentence-transformers/all-mpnet-base-v2")
-        emb = self._embed_fn.encode(text or " ", convert_to_numpy=True)
-        return emb.tolist()
-
-    def search_sync(self, namespace: tuple, query: str, limit: int = 5) -> list[str]:
+        # Shared model with RAG, encoded on the batching worker (embeddings.py); the collection's model and size
+        # come from embedding_models (scripts/migrate_embeddings.py memory switches both)
+        from embeddings import submit_query
+        return submit_query(text or " ", memory_model()).result()
+
+    def search_sync(self, namespace: tuple, query: str, limit: int = 5, vector: list[float] | None = None) -> list[str]:
         try:
-            vector = self._embed(query or "")
+            vector = vector or self._embed(query or "")
             ns_str = "|".join(str(x) for x in namespace)
             from qdrant_client.models import Filter, FieldCondition, MatchValue
             results = self._client.search(
@@ -0,0 +1,84 @@
+# Query-result cache for rag.retrieve. One chat turn can retrieve several times for the same question
+# (call_agent's automatic context, search_my_documents, suggest_email_body_from_context) and follow-ups often
+# repeat it. Entries are keyed by (user_id, normalised query, limit, mode) and hold the query embedding and the
+# result hits (row id, distance, lexical flag; no content), in an LRU with a TTL. Each user has a corpus version
+# that rag bumps on ingest and retention changes; hits cached under an older version are never served (the
+# embedding still is: it does not depend on the corpus). The TTL bounds staleness from other processes, which do not share versions.
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+ENABLED = (os.environ.get("PA_RAG_QUERY_CACHE") or "1").strip() != "0"
+MAX_ENTRIES = int(os.environ.get("PA_RAG_QUERY_CACHE_SIZE", "512"))
+TTL_SECONDS = float(os.environ.get("PA_RAG_QUERY_CACHE_TTL", "300"))
+
+_entries: "OrderedDict[tuple, dict]" = OrderedDict()
+_versions: dict[str, int] = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "vector_hits": 0, "misses": 0}
+
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(query: str) -> str:
+    """Case/space/punctuation-insensitive form: 'What's the notice period?' == 'what's the  notice period'."""
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    return _SPACE.sub(" ", text).strip(" \t\n?!.,;:")
+
+
+def version(user_id: str) -> int:
+    with _lock:
+        return _versions.get(user_id, 0)
+
+
+def bump(user_id: str) -> None:
+    """The user's documents changed: cached result hits for them are stale from now on."""
+    with _lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+
+
+def get(user_id: str, query: str, limit: int, mode: str) -> tuple[list[float] | None, list | None]:
+    """(query embedding, result hits) for a cached query; hits is None when absent or the corpus changed since."""
+    if not ENABLED:
+        return None, None
+    key = (user_id, normalize(query), limit, mode)
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or now - entry["at"] > TTL_SECONDS:
+            if entry is not None:
+                del _entries[key]
+            _stats["misses"] += 1
+            return None, None
+        _entries.move_to_end(key)
+        if entry["version"] != _versions.get(user_id, 0):
+            _stats["vector_hits"] += 1
+            return entry["vector"], None
+        _stats["hits"] += 1
+        return entry["vector"], [dict(h) for h in entry["hits"]]
+
+
+def put(user_id: str, query: str, limit: int, mode: str, vector, hits: list[dict], corpus_version: int) -> None:
+    """Store a result computed against corpus_version (read with version() before the search started)."""
+    if not ENABLED:
+        return
+    key = (user_id, normalize(query), limit, mode)
+    with _lock:
+        _entries[key] = {"vector": vector, "hits": [dict(h) for h in hits], "version": corpus_version, "at": time.time()}
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, enabled=ENABLED, entries=len(_entries))
@@ -1,24 +1,100 @@
 # RAG: Docling + all-mpnet-base-v2 + Neon. See PERSONAL_ASSISTANT_PATTERNS.md §8.5, §8.5a, ONBOARDING_PLAN.md §5.
 # Flow: load (Docling) → split (RecursiveCharacterTextSplitter) → embed (sentence-transformers) → store/retrieve (Neon documents).
 
+import hashlib
+import io
+import itertools
 import json
 import os
-import tempfile
+import re
+import threading
+import time
+from collections import deque
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, Callable, Iterator
+
+import document_usage
+import embedding_models
+import query_cache
+import reranker
+import session_store
+import vector_cache
+from doc_parsers import iter_sections, parser_for
+from embeddings import EMBEDDING_DIM, get_model, submit_query, submit_texts
 
 # Chunk size ~500–1000, overlap ~100 (ONBOARDING_PLAN.md §5)
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 100
 
-# Embedding dim for all-mpnet-base-v2; must match sql/2-rag-documents.sql
-EMBEDDING_DIM = 768
+# Streaming ingest: PDFs are parsed PAGES_PER_WINDOW pages at a time and chunks embedded/committed EMBED_BATCH_SIZE
+# at a time, so peak memory is one window + one batch regardless of document size.
+PAGES_PER_WINDOW = 8
+EMBED_BATCH_SIZE = 64
+
+# Layout-heavy formats that go to Docling; everything with a registered fast parser (doc_parsers.py) skips it
+DOCLING_EXTENSIONS = (".pdf", ".docx", ".pptx", ".xlsx")
+
+# Parallel PDF parsing: page windows of PDFs with at least PDF_PARALLEL_MIN_PAGES pages are parsed in a process pool
+# of PDF_PARSE_WORKERS (default 0 = serial; opt in). Each worker process keeps its own Docling converter (docling_pool),
+# so memory grows with the worker count on the full image; on the slim image workers run PyPDF2 only. Size it to the
+# container's CPU and memory limits (os.cpu_count() reports the host's CPUs).
+PDF_PARSE_WORKERS = int(os.environ.get("PA_PDF_PARSE_WORKERS", "0"))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PA_PDF_PARALLEL_MIN_PAGES", "24"))
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+# Rows per multi-row INSERT in ingest_document (one round trip to Neon per page)
+INSERT_PAGE_SIZE = 200
+
+# HNSW search (sql/6-documents-hnsw.sql): higher ef_search = better recall, slower. iterative_scan keeps scanning
+# the index until LIMIT rows pass the user_id filter: strict_order | relaxed_order | off (needs pgvector 0.8+).
+HNSW_EF_SEARCH = int(os.environ.get("PA_RAG_HNSW_EF_SEARCH", "100"))
+HNSW_ITERATIVE_SCAN = (os.environ.get("PA_RAG_HNSW_ITERATIVE_SCAN") or "strict_order").strip().lower()
+_iterative_scan_supported = True
+
+# Vector storage (scripts/migrate_vector_storage.py), detected from the documents table: embedding as vector (float32)
+# or halfvec (float16), optionally with a bit-quantized copy (embedding_bq) whose HNSW index picks
+# limit * BINARY_RESCORE_FACTOR candidates that are then rescored against the stored embedding.
+BINARY_RESCORE_FACTOR = max(1, int(os.environ.get("PA_RAG_BINARY_RESCORE", "4")))
+_vector_storage: tuple[str, bool] | None = None  # (embedding type, has embedding_bq)
+_vector_dim: int | None = None  # dimension of documents.embedding, read with _vector_storage
+_sql_cache: dict[tuple, str] = {}
+
+# Model that produced documents.embedding (embedding_models.py, switched by scripts/migrate_embeddings.py); ingest
+# and queries embed with it. A switch seen by this process drops every cache holding vectors of the old model.
+_documents_model: str | None = None
+
+# Retrieval mode: "hybrid" = lexical (full-text) + vector fused with reciprocal-rank fusion; "vector" = cosine only;
+# "two_stage" = best documents first, then cosine within them (TOP_SOURCES).
+RETRIEVE_MODE = (os.environ.get("PA_RAG_RETRIEVE_MODE") or "hybrid").strip().lower()
+RRF_K = 60  # standard RRF constant; larger = flatter fusion
+HYBRID_CANDIDATE_FACTOR = 4  # candidates per ranking = limit * factor (min 20)
+_hybrid_supported = True
+
+# Two-stage retrieval (mode "two_stage", sql/10-document-sources.sql): rank the user's uploads by summary embedding,
+# then chunks within the TOP_SOURCES best ones; falls back to vector search when that finds fewer than limit chunks
+TOP_SOURCES = int(os.environ.get("PA_RAG_TOP_SOURCES", "3"))
+SUMMARY_CHARS = 300  # document_sources.summary: start of the first chunk, for listings
+_sources_supported = True
+
+# Per-user chunk counts for retrieval gating (retrieval_gate.py): user_id -> (count, time fetched)
+DOC_COUNT_TTL = float(os.environ.get("PA_RAG_DOC_COUNT_TTL", "300"))
+_doc_counts: dict[str, tuple[int, float]] = {}
+
+# Context selection (retrieve_scored): fetch limit * CANDIDATE_FACTOR candidates, keep those within RELATIVE_CUTOFF
+# cosine similarity of the best hit, diversify with maximal marginal relevance (MMR_LAMBDA: 1 = rank order only,
+# lower = penalise chunks that repeat already-picked text) and stop at CONTEXT_MAX_TOKENS (~CHARS_PER_TOKEN chars each).
+CANDIDATE_FACTOR = max(1, int(os.environ.get("PA_RAG_CANDIDATE_FACTOR", "3")))
+RELATIVE_CUTOFF = float(os.environ.get("PA_RAG_RELATIVE_CUTOFF", "0.2"))
+MMR_LAMBDA = float(os.environ.get("PA_RAG_MMR_LAMBDA", "0.7"))
+CONTEXT_MAX_TOKENS = int(os.environ.get("PA_RAG_CONTEXT_TOKENS", "1200"))
+CHARS_PER_TOKEN = 4
+_WORD = re.compile(r"\w+")
 
 
 def _get_embedder():
-    """Lazy-load SentenceTransformer (heavy). Raises ImportError when not installed (e.g. Railway slim image)."""
-    from sentence_transformers import SentenceTransformer
-    return SentenceTransformer("all-mpnet-base-v2")
+    """Shared SentenceTransformer (loaded once per process, see embeddings.py). Raises ImportError when not installed (e.g. Railway slim image)."""
+    return get_model()
 
 
 def _get_conn():
@@ -30,31 +106,110 @@ def _get_conn():
     return psycopg2.connect(url, cursor_factory=RealDictCursor)
 
 
+def _embedding_model(conn=None) -> str:
+    """Name of the model documents are embedded with (embedding_models "documents" row, cached). When it changed
+    since the last call, the storage, statement, vector and query caches and session documents are dropped."""
+    global _documents_model, _vector_storage, _vector_dim
+    model = embedding_models.active("documents", conn)["model"]
+    if model != _documents_model:
+        if _documents_model is not None:
+            print(f"[rag] Embedding model switched: {_documents_model} -> {model}", flush=True)
+            _vector_storage = _vector_dim = None
+            _sql_cache.clear()
+            vector_cache.invalidate(None)
+            query_cache.clear()
+            session_store.clear()
+        _documents_model = model
+    return model
+
+
+def embedding_model() -> str:
+    """The model to embed a query with before passing it as query_vector to retrieve / retrieve_scored."""
+    return _embedding_model()
+
+
+def _vec_literal(vector) -> str:
+    """pgvector text literal. 7 significant digits = float32 precision (pgvector stores float4), about half
+    the bytes of str(float) for the same stored value."""
+    return "[" + ",".join(format(x, ".7g") for x in vector) + "]"
+
+
+def _chunk_hash(content: str) -> str:
+    """Content address of a chunk (sha256 hex); documents.content_hash, sql/8-documents-content-hash.sql."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _existing_chunk_ids(cur, user_id: str, hashes: list[str]) -> dict[str, int]:
+    """Map content_hash -> id for chunks this user already stored (not expired), oldest row per hash."""
+    if not hashes:
+        return {}
+    cur.execute(
+        """SELECT DISTINCT ON (content_hash) content_hash, id FROM documents
+           WHERE user_id = %s AND content_hash = ANY(%s) AND (expires_at IS NULL OR expires_at > NOW())
+           ORDER BY content_hash, id""",
+        (user_id, list(set(hashes))),
+    )
+    return {r["content_hash"]: r["id"] for r in cur.fetchall()}
+
+
+def _insert_chunks(
+    cur,
+    user_id: str,
+    chunks: list[str],
+    embeddings: list,
+    meta_json: str,
+    scope: str,
+    expires_at: Any,
+    content_hashes: list[str] | None = None,
+    source_id: int | None = None,
+    vec_type: str = "vector",
+    model: str | None = None,
+) -> list[int]:
+    """Bulk insert chunks with multi-row INSERT ... VALUES (execute_values, INSERT_PAGE_SIZE rows per statement).
+    model (the one that produced embeddings) is recorded as metadata.embedding_model, so scripts/migrate_embeddings.py
+    can tell rows written with a stale model after a switch. Returns inserted ids in chunk order."""
+    from psycopg2.extras import execute_values
+    hashes = content_hashes or [_chunk_hash(c) for c in chunks]
+    if model:
+        meta_json = json.dumps({**json.loads(meta_json), "embedding_model": model})
+    rows = [
+        (user_id, content, meta_json, _vec_literal(emb), scope, expires_at, h)
+        + (() if source_id is None else (source_id,))
+        for content, emb, h in zip(chunks, embeddings, hashes)
+    ]
+    if not rows:
+        return []
+    source_column, source_value = ("", "") if source_id is None else (", source_id", ", %s")
+    result = execute_values(
+        cur,
+        f"""INSERT INTO documents (user_id, content, metadata, embedding, scope, expires_at, content_hash{source_column})
+           VALUES %s RETURNING id""",
+        rows,
+        template=f"(%s, %s, %s, %s::{vec_type}, %s, %s, %s{source_value})",
+        page_size=INSERT_PAGE_SIZE,
+        fetch=True,
+    )
+    return [r["id"] for r in result]
+
+
 def _bytes_to_text(bytes_content: bytes, filename: str = "") -> str:
-    """Parse PDF/DOCX bytes to plain text. Uses Docling when available; else PyPDF2/docx2txt (Railway slim image)."""
+    """Parse document bytes to plain text. Plain-text/structured formats use the fast parsers in doc_parsers.py;
+    PDF/Office documents use Docling when available, else PyPDF2/docx2txt (Railway slim image)."""
+    if parser_for(filename) is not None:
+        try:
+            return "\n\n".join(iter_sections(bytes_content, filename))
+        except ImportError:
+            # Optional parser dependency missing (e.g. openpyxl for .xlsx): let Docling try
+            pass
     suffix = (filename or "").lower()
-    if suffix.endswith(".pdf"):
-        ext = ".pdf"
-    elif suffix.endswith(".docx") or suffix.endswith(".doc"):
+    if suffix.endswith(".doc"):
         ext = ".docx"
     else:
-        ext = ".pdf"  # try PDF first for unknown
-    # Try Docling first when installed (local/full image)
+        ext = next((e for e in DOCLING_EXTENSIONS if suffix.endswith(e)), ".pdf")  # try PDF first for unknown
+    # Try Docling first when installed (local/full image): pooled long-lived converter, in-memory input
     try:
-        from docling.document_converter import DocumentConverter
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-            tmp.write(bytes_content)
-            tmp_path = tmp.name
-        try:
-            converter = DocumentConverter()
-            result = converter.convert(tmp_path)
-            text = result.document.export_to_markdown() or ""
-            return text.strip()
-        finally:
-            try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
+        import docling_pool
+        return docling_pool.convert(bytes_content, os.path.splitext(os.path.basename(filename or ""))[0] + ext)
     except ImportError:
         # Docling not installed (e.g. Railway slim image); use lightweight fallbacks only
         pass
@@ -63,29 +218,365 @@ def _bytes_to_text(bytes_content: bytes, filename: str = "") -> str:
         pass
     # Lightweight fallback: PyPDF2 / docx2txt (always in requirements-railway.txt)
     if ext == ".pdf":
-        try:
-            import io
-            import PyPDF2
-            reader = PyPDF2.PdfReader(io.BytesIO(bytes_content))
-            return "\n".join(p.extract_text() or "" for p in reader.pages).strip()
-        except Exception:
-            raise
+        import PyPDF2
+        reader = PyPDF2.PdfReader(io.BytesIO(bytes_content))
+        return "\n".join(p.extract_text() or "" for p in reader.pages).strip()
     if ext == ".docx" or ".doc" in suffix:
+        import docx2txt
+        # docx2txt opens the path with zipfile, which accepts a file-like object
+        return (docx2txt.process(io.BytesIO(bytes_content)) or "").strip()
+    raise ValueError(f"Unsupported file type for parsing: {filename or ext}")
+
+
+def _doc_ext(filename: str) -> str:
+    suffix = (filename or "").lower()
+    if suffix.endswith(".docx") or suffix.endswith(".doc"):
+        return ".docx"
+    return ".pdf"  # PDF, or unknown: try PDF first
+
+
+def _get_parse_pool():
+    """Shared process pool for PDF page windows, created on first use. None when PDF_PARSE_WORKERS <= 1."""
+    global _parse_pool
+    if PDF_PARSE_WORKERS <= 1:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # spawn, not fork: the webhook process has live threads (embedding worker, event loop executors)
+            _parse_pool = ProcessPoolExecutor(PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _parse_pool
+
+
+def _reset_parse_pool() -> None:
+    """Drop a broken pool (e.g. a worker was OOM-killed); the next large PDF starts a fresh one."""
+    global _parse_pool
+    with _parse_pool_lock:
+        pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _pdf_pages_text(pdf_bytes: bytes) -> str:
+    """Text of a (sub-)PDF: Docling when installed, else PyPDF2. Runs in parse pool workers."""
+    try:
+        import docling_pool
+        text = docling_pool.convert(pdf_bytes, "window.pdf")
+        if text:
+            return text
+    except Exception:
+        pass
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    return "\n".join(p.extract_text() or "" for p in reader.pages).strip()
+
+
+def _pdf_slice(reader, first: int, end: int) -> bytes:
+    """Pages [first, end) as a standalone PDF, so pool workers receive one window rather than the whole file."""
+    import PyPDF2
+    writer = PyPDF2.PdfWriter()
+    for i in range(first, end):
+        writer.add_page(reader.pages[i])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _ordered_map(pool, fn: Callable, items: Iterator, lookahead: int) -> Iterator[tuple[Any, Any]]:
+    """Yield (item, future) in input order; while the caller waits on one future, up to lookahead more are queued
+    behind it, so memory stays bounded.
+    A submit that fails (e.g. broken pool) yields a future holding that exception instead of raising."""
+    from concurrent.futures import Future
+
+    def _submit(item):
         try:
-            import docx2txt
-            with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tmp:
-                tmp.write(bytes_content)
-                tmp_path = tmp.name
+            return pool.submit(fn, item)
+        except Exception as e:
+            failed: Future = Future()
+            failed.set_exception(e)
+            return failed
+
+    pending: deque = deque()
+    items = iter(items)
+    try:
+        for item in items:
+            pending.append((item, _submit(item)))
+            if len(pending) >= lookahead:
+                break
+        while pending:
+            item, future = pending.popleft()
+            nxt = next(items, None)
+            if nxt is not None:
+                pending.append((nxt, _submit(nxt)))
+            yield item, future
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def _parse_window_slice(item: tuple[bytes, int, int]) -> str:
+    """Pool task: item is (sub-PDF bytes, first_page, end_page)."""
+    return _pdf_pages_text(item[0])
+
+
+def _iter_pdf_windows(bytes_content: bytes, start_page: int = 0) -> Iterator[tuple[int, int, int, str]]:
+    """Yield (first_page, end_page, total_pages, text) for PAGES_PER_WINDOW-page windows of a PDF (0-based, end exclusive).
+    Docling (the shared docling_pool converter) converts each window via page_range when installed; PyPDF2 extracts
+    page by page otherwise (or when Docling fails on a window). Only one window of text is held at a time.
+    PDFs with PDF_PARALLEL_MIN_PAGES+ pages are parsed in the process pool, a few windows ahead, still yielded in order."""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(bytes_content))
+    total = len(reader.pages)
+    ranges = [(first, min(first + PAGES_PER_WINDOW, total)) for first in range(start_page, total, PAGES_PER_WINDOW)]
+    pool = _get_parse_pool() if total - start_page >= PDF_PARALLEL_MIN_PAGES and len(ranges) > 1 else None
+    if pool is not None:
+        slices = ((_pdf_slice(reader, first, end), first, end) for first, end in ranges)
+        for (_, first, end), future in _ordered_map(pool, _parse_window_slice, slices, PDF_PARSE_WORKERS * 2):
             try:
-                return (docx2txt.process(tmp_path) or "").strip()
-            finally:
-                try:
-                    os.unlink(tmp_path)
-                except OSError:
-                    pass
+                text = future.result()
+            except Exception as e:
+                from concurrent.futures.process import BrokenProcessPool
+                if isinstance(e, BrokenProcessPool):
+                    _reset_parse_pool()
+                text = ""
+            if not text:
+                text = "\n".join(reader.pages[i].extract_text() or "" for i in range(first, end)).strip()
+            yield first, end, total, text
+        return
+    use_docling = True
+    for first, end in ranges:
+        text = ""
+        if use_docling:
+            try:
+                import docling_pool
+                text = docling_pool.convert(bytes_content, "document.pdf", page_range=(first + 1, end))
+            except ImportError:
+                use_docling = False
+            except Exception:
+                text = ""
+        if not text:
+            text = "\n".join(reader.pages[i].extract_text() or "" for i in range(first, end)).strip()
+        yield first, end, total, text
+
+
+def _iter_section_windows(sections: Iterator[str], start_page: int = 0) -> Iterator[tuple[int, int, int | None, str]]:
+    """One window per fast-parser section (doc_parsers.py). The section count is not known up front, so total_pages
+    is None until the last window; sections before start_page are parsed but skipped."""
+    pending = None
+    for i, section in enumerate(sections):
+        if pending is not None:
+            yield pending[0], pending[0] + 1, None, pending[1]
+        pending = (i, section) if i >= start_page else None
+    if pending is not None:
+        yield pending[0], pending[0] + 1, pending[0] + 1, pending[1]
+
+
+def _iter_page_windows(bytes_content: bytes, filename: str = "", start_page: int = 0) -> Iterator[tuple[int, int, int | None, str]]:
+    """(first_page, end_page, total_pages, text) windows for streaming ingest. PDFs stream page windows;
+    plain-text/structured formats stream fast-parser sections; other formats (and PDFs PyPDF2 cannot open)
+    are a single window from _bytes_to_text."""
+    if parser_for(filename) is not None:
+        sections = iter_sections(bytes_content, filename)
+        try:
+            first_section = next(sections, None)
+        except ImportError:
+            sections = None
+        if sections is not None:
+            if first_section is not None:
+                yield from _iter_section_windows(itertools.chain([first_section], sections), start_page)
+            return
+    elif _doc_ext(filename) == ".pdf":
+        try:
+            windows = _iter_pdf_windows(bytes_content, start_page)
+            first_window = next(windows, None)
         except Exception:
+            first_window, windows = None, None
+        if windows is not None:
+            if first_window is not None:
+                yield first_window
+                yield from windows
+            return
+    if start_page > 0:
+        return
+    yield 0, 1, 1, _bytes_to_text(bytes_content, filename)
+
+
+def _iter_chunk_windows(windows: Iterator[tuple[int, int, int | None, str]]) -> Iterator[tuple[list[str], dict]]:
+    """Split page windows into chunks. The last chunk of each window is carried into the next one so chunks can
+    span page boundaries; yields (chunks, position) where position has pages_done / total_pages / resume_page
+    (first page to re-parse if ingest stops after these chunks are committed)."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+    )
+    carry = ""
+    position = {}
+    for first, end, total, text in windows:
+        # Space, not a newline: the splitter cuts at "\n" before " ", which would hand the carry back unchanged
+        full = f"{carry} {text}" if carry and text else (carry or text)
+        chunks = splitter.split_text(full) if full.strip() else []
+        carry = chunks.pop() if chunks and (total is None or end < total) else ""
+        position = {"pages_done": end, "total_pages": total, "resume_page": first if carry else end}
+        if chunks:
+            yield chunks, position
+    if carry:
+        yield [carry], {**position, "resume_page": position.get("total_pages", 0)}
+
+
+def _corpus_changed(user_id: str) -> None:
+    """A user's documents changed (insert, retention): drop their in-memory index, stale cached query results
+    and cached document count."""
+    vector_cache.invalidate(user_id)
+    query_cache.bump(user_id)
+    _doc_counts.pop(user_id, None)
+
+
+def document_count(user_id: str) -> int | None:
+    """Number of non-expired chunks the user has, cached for DOC_COUNT_TTL seconds (and dropped on ingest/retention
+    changes). None when the database is unavailable, so callers do not mistake an outage for an empty corpus."""
+    now = time.time()
+    cached = _doc_counts.get(user_id)
+    if cached is not None and now - cached[1] < DOC_COUNT_TTL:
+        return cached[0]
+    try:
+        conn = _get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT count(*) AS n FROM documents WHERE user_id = %s AND (expires_at IS NULL OR expires_at > NOW())",
+                    (user_id,),
+                )
+                count = int(cur.fetchone()["n"])
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[rag] document_count failed: {e}", flush=True)
+        return None
+    # Cache empty corpora briefly only: a document added by another process should be picked up quickly
+    _doc_counts[user_id] = (count, now if count else now - DOC_COUNT_TTL + 30)
+    return count
+
+
+def _store_chunks(
+    conn,
+    user_id: str,
+    chunks: list[str],
+    meta_json: str,
+    scope: str,
+    expires_at: Any,
+    source_id: int | None = None,
+    embeddings_by_hash: dict[str, Any] | None = None,
+) -> tuple[list[int], list[int]]:
+    """Content-addressed store of one batch: reuse the user's existing rows (same content_hash, not expired),
+    embed and bulk-insert only new chunks, commit. Returns (row ids in chunk order, ids of the rows inserted).
+    embeddings_by_hash supplies vectors already computed (session documents); only chunks missing from it are embedded.
+    Raises ImportError when embedding is unavailable and new chunks need it."""
+    hashes = [_chunk_hash(c) for c in chunks]
+    with conn.cursor() as cur:
+        chunk_ids = _existing_chunk_ids(cur, user_id, hashes)
+    new_hashes: list[str] = []
+    new_chunks: list[str] = []
+    for content, h in zip(chunks, hashes):
+        if h not in chunk_ids and h not in new_hashes:
+            new_hashes.append(h)
+            new_chunks.append(content)
+    new_ids: list[int] = []
+    if new_chunks:
+        model = _embedding_model(conn)
+        known = embeddings_by_hash or {}  # session vectors: session_store is cleared when the model switches
+        for attempt in range(2):
+            missing = [c for c, h in zip(new_chunks, new_hashes) if h not in known]
+            computed = iter(submit_texts(missing, model).result() if missing else [])
+            embeddings = [known[h] if h in known else next(computed) for h in new_hashes]
+            try:
+                with conn.cursor() as cur:
+                    new_ids = _insert_chunks(
+                        cur, user_id, new_chunks, embeddings, meta_json, scope, expires_at, new_hashes, source_id,
+                        _storage(conn)[0], model,
+                    )
+                break
+            except Exception as e:
+                conn.rollback()
+                if attempt or "dimensions" not in str(e):
+                    raise
+                # The model was switched to one of another size since it was cached: re-read it and embed again
+                embedding_models.invalidate()
+                model, known = _embedding_model(conn), {}
+        conn.commit()
+        _corpus_changed(user_id)
+        chunk_ids.update(zip(new_hashes, new_ids))
+    return [chunk_ids[h] for h in hashes], new_ids
+
+
+def _open_source(conn, user_id: str, file_hash: str, filename: str, doc_type: str, scope: str, expires_at: Any) -> dict | None:
+    """The document_sources row for an upload: the user's existing row for the same file (finished, or an interrupted
+    ingest to continue; a finished one with expired or deleted chunks is reopened as 'ingesting'), else a new
+    'ingesting' row. None when sql/10-document-sources.sql has not been run."""
+    global _sources_supported
+    if not _sources_supported:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT id, status, chunk_ids, created_at FROM document_sources
+                   WHERE user_id = %s AND file_hash = %s AND (expires_at IS NULL OR expires_at > NOW())
+                   ORDER BY status = 'ready' DESC, id DESC LIMIT 1""",
+                (user_id, file_hash),
+            )
+            row = cur.fetchone()
+            if row is not None and row["status"] == "ready" and row["chunk_ids"]:
+                # Quota eviction (document_usage) expires cold chunks but keeps the upload while any survive: reopen
+                # it so re-sending the file re-stores them (surviving chunks are reused by content hash)
+                cur.execute(
+                    """UPDATE document_sources s SET status = 'ingesting', updated_at = NOW()
+                       WHERE s.id = %s AND EXISTS (
+                           SELECT 1 FROM unnest(s.chunk_ids) AS c(id) LEFT JOIN documents d ON d.id = c.id
+                           WHERE d.id IS NULL OR d.expires_at <= NOW())
+                       RETURNING id, status, chunk_ids, created_at""",
+                    (row["id"],),
+                )
+                row = cur.fetchone() or row
+            if row is None:
+                cur.execute(
+                    """INSERT INTO document_sources (user_id, filename, file_hash, doc_type, scope, expires_at)
+                       VALUES (%s, %s, %s, %s, %s, %s) RETURNING id, status, chunk_ids, created_at""",
+                    (user_id, filename, file_hash, doc_type, scope, expires_at),
+                )
+                row = cur.fetchone()
+        conn.commit()
+        return row
+    except Exception as e:
+        conn.rollback()
+        if "document_sources" not in str(e):
             raise
-    raise ValueError(f"Unsupported file type for parsing: {filename or ext}")
+        _sources_supported = False
+        print("[rag] document_sources missing (run sql/10-document-sources.sql); uploads are not tracked.", flush=True)
+        return None
+
+
+def _save_source(conn, source_id: int, chunk_ids: list[int], summary: str | None = None, ready: bool = False) -> None:
+    """Record an upload's chunk ids; when ready, also its summary text and embedding (mean of the chunk vectors)."""
+    sql = "UPDATE document_sources SET chunk_ids = %(ids)s::bigint[], chunk_count = %(n)s, updated_at = NOW()"
+    if ready:
+        sql += """, status = 'ready', summary = COALESCE(%(summary)s, summary),
+                  summary_embedding = (SELECT AVG(embedding)::vector FROM documents WHERE id = ANY(%(ids)s::bigint[]))"""
+    with conn.cursor() as cur:
+        cur.execute(sql + " WHERE id = %(id)s", {"ids": chunk_ids, "n": len(chunk_ids), "summary": summary, "id": source_id})
+    conn.commit()
+
+
+def _rows_created_since(conn, ids: list[int], since: Any) -> list[int]:
+    """Of ids, the rows created at or after since (an interrupted upload's start): the rows it inserted itself."""
+    if not ids:
+        return []
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM documents WHERE id = ANY(%s) AND created_at >= %s ORDER BY id", (ids, since))
+        rows = [r["id"] for r in cur.fetchall()]
+    conn.commit()
+    return rows
 
 
 def ingest_document(
@@ -95,9 +586,20 @@ def ingest_document(
     scope: str = "long_term",
     expires_at: Any = None,
     metadata: dict | None = None,
-) -> tuple[str, list[int]]:
+    start_page: int = 0,
+    on_progress: Callable[[dict], None] | None = None,
+) -> tuple[str, list[int], list[int]]:
     """Load document (Docling or fallback), split, embed (all-mpnet-base-v2), store in Neon.
-    Returns (status_message, list of inserted document row ids)."""
+    Streams: page windows are parsed, split, embedded in EMBED_BATCH_SIZE batches and committed one at a time, so
+    memory stays bounded for large documents and a failure keeps the chunks already stored. on_progress(progress)
+    is called after each commit; progress["resume_page"] can be passed back as start_page to resume.
+    Chunks the user already has (same content_hash) reuse the existing row; only new chunks are embedded.
+    Each upload gets a document_sources row (sql/10-document-sources.sql); re-sending a file the user already has
+    returns its existing chunks without parsing it again.
+    Returns (status_message, document row ids for this document (inserted + reused), ids of the rows it inserted).
+    Retention changes (update_documents_retention) may shorten the expiry of the inserted rows only.
+    Raises RuntimeError when storing fails (e.g. a Neon error), possibly after some windows were committed: retry with
+    start_page = the last on_progress resume_page. Parse failures and missing schema are returned as a status."""
     user_id = user_id or os.environ.get("USER_ID") or os.environ.get("EMAIL", "default")
     metadata = metadata or {}
     filename = metadata.get("filename", "") or (os.path.basename(file_path) if file_path else "")
@@ -108,119 +610,752 @@ def ingest_document(
     elif bytes_content:
         raw = bytes_content
     else:
-        return ("No file path or bytes_content provided.", [])
+        return ("No file path or bytes_content provided.", [], [])
+
+    meta_json = json.dumps({
+        "source": metadata.get("source", "upload"),
+        "filename": filename,
+        "doc_type": metadata.get("doc_type", "other"),
+        **{k: v for k, v in metadata.items() if k not in ("source", "filename", "doc_type")},
+    })
 
+    doc_ids: dict[int, None] = {}  # ordered set of row ids for this document
+    new_ids: dict[int, None] = {}  # ... of them, the rows this upload inserted
+    progress = {"pages_done": start_page, "total_pages": None, "resume_page": start_page, "chunks": 0, "embedded": 0, "reused": 0}
+    windows = _iter_chunk_windows(_iter_page_windows(raw, filename, start_page))
+    summary = None
     try:
-        text = _bytes_to_text(raw, filename)
+        conn = _get_conn()
+        try:
+            source = _open_source(
+                conn, user_id, hashlib.sha256(raw).hexdigest(), filename, metadata.get("doc_type", "other"), scope, expires_at
+            )
+            source_id = source["id"] if source else None
+            if source and source["status"] == "ready" and source["chunk_ids"]:
+                ids = [int(i) for i in source["chunk_ids"]]
+                return (f"{filename or 'This document'} is already in your documents ({len(ids)} chunk(s)).", ids, [])
+            if source and start_page > 0:
+                doc_ids.update(dict.fromkeys(int(i) for i in source["chunk_ids"]))  # resuming: chunks stored before
+                new_ids.update(dict.fromkeys(_rows_created_since(conn, list(doc_ids), source["created_at"])))
+            while True:
+                try:
+                    item = next(windows, None)
+                except Exception as e:
+                    if progress["chunks"]:
+                        return (
+                            f"Could not parse the rest of the document (stopped at page {progress['resume_page'] + 1}): {e}",
+                            list(doc_ids),
+                            list(new_ids),
+                        )
+                    return (f"Could not parse document: {e}", [], [])
+                if item is None:
+                    break
+                chunks, position = item
+                if summary is None and start_page == 0 and chunks:
+                    summary = chunks[0][:SUMMARY_CHARS]
+                for i in range(0, len(chunks), EMBED_BATCH_SIZE):
+                    batch = chunks[i:i + EMBED_BATCH_SIZE]
+                    try:
+                        ids, inserted = _store_chunks(conn, user_id, batch, meta_json, scope, expires_at, source_id)
+                    except ImportError:
+                        return (
+                            "Document embedding isn't available on this server (image size limit). "
+                            "Add documents using the CLI or a local deployment with sentence-transformers.",
+                            list(doc_ids),
+                            list(new_ids),
+                        )
+                    doc_ids.update(dict.fromkeys(ids))
+                    new_ids.update(dict.fromkeys(inserted))
+                    progress["chunks"] += len(batch)
+                    progress["embedded"] += len(inserted)
+                    progress["reused"] += len(batch) - len(inserted)
+                progress.update(position)
+                if source_id is not None:
+                    _save_source(conn, source_id, list(doc_ids))
+                if on_progress:
+                    try:
+                        on_progress(dict(progress, ids=list(doc_ids), new_ids=list(new_ids)))
+                    except Exception as e:
+                        print(f"[rag] on_progress failed: {e}", flush=True)
+            if source_id is not None:
+                if doc_ids:
+                    _save_source(conn, source_id, list(doc_ids), summary, ready=True)
+                else:
+                    with conn.cursor() as cur:
+                        cur.execute("DELETE FROM document_sources WHERE id = %s", (source_id,))
+                    conn.commit()
+        finally:
+            conn.close()
     except Exception as e:
-        return (f"Could not parse document: {e}", [])
-
-    if not text.strip():
-        return ("Document contained no extractable text.", [])
+        err = str(e)
+        if "content_hash" in err:
+            return ("documents.content_hash is missing. Run sql/8-documents-content-hash.sql (scripts/run_sql_migrations.py).", [], [])
+        if "relation \"documents\" does not exist" in err or "does not exist" in err.lower():
+            return ("RAG documents table is missing. Run SQL migrations (e.g. scripts/run_sql_migrations.py) with 2-rag-documents.sql first.", [], [])
+        if "extension" in err.lower() and "vector" in err.lower():
+            return ("pgvector extension is required. Run 0-extensions.sql (CREATE EXTENSION IF NOT EXISTS vector) then 2-rag-documents.sql.", [], [])
+        # Transient (e.g. a Neon error): committed windows stay, so the caller retries from the last on_progress resume_page
+        if doc_ids:
+            raise RuntimeError(
+                f"Error storing document after {len(doc_ids)} chunk(s) (resume from page {progress['resume_page'] + 1}): {e}"
+            ) from e
+        raise RuntimeError(f"Error storing document: {e}") from e
 
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len,
+    if not progress["chunks"]:
+        return ("Document contained no extractable text.", [], [])
+    print(f"[rag] Ingest {filename or 'document'}: {progress}", flush=True)
+    return (
+        f"Added {progress['chunks']} chunk(s) from {filename or 'document'} to your documents "
+        f"({progress['embedded']} new, {progress['reused']} already stored).",
+        list(doc_ids),
+        list(new_ids),
     )
-    chunks = splitter.split_text(text)
 
-    try:
-        model = _get_embedder()
-    except ImportError:
-        return (
-            "Document embedding isn't available on this server (image size limit). "
-            "Add documents using the CLI or a local deployment with sentence-transformers.",
-            [],
-        )
-    embeddings = model.encode(chunks, show_progress_bar=False).tolist()
 
+def ingest_session_document(
+    bytes_content: bytes,
+    user_id: str | None = None,
+    metadata: dict | None = None,
+) -> tuple[str, str | None]:
+    """Parse, split and embed an upload into session_store only (no database writes): searchable by retrieve at
+    once, dropped after session_store.TTL_SECONDS unless persist_session_document saves it.
+    Returns (status_message, session document id or None when nothing was stored)."""
+    user_id = user_id or os.environ.get("USER_ID") or os.environ.get("EMAIL", "default")
+    metadata = metadata or {}
+    filename = metadata.get("filename", "")
+    if not bytes_content:
+        return ("No file path or bytes_content provided.", None)
     meta_json = json.dumps({
         "source": metadata.get("source", "upload"),
         "filename": filename,
         "doc_type": metadata.get("doc_type", "other"),
         **{k: v for k, v in metadata.items() if k not in ("source", "filename", "doc_type")},
     })
+    chunks: list[str] = []
+    hashes: list[str] = []
+    embeddings: list = []
+    model = _embedding_model()
+    try:
+        for window_chunks, _ in _iter_chunk_windows(_iter_page_windows(bytes_content, filename)):
+            batch = []
+            for content in window_chunks:
+                h = _chunk_hash(content)
+                if h not in hashes:
+                    hashes.append(h)
+                    batch.append(content)
+            if len(hashes) > session_store.MAX_CHUNKS:
+                return (f"{filename or 'This document'} is too large to keep in memory; keep it in your documents instead.", None)
+            for i in range(0, len(batch), EMBED_BATCH_SIZE):
+                embeddings.extend(submit_texts(batch[i:i + EMBED_BATCH_SIZE], model).result())
+            chunks.extend(batch)
+    except ImportError:
+        return ("Document embedding isn't available on this server (image size limit).", None)
+    except Exception as e:
+        return (f"Could not parse document: {e}", None)
+    if not chunks:
+        return ("Document contained no extractable text.", None)
+    try:
+        doc = session_store.add(
+            user_id, filename, hashlib.sha256(bytes_content).hexdigest(), meta_json, chunks, hashes, embeddings
+        )
+    except ValueError as e:
+        return (f"Could not keep {filename or 'this document'} in memory: {e}.", None)
+    print(f"[rag] Session ingest {filename or 'document'}: {len(chunks)} chunk(s) for {user_id}", flush=True)
+    return (f"Added {len(chunks)} chunk(s) from {filename or 'document'} for this conversation.", doc.doc_id)
+
 
-    inserted_ids: list[int] = []
+def persist_session_document(user_id: str, doc_id: str, expires_at: datetime | None = None) -> tuple[str, list[int]]:
+    """Write a session document to Neon (permanent, or until expires_at) with the embeddings computed at upload, and
+    drop it from session_store. Returns (status_message, document row ids) like ingest_document."""
+    doc = session_store.pop(user_id, doc_id)
+    if doc is None:
+        return ("That document is no longer in memory (session expired); please send it again.", [])
+    known = {h: e.tolist() for h, e in zip(doc.hashes, doc.embeddings)}
+    doc_type = json.loads(doc.meta_json).get("doc_type", "other")
+    doc_ids: dict[int, None] = {}
+    new_ids: list[int] = []
     try:
         conn = _get_conn()
         try:
-            with conn.cursor() as cur:
-                for content, emb in zip(chunks, embeddings):
-                    vec_str = "[" + ",".join(str(x) for x in emb) + "]"
-                    cur.execute(
-                        """INSERT INTO documents (user_id, content, metadata, embedding, scope, expires_at)
-                           VALUES (%s, %s, %s, %s::vector, %s, %s) RETURNING id""",
-                        (user_id, content, meta_json, vec_str, scope, expires_at),
-                    )
-                    row = cur.fetchone()
-                    if row:
-                        inserted_ids.append(row["id"])
-            conn.commit()
+            source = _open_source(conn, user_id, doc.file_hash, doc.filename, doc_type, "long_term", expires_at)
+            source_id = source["id"] if source else None
+            if source and source["status"] == "ready" and source["chunk_ids"]:
+                ids = [int(i) for i in source["chunk_ids"]]
+                update_documents_retention(ids, expires_at, new_ids=[])  # may extend, never shorten, the stored upload
+                return (f"{doc.filename or 'This document'} is already in your documents ({len(ids)} chunk(s)).", ids)
+            for i in range(0, len(doc.chunks), EMBED_BATCH_SIZE):
+                ids, inserted = _store_chunks(
+                    conn, user_id, doc.chunks[i:i + EMBED_BATCH_SIZE], doc.meta_json, "long_term", expires_at, source_id, known
+                )
+                doc_ids.update(dict.fromkeys(ids))
+                new_ids.extend(inserted)
+            if source_id is not None:
+                _save_source(conn, source_id, list(doc_ids), doc.chunks[0][:SUMMARY_CHARS], ready=True)
         finally:
             conn.close()
+        # Reused rows of an upload expiring sooner last as long as this one
+        update_documents_retention(list(doc_ids), expires_at, new_ids)
     except Exception as e:
-        err = str(e)
-        if "relation \"documents\" does not exist" in err or "does not exist" in err.lower():
-            return ("RAG documents table is missing. Run SQL migrations (e.g. scripts/run_sql_migrations.py) with 2-rag-documents.sql first.", [])
-        if "extension" in err.lower() and "vector" in err.lower():
-            return ("pgvector extension is required. Run 0-extensions.sql (CREATE EXTENSION IF NOT EXISTS vector) then 2-rag-documents.sql.", [])
-        return (f"Error storing document: {e}", [])
-
-    return (f"Added {len(chunks)} chunk(s) from {filename or 'document'} to your documents.", inserted_ids)
+        print(f"[rag] persist_session_document failed: {e}", flush=True)
+        return (f"Error storing document: {e}", list(doc_ids))
+    return (f"Saved {len(doc.chunks)} chunk(s) from {doc.filename or 'document'} to your documents.", list(doc_ids))
 
 
-def update_documents_retention(document_ids: list[int], expires_at: datetime | None) -> None:
-    """Set expires_at for the given document row ids (e.g. None = permanent, or now+7d for auto-offload)."""
+def update_documents_retention(document_ids: list[int], expires_at: datetime | None, new_ids: list[int] | None = None) -> None:
+    """Set the retention of an upload's rows (None = permanent, or e.g. now+7d for auto-offload). document_ids are all
+    its rows, new_ids the ones it inserted (default: all of them). Only those can get an earlier expiry, and not while
+    another live upload lists them: rows shared through content-hash reuse are only ever extended, so a "week" reply
+    never lets the sweeper delete chunks a kept upload still references."""
     if not document_ids:
         return
+    new_ids = list(document_ids) if new_ids is None else list(new_ids)
     try:
         conn = _get_conn()
         try:
+            own: list[int] = []
+            if _sources_supported:
+                # This upload's document_sources row: all its chunks are in the batch and it inserted some of them
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """SELECT id FROM document_sources
+                           WHERE cardinality(chunk_ids) > 0 AND chunk_ids <@ %s::bigint[] AND chunk_ids && %s::bigint[]""",
+                        (document_ids, new_ids),
+                    )
+                    own = [r["id"] for r in cur.fetchall()]
+            shared = (
+                """EXISTS (SELECT 1 FROM document_sources s WHERE d.id = ANY(s.chunk_ids) AND s.id <> ALL(%(own)s::bigint[])
+                           AND (s.expires_at IS NULL OR s.expires_at > %(expires)s))"""
+                if _sources_supported else "FALSE"
+            )
             with conn.cursor() as cur:
                 cur.execute(
-                    "UPDATE documents SET expires_at = %s WHERE id = ANY(%s)",
-                    (expires_at, document_ids),
+                    f"""UPDATE documents d SET expires_at = CASE
+                          WHEN %(expires)s::timestamptz IS NULL THEN NULL
+                          WHEN d.id = ANY(%(new)s::bigint[]) AND NOT {shared} THEN %(expires)s::timestamptz
+                          WHEN d.expires_at IS NULL THEN NULL
+                          ELSE GREATEST(d.expires_at, %(expires)s::timestamptz) END
+                        WHERE d.id = ANY(%(ids)s::bigint[]) RETURNING d.user_id""",
+                    {"expires": expires_at, "new": new_ids, "ids": list(document_ids), "own": own},
                 )
+                user_ids = {r["user_id"] for r in cur.fetchall()}
+                if _sources_supported:
+                    # Uploads follow their chunks (the keep/week reply after an upload); others made only of these
+                    # rows can only be extended, like the shared rows themselves
+                    cur.execute(
+                        """UPDATE document_sources SET updated_at = NOW(), expires_at = CASE
+                              WHEN id = ANY(%(own)s::bigint[]) OR %(expires)s::timestamptz IS NULL THEN %(expires)s::timestamptz
+                              WHEN expires_at IS NULL THEN NULL
+                              ELSE GREATEST(expires_at, %(expires)s::timestamptz) END
+                           WHERE cardinality(chunk_ids) > 0 AND chunk_ids <@ %(ids)s::bigint[]""",
+                        {"expires": expires_at, "own": own, "ids": list(document_ids)},
+                    )
             conn.commit()
+            for uid in user_ids:
+                _corpus_changed(uid)
         finally:
             conn.close()
     except Exception as e:
         print(f"[rag] update_documents_retention failed: {e}", flush=True)
 
 
-def retrieve(query: str, user_id: str | None = None, limit: int = 5) -> list[str]:
-    """Embed query, similarity search in Neon documents (user_id, not expired), return chunk texts."""
-    user_id = user_id or os.environ.get("USER_ID") or os.environ.get("EMAIL", "default")
-    if not query.strip():
-        return []
-
+def list_documents(user_id: str) -> list[dict]:
+    """The user's uploads (document_sources), newest first: id, filename, doc_type, status, chunk_count, scope,
+    expires_at, created_at, summary. Empty when the table is missing or the database is unavailable."""
     try:
-        model = _get_embedder()
-        query_emb = model.encode([query.strip()], show_progress_bar=False).tolist()[0]
+        conn = _get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """SELECT id, filename, doc_type, status, chunk_count, scope, expires_at, created_at, summary
+                       FROM document_sources
+                       WHERE user_id = %s AND (expires_at IS NULL OR expires_at > NOW())
+                       ORDER BY created_at DESC, id DESC""",
+                    (user_id,),
+                )
+                rows = [dict(r) for r in cur.fetchall()]
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
     except Exception as e:
-        print(f"[rag] Embedding failed: {e}", flush=True)
+        print(f"[rag] list_documents failed: {e}", flush=True)
         return []
 
-    vec_str = "[" + ",".join(str(x) for x in query_emb) + "]"
+
+def delete_document(user_id: str, source_id: int) -> dict | None:
+    """Delete one upload and its chunks (documents.source_id ON DELETE CASCADE). Chunks it stored that a later
+    upload reuses move to that upload first. Returns the deleted row's filename/chunk_count, or None if not found."""
     try:
         conn = _get_conn()
         try:
             with conn.cursor() as cur:
-                # Cosine distance <=>; lower = more similar. Exclude expired.
                 cur.execute(
-                    """SELECT content FROM documents
-                       WHERE user_id = %s AND (expires_at IS NULL OR expires_at > NOW())
-                       ORDER BY embedding <=> %s::vector
-                       LIMIT %s""",
-                    (user_id, vec_str, limit),
+                    """UPDATE documents d SET source_id = o.id FROM document_sources o
+                       WHERE d.source_id = %(id)s AND d.user_id = %(user_id)s
+                         AND o.user_id = %(user_id)s AND o.id <> %(id)s AND d.id = ANY(o.chunk_ids)""",
+                    {"id": source_id, "user_id": user_id},
+                )
+                cur.execute(
+                    "DELETE FROM document_sources WHERE id = %s AND user_id = %s RETURNING filename, chunk_count",
+                    (source_id, user_id),
                 )
-                rows = cur.fetchall()
-            return [r["content"] for r in rows] if rows else []
+                row = cur.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[rag] delete_document failed: {e}", flush=True)
+        return None
+    if row is not None:
+        _corpus_changed(user_id)
+    return dict(row) if row is not None else None
+
+
+def _hnsw_settings_sql() -> str:
+    """SET LOCAL prefix for the HNSW index (sql/6-documents-hnsw.sql): ef_search, plus iterative scans (pgvector 0.8+)
+    so the user_id / expires_at filter does not starve the top-k."""
+    sql = f"SET LOCAL hnsw.ef_search = {int(HNSW_EF_SEARCH)}; "
+    if HNSW_ITERATIVE_SCAN in ("strict_order", "relaxed_order") and _iterative_scan_supported:
+        sql += f"SET LOCAL hnsw.iterative_scan = {HNSW_ITERATIVE_SCAN}; "
+    return sql
+
+
+def _vector_search(conn, sql: str, params: tuple) -> list:
+    """Run an ORDER BY embedding <=> ... query with the per-query HNSW settings in the same round trip.
+    Retries once without iterative scans on pgvector < 0.8 (unknown hnsw.iterative_scan)."""
+    global _iterative_scan_supported
+    try:
+        with conn.cursor() as cur:
+            cur.execute(_hnsw_settings_sql() + sql, params)
+            rows = cur.fetchall()
+        conn.commit()  # end the transaction so SET LOCAL does not leak
+        return rows
+    except Exception as e:
+        if not _iterative_scan_supported or "iterative_scan" not in str(e):
+            raise
+        conn.rollback()
+        _iterative_scan_supported = False
+        print("[rag] hnsw.iterative_scan not supported (pgvector < 0.8); using ef_search only.", flush=True)
+        return _vector_search(conn, sql, params)
+
+
+def _storage(conn) -> tuple[str, bool]:
+    """(embedding column type "vector" | "halfvec", whether embedding_bq exists), read once per process from the
+    catalog so the search SQL matches what scripts/migrate_vector_storage.py left in the database."""
+    global _vector_storage, _vector_dim
+    if _vector_storage is None:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT attname, format_type(atttypid, atttypmod) AS type FROM pg_attribute
+                   WHERE attrelid = 'documents'::regclass AND attname IN ('embedding', 'embedding_bq') AND NOT attisdropped"""
+            )
+            types = {r["attname"]: r["type"] for r in cur.fetchall()}
+        conn.commit()
+        vec_type = "halfvec" if types.get("embedding", "").startswith("halfvec") else "vector"
+        dim = re.search(r"\((\d+)\)", types.get("embedding", ""))
+        _vector_dim = int(dim.group(1)) if dim else None
+        _vector_storage = (vec_type, "embedding_bq" in types)
+        if _vector_storage != ("vector", False):
+            print(f"[rag] Vector storage: {vec_type}{' + binary index' if _vector_storage[1] else ''}", flush=True)
+    return _vector_storage
+
+
+def _nearest_sql(columns: str, limit: str, storage: tuple[str, bool], table: str = "documents") -> str:
+    """The user's non-expired chunks nearest to %(vec)s with their cosine distance, best first. With a binary index,
+    Hamming distance on embedding_bq picks BINARY_RESCORE_FACTOR x limit candidates, then the stored embedding
+    (full precision) ranks them."""
+    vec_type, binary = storage
+    qvec = f"%(vec)s::{vec_type}"
+    where = "user_id = %(user_id)s AND (expires_at IS NULL OR expires_at > NOW())"
+    if not binary:
+        return (
+            f"SELECT {columns}, embedding <=> {qvec} AS distance FROM {table} WHERE {where} "
+            f"ORDER BY embedding <=> {qvec} LIMIT %({limit})s"
+        )
+    return (
+        f"SELECT {columns}, embedding <=> {qvec} AS distance FROM ("
+        f"SELECT {columns}, embedding FROM {table} WHERE {where} "
+        f"ORDER BY embedding_bq <~> binary_quantize({qvec})::bit({_vector_dim or EMBEDDING_DIM}) "
+        f"LIMIT %({limit})s * {BINARY_RESCORE_FACTOR}) c ORDER BY distance LIMIT %({limit})s"
+    )
+
+
+def _sql(template: str, storage: tuple[str, bool]) -> str:
+    """A search statement below for the detected vector storage ({nearest}: candidate rows, {qvec}: typed query)."""
+    key = (template, storage)
+    if key not in _sql_cache:
+        _sql_cache[key] = template.format(
+            qvec=f"%(vec)s::{storage[0]}",
+            nearest=_nearest_sql("id", "candidates", storage),
+            nearest_content=_nearest_sql("id, content", "limit", storage),
+        )
+    return _sql_cache[key]
+
+
+_VECTOR_SQL = "{nearest_content}"
+
+# Two-stage: the user's TOP_SOURCES uploads by summary embedding (a few rows per user, no index needed), then an exact
+# cosine ranking over just their chunks (primary-key lookups instead of the whole-corpus HNSW scan).
+_TWO_STAGE_SQL = """WITH src AS (
+    SELECT chunk_ids FROM document_sources
+    WHERE user_id = %(user_id)s AND status = 'ready' AND summary_embedding IS NOT NULL
+      AND (expires_at IS NULL OR expires_at > NOW())
+    ORDER BY summary_embedding <=> %(vec)s::vector
+    LIMIT %(top_sources)s
+)
+SELECT d.id, d.content, d.embedding <=> {qvec} AS distance FROM documents d
+WHERE d.id IN (SELECT unnest(chunk_ids) FROM src)
+  AND d.user_id = %(user_id)s AND (d.expires_at IS NULL OR d.expires_at > NOW())
+ORDER BY distance
+LIMIT %(limit)s"""
+
+# One statement: top candidates by cosine distance and by ts_rank_cd (query terms OR-ed, so one matching
+# identifier is enough), fused with reciprocal-rank fusion: score = sum 1 / (RRF_K + rank).
+_HYBRID_SQL = """WITH q AS (
+    SELECT NULLIF(replace(plainto_tsquery('english', %(query)s)::text, '&', '|'), '')::tsquery AS tsq
+), vec AS (
+    SELECT id, row_number() OVER (ORDER BY distance) AS rnk FROM ({nearest}) v
+), lex AS (
+    SELECT id, row_number() OVER (ORDER BY lex_rank DESC) AS rnk FROM (
+        SELECT d.id, ts_rank_cd(d.content_tsv, q.tsq) AS lex_rank FROM documents d, q
+        WHERE q.tsq IS NOT NULL AND d.content_tsv @@ q.tsq
+          AND d.user_id = %(user_id)s AND (d.expires_at IS NULL OR d.expires_at > NOW())
+        ORDER BY ts_rank_cd(d.content_tsv, q.tsq) DESC
+        LIMIT %(candidates)s
+    ) l
+)
+SELECT d.id, d.content, d.embedding <=> {qvec} AS distance, lex.rnk IS NOT NULL AS lexical,
+       COALESCE(1.0 / (%(rrf_k)s + vec.rnk), 0) + COALESCE(1.0 / (%(rrf_k)s + lex.rnk), 0) AS rrf_score
+FROM vec FULL OUTER JOIN lex USING (id)
+JOIN documents d ON d.id = COALESCE(vec.id, lex.id)
+ORDER BY rrf_score DESC
+LIMIT %(limit)s"""
+
+# Lexical leg of _HYBRID_SQL alone, for users whose vector ranking comes from vector_cache (fused by _fuse_cached).
+_LEXICAL_SQL = """WITH q AS (
+    SELECT NULLIF(replace(plainto_tsquery('english', %(query)s)::text, '&', '|'), '')::tsquery AS tsq
+)
+SELECT d.id, d.content FROM documents d, q
+WHERE q.tsq IS NOT NULL AND d.content_tsv @@ q.tsq
+  AND d.user_id = %(user_id)s AND (d.expires_at IS NULL OR d.expires_at > NOW())
+ORDER BY ts_rank_cd(d.content_tsv, q.tsq) DESC
+LIMIT %(candidates)s"""
+
+
+def _fuse_cached(index, query_emb, lexical_rows: list[dict], candidates: int, limit: int) -> list[dict]:
+    """Hybrid hits from an in-memory vector ranking (vector_cache.UserIndex) and _LEXICAL_SQL rows, fused with the
+    same reciprocal-rank formula as _HYBRID_SQL. Lexical-only chunks get their distance from the index."""
+    hits: dict[int, dict] = {}
+    for rank, (i, score) in enumerate(index.top_scored(query_emb, candidates), 1):
+        doc_id = int(index.ids[i])
+        hits[doc_id] = {
+            "id": doc_id, "content": index.contents[i], "distance": 1.0 - score, "lexical": False,
+            "rrf_score": 1.0 / (RRF_K + rank),
+        }
+    lexical_only = [r["id"] for r in lexical_rows if r["id"] not in hits]
+    similarity = index.similarities(query_emb, lexical_only) if lexical_only else {}
+    for rank, r in enumerate(lexical_rows, 1):
+        hit = hits.get(r["id"])
+        if hit is None:
+            sim = similarity.get(r["id"])
+            hit = hits[r["id"]] = {
+                "id": r["id"], "content": r["content"], "distance": 1.0 - sim if sim is not None else None,
+                "rrf_score": 0.0,
+            }
+        hit["lexical"] = True
+        hit["rrf_score"] += 1.0 / (RRF_K + rank)
+    ranked = sorted(hits.values(), key=lambda h: h["rrf_score"], reverse=True)[:limit]
+    return [{k: h[k] for k in ("id", "content", "distance", "lexical")} for h in ranked]
+
+
+def _contents_by_ids(conn, user_id: str, ids: list[int]) -> dict[int, str] | None:
+    """Chunk texts for cached result ids; None if any row is gone or expired (the cached result is stale)."""
+    if not ids:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute(
+            """SELECT id, content FROM documents
+               WHERE id = ANY(%s) AND user_id = %s AND (expires_at IS NULL OR expires_at > NOW())""",
+            (list(ids), user_id),
+        )
+        by_id = {r["id"]: r["content"] for r in cur.fetchall()}
+    conn.commit()
+    if len(by_id) != len(set(ids)):
+        return None
+    return by_id
+
+
+def _passes_similarity(hit: dict, min_similarity: float | None) -> bool:
+    """Keep lexical matches and chunks whose cosine similarity (1 - distance) reaches min_similarity."""
+    if min_similarity is None or hit.get("lexical"):
+        return True
+    distance = hit.get("distance")
+    return distance is not None and 1.0 - distance >= min_similarity
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt-token count (~CHARS_PER_TOKEN characters per token); good enough for budgeting context."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _mmr_order(hits: list[dict], mmr_lambda: float) -> list[dict]:
+    """Maximal marginal relevance over hits in ranking order. Relevance is the rank mapped to (0, 1] (so vector,
+    hybrid and cached rankings are treated alike); redundancy is word-set Jaccard overlap with the chunks already
+    picked, which catches the splitter's overlapping neighbours and re-uploaded copies without extra vectors."""
+    if len(hits) < 2 or mmr_lambda >= 1.0:
+        return list(hits)
+    words = [set(_WORD.findall(h["content"].lower())) for h in hits]
+    n = len(hits)
+    remaining = list(range(n))
+    picked: list[int] = []
+    while remaining:
+        best, best_score = remaining[0], float("-inf")
+        for i in remaining:
+            overlap = 0.0
+            for j in picked:
+                union = len(words[i] | words[j])
+                if union:
+                    overlap = max(overlap, len(words[i] & words[j]) / union)
+            score = mmr_lambda * (1.0 - i / n) - (1.0 - mmr_lambda) * overlap
+            if score > best_score:
+                best, best_score = i, score
+        picked.append(best)
+        remaining.remove(best)
+    return [hits[i] for i in picked]
+
+
+def select_context(
+    hits: list[dict],
+    limit: int,
+    min_similarity: float | None = None,
+    relative_cutoff: float | None = None,
+    mmr_lambda: float | None = None,
+    max_tokens: int | None = None,
+) -> list[dict]:
+    """Adaptive top-k over ranked hits: drop chunks under min_similarity or more than relative_cutoff below the best
+    hit's similarity (lexical matches always stay), reorder with MMR, then take up to limit chunks that fit in
+    max_tokens. The first chunk is always kept so a long but relevant passage is not lost to the budget."""
+    hits = [h for h in hits if _passes_similarity(h, min_similarity)]
+    if relative_cutoff is not None:
+        sims = [1.0 - h["distance"] for h in hits if h.get("distance") is not None]
+        if sims:
+            floor = max(sims) - relative_cutoff
+            hits = [h for h in hits if h.get("lexical") or (h.get("distance") is not None and 1.0 - h["distance"] >= floor)]
+    if mmr_lambda is not None:
+        hits = _mmr_order(hits, mmr_lambda)
+    selected: list[dict] = []
+    used = 0
+    for h in hits:
+        if len(selected) >= limit:
+            break
+        tokens = estimate_tokens(h["content"])
+        if max_tokens is not None and selected and used + tokens > max_tokens:
+            continue  # a shorter lower-ranked chunk may still fit
+        selected.append(h)
+        used += tokens
+    return selected
+
+
+def _search_hits(query: str, user_id: str, limit: int, query_vector: list[float] | None, mode: str) -> list[dict]:
+    """Ranked hits (id, content, distance, lexical) from query_cache, vector_cache or Neon, best first."""
+    global _hybrid_supported, _sources_supported, _vector_storage
+    model = _embedding_model()  # a query_vector from the caller was embedded with this model (embedding_model())
+    corpus_version = query_cache.version(user_id)
+    cached_vector, cached_hits = query_cache.get(user_id, query, limit, mode)
+    query_vector = query_vector or cached_vector
+
+    def _done(hits: list[dict], query_emb) -> list[dict]:
+        query_cache.put(
+            user_id, query, limit, mode, query_emb,
+            [{k: h[k] for k in ("id", "distance", "lexical")} for h in hits], corpus_version,
+        )
+        return hits
+
+    # Warm users rank vectors in memory; hybrid fuses that ranking with a lexical-only query (no Neon vector scan)
+    index = vector_cache.get(user_id)
+    if index is not None:
+        try:
+            if mode == "hybrid" and _hybrid_supported:
+                emb_future = None if query_vector else submit_query(query.strip(), model)
+                candidates = max(limit * HYBRID_CANDIDATE_FACTOR, 20)
+                conn = _get_conn()
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(_LEXICAL_SQL, {"user_id": user_id, "query": query.strip(), "candidates": candidates})
+                        lexical_rows = cur.fetchall()
+                    conn.commit()
+                finally:
+                    conn.close()
+                query_emb = query_vector or emb_future.result()
+                return _done(_fuse_cached(index, query_emb, lexical_rows, candidates, limit), query_emb)
+            query_emb = query_vector or submit_query(query.strip(), model).result()
+            hits = [
+                {"id": int(index.ids[i]), "content": index.contents[i], "distance": 1.0 - score, "lexical": False}
+                for i, score in index.top_scored(query_emb, limit)
+            ]
+            return _done(hits, query_emb)
+        except Exception as e:
+            print(f"[rag] In-memory search failed, using Neon: {e}", flush=True)
+
+    # Queue the encode first (embeddings.EmbeddingExecutor) so it overlaps with the Neon connect
+    emb_future = None if (query_vector or cached_hits is not None) else submit_query(query.strip(), model)
+    try:
+        conn = _get_conn()
+        try:
+            if _embedding_model(conn) != model:
+                # Switched while connecting: cached and queued vectors belong to the old model
+                model, query_vector, cached_hits = _documents_model, None, None
+                emb_future = submit_query(query.strip(), model)
+            if cached_hits is not None:
+                by_id = _contents_by_ids(conn, user_id, [h["id"] for h in cached_hits])
+                if by_id is not None:
+                    return [dict(h, content=by_id[h["id"]]) for h in cached_hits]
+                if emb_future is None and not query_vector:
+                    emb_future = submit_query(query.strip(), model)
+            try:
+                query_emb = query_vector or emb_future.result()
+            except Exception as e:
+                print(f"[rag] Embedding failed: {e}", flush=True)
+                return []
+            storage = _storage(conn)
+            params = {
+                "user_id": user_id,
+                "vec": _vec_literal(query_emb),
+                "limit": limit,
+                "query": query.strip(),
+                "candidates": max(limit * HYBRID_CANDIDATE_FACTOR, 20),
+                "rrf_k": RRF_K,
+                "top_sources": TOP_SOURCES,
+            }
+            rows = None
+            if mode == "two_stage" and _sources_supported:
+                try:
+                    rows = _vector_search(conn, _sql(_TWO_STAGE_SQL, storage), params)
+                except Exception as e:
+                    if "document_sources" not in str(e):
+                        raise
+                    conn.rollback()
+                    _sources_supported = False
+                    print("[rag] document_sources missing (run sql/10-document-sources.sql); using vector-only retrieval.", flush=True)
+                if rows is not None and len(rows) < limit:
+                    rows = None  # too few chunks in summarised uploads (legacy or still ingesting): search them all
+            if mode == "hybrid" and _hybrid_supported:
+                try:
+                    rows = _vector_search(conn, _sql(_HYBRID_SQL, storage), params)
+                except Exception as e:
+                    if "content_tsv" not in str(e):
+                        raise
+                    conn.rollback()
+                    _hybrid_supported = False
+                    print("[rag] documents.content_tsv missing (run sql/7-documents-fts.sql); using vector-only retrieval.", flush=True)
+            if rows is None:
+                # Cosine distance <=>; lower = more similar. Exclude expired.
+                rows = _vector_search(conn, _sql(_VECTOR_SQL, storage), params)
+            hits = [
+                {
+                    "id": r["id"],
+                    "content": r["content"],
+                    "distance": float(r["distance"]) if r.get("distance") is not None else None,
+                    "lexical": bool(r.get("lexical")),
+                }
+                for r in rows or []
+            ]
+            return _done(hits, query_emb)
         finally:
             conn.close()
     except Exception as e:
         print(f"[rag] Retrieve failed: {e}", flush=True)
+        _vector_storage = None  # re-read the storage next time in case the table was migrated
+        embedding_models.invalidate()  # ... or the embedding model switched
+        return []
+
+
+def _merge_session_hits(hits: list[dict], session_hits: list[dict], limit: int) -> list[dict]:
+    """Merge session_store hits into persistent ones by cosine distance, keeping each list's own order. A persistent
+    hit without a distance (lexical-only match in hybrid mode) stays ahead of the session hits still to place."""
+    merged: list[dict] = []
+    i = j = 0
+    while len(merged) < limit and (i < len(hits) or j < len(session_hits)):
+        if j < len(session_hits) and (
+            i >= len(hits) or (hits[i]["distance"] is not None and session_hits[j]["distance"] <= hits[i]["distance"])
+        ):
+            merged.append(session_hits[j])
+            j += 1
+        else:
+            merged.append(hits[i])
+            i += 1
+    return merged
+
+
+def retrieve_scored(
+    query: str,
+    user_id: str | None = None,
+    limit: int = 5,
+    query_vector: list[float] | None = None,
+    mode: str | None = None,
+    min_similarity: float | None = None,
+    relative_cutoff: float | None = None,
+    mmr_lambda: float | None = None,
+    max_tokens: int | None = None,
+    rerank: bool | None = None,
+) -> list[dict]:
+    """Like retrieve(), but returns hits as dicts: id, content, distance (cosine distance to the query; lower = more
+    similar) and lexical (matched the full-text query in hybrid mode). With min_similarity, hits that are neither
+    lexical matches nor at least that cosine-similar are dropped, so weak matches never reach the prompt.
+    relative_cutoff, mmr_lambda and max_tokens turn on adaptive selection (select_context): limit * CANDIDATE_FACTOR
+    candidates are searched and at most limit diverse chunks within the token budget are returned.
+    rerank (default PA_RAG_RERANK) over-fetches reranker.CANDIDATES chunks and orders them by cross-encoder score
+    (hits gain rerank_score); past the reranker's latency budget the search order is kept.
+    Chunks of the user's in-memory session documents (ingest_session_document) are merged in by distance; those
+    hits have negative ids and session=True. Returned chunks count as hits for document_usage (quota eviction)."""
+    user_id = user_id or os.environ.get("USER_ID") or os.environ.get("EMAIL", "default")
+    if not query.strip():
         return []
+    mode = (mode or RETRIEVE_MODE).strip().lower()
+    rerank = reranker.ENABLED if rerank is None else rerank
+    adaptive = relative_cutoff is not None or mmr_lambda is not None or max_tokens is not None
+    fetch = limit * CANDIDATE_FACTOR if adaptive else limit
+    if rerank:
+        fetch = max(fetch, reranker.CANDIDATES)
+    session_hits: list[dict] = []
+    if session_store.has_documents(user_id):
+        try:
+            query_vector = query_vector or submit_query(query.strip(), _embedding_model()).result()
+            session_hits = session_store.search(user_id, query_vector, fetch)
+        except Exception as e:
+            print(f"[rag] Session search failed: {e}", flush=True)
+    hits = _search_hits(query, user_id, fetch, query_vector, mode)
+    if session_hits:
+        hits = _merge_session_hits(hits, session_hits, fetch)
+    if rerank:
+        hits = reranker.rerank(query, hits) or hits
+    selected = select_context(hits, limit, min_similarity, relative_cutoff, mmr_lambda, max_tokens)
+    document_usage.record(user_id, [h["id"] for h in selected])
+    return selected
+
+
+def retrieve(
+    query: str,
+    user_id: str | None = None,
+    limit: int = 5,
+    query_vector: list[float] | None = None,
+    mode: str | None = None,
+    min_similarity: float | None = None,
+    relative_cutoff: float | None = None,
+    mmr_lambda: float | None = None,
+    max_tokens: int | None = None,
+    rerank: bool | None = None,
+) -> list[str]:
+    """Embed query, search Neon documents (user_id, not expired), return chunk texts.
+    mode "hybrid" (default, RETRIEVE_MODE) fuses lexical (content_tsv, sql/7-documents-fts.sql) and vector rankings
+    with RRF in one statement; "vector" is cosine search only; "two_stage" picks the best uploads by summary
+    embedding (document_sources) and ranks chunks within them.
+    Pass query_vector (embeddings.embed_query(query, embedding_model())) to reuse an embedding already computed this turn.
+    Repeated queries are answered from query_cache (result ids + embedding) until the user's documents change.
+    For users warm in vector_cache (PA_RAG_VECTOR_CACHE=1) the vector ranking is computed in memory; hybrid mode
+    fuses it with a lexical-only Postgres query.
+    See retrieve_scored for the similarity cutoffs, MMR, token budget and cross-encoder rerank."""
+    hits = retrieve_scored(
+        query, user_id, limit, query_vector, mode, min_similarity, relative_cutoff, mmr_lambda, max_tokens, rerank
+    )
+    return [h["content"] for h in hits]
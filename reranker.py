@@ -0,0 +1,129 @@
+# Optional cross-encoder rerank stage for rag.retrieve_scored (PA_RAG_RERANK=1). Vector/hybrid search over-fetches
+# CANDIDATES chunks; a small local cross-encoder scores each (query, chunk) pair and the best go to the prompt or
+# search_my_documents. Scores are cached per (query hash, chunk id) in an LRU (chunk rows are content-addressed and
+# never edited, so a cached score only goes stale when the row is deleted, and then it is simply never asked for).
+# Scoring runs on one worker thread with a latency budget (BUDGET_MS): past it, or while the model is still loading,
+# rerank() returns None and the caller keeps the search order; the late scores still land in the cache.
+# Needs sentence-transformers (full image); without it reranking is a no-op. Benchmark: scripts/bench_rerank.py.
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import query_cache
+
+ENABLED = (os.environ.get("PA_RAG_RERANK") or "0").strip() == "1"
+MODEL = os.environ.get("PA_RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+CANDIDATES = int(os.environ.get("PA_RAG_RERANK_CANDIDATES", "20"))
+BUDGET_MS = float(os.environ.get("PA_RAG_RERANK_BUDGET_MS", "300"))
+CACHE_SIZE = int(os.environ.get("PA_RAG_RERANK_CACHE_SIZE", "4096"))
+
+_model = None
+_loading = False
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+_scores: "OrderedDict[tuple[str, int], float]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"calls": 0, "reranked": 0, "timeouts": 0, "unavailable": 0, "cached_pairs": 0, "scored_pairs": 0, "last_ms": None}
+
+
+def query_hash(query: str) -> str:
+    """Cache key for a query: normalised like query_cache, so rephrasings differing in case/spacing share scores."""
+    return hashlib.sha256(query_cache.normalize(query).encode("utf-8")).hexdigest()[:16]
+
+
+def _load() -> None:
+    global _model, _loading
+    try:
+        from sentence_transformers import CrossEncoder
+        t0 = time.perf_counter()
+        model = CrossEncoder(MODEL)
+        model.predict([("warm up", "warm up")])
+        _model = model
+        print(f"[reranker] Loaded {MODEL} in {time.perf_counter() - t0:.2f}s", flush=True)
+    except Exception as e:
+        print(f"[reranker] Cross-encoder unavailable ({e}); keeping search order.", flush=True)
+    finally:
+        with _lock:
+            _loading = False
+
+
+def warm_up() -> None:
+    """Start loading the cross-encoder in the background (webhook lifespan when PA_RAG_RERANK=1)."""
+    global _loading
+    with _lock:
+        if _model is not None or _loading:
+            return
+        _loading = True
+    _executor.submit(_load)
+
+
+def _score(query: str, qhash: str, pairs: list[tuple[int, str]]) -> dict[int, float]:
+    scores = _model.predict([(query, content) for _, content in pairs])
+    out = {chunk_id: float(s) for (chunk_id, _), s in zip(pairs, scores)}
+    with _lock:
+        for chunk_id, s in out.items():
+            _scores[(qhash, chunk_id)] = s
+            _scores.move_to_end((qhash, chunk_id))
+        while len(_scores) > CACHE_SIZE:
+            _scores.popitem(last=False)
+        _stats["scored_pairs"] += len(out)
+    return out
+
+
+def rerank(query: str, hits: list[dict], budget_ms: float | None = None) -> list[dict] | None:
+    """hits (id, content, ...) reordered by cross-encoder score, each with rerank_score added; None when the model
+    is unavailable or scoring the uncached pairs would exceed budget_ms (default BUDGET_MS)."""
+    t0 = time.perf_counter()
+    with _lock:
+        _stats["calls"] += 1
+    if not hits:
+        return []
+    if _model is None:
+        warm_up()
+        with _lock:
+            _stats["unavailable"] += 1
+        return None
+    qhash = query_hash(query)
+    scores: dict[int, float] = {}
+    missing: list[tuple[int, str]] = []
+    with _lock:
+        for h in hits:
+            s = _scores.get((qhash, h["id"]))
+            if s is None:
+                missing.append((h["id"], h["content"]))
+            else:
+                _scores.move_to_end((qhash, h["id"]))
+                scores[h["id"]] = s
+        _stats["cached_pairs"] += len(scores)
+    if missing:
+        budget = (BUDGET_MS if budget_ms is None else budget_ms) / 1000.0
+        future = _executor.submit(_score, query, qhash, missing)
+        try:
+            scores.update(future.result(timeout=max(0.0, budget - (time.perf_counter() - t0))))
+        except FutureTimeout:
+            with _lock:
+                _stats["timeouts"] += 1
+            print(f"[reranker] Over {budget * 1000:.0f} ms budget for {len(missing)} pair(s); keeping search order.", flush=True)
+            return None
+        except Exception as e:
+            print(f"[reranker] Scoring failed: {e}", flush=True)
+            return None
+    ranked = sorted((dict(h, rerank_score=scores[h["id"]]) for h in hits), key=lambda h: -h["rerank_score"])
+    elapsed = (time.perf_counter() - t0) * 1000
+    with _lock:
+        _stats["reranked"] += 1
+        _stats["last_ms"] = round(elapsed, 1)
+    return ranked
+
+
+def clear() -> None:
+    with _lock:
+        _scores.clear()
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, enabled=ENABLED, model=MODEL, loaded=_model is not None, cache_entries=len(_scores))
@@ -0,0 +1,81 @@
+# Retrieval gating for call_agent: decide per turn whether document context (rag.retrieve_scored) is worth fetching.
+# Small talk ("hi", "thanks"), short acknowledgements and clear task/calendar/email/image commands skip RAG unless
+# they mention documents; users without any documents (rag.document_count, cached; no session_store uploads either)
+# skip it too. When RAG runs, call_agent passes MIN_SIMILARITY so weak matches are not injected. Every decision is
+# logged as one "[retrieval_gate]" line (reason, retrieve ms, chunks, approx tokens) and counted in stats() for /health.
+# Set PA_RAG_GATE=0 to always retrieve (previous behaviour).
+
+import os
+import re
+import threading
+
+import rag
+import session_store
+
+ENABLED = (os.environ.get("PA_RAG_GATE") or "1").strip() != "0"
+# Cosine similarity (1 - distance) below which a non-lexical chunk is not injected; all-mpnet-base-v2 scale
+MIN_SIMILARITY = float(os.environ.get("PA_RAG_MIN_SIMILARITY", "0.25"))
+
+_DOC_HINTS = re.compile(
+    r"\b(document|doc|docs|file|files|pdf|upload(?:ed)?|attachment|contract|agreement|policy|policies|report|"
+    r"invoice|clause|section|page|spreadsheet|sheet|notes|minutes|according to|what does .+ say)\b",
+    re.I,
+)
+_SMALL_TALK = re.compile(
+    r"^(hi|hey|hello|hiya|yo|morning|good (morning|afternoon|evening|night)|thanks|thank you|thx|ty|cheers|ok|okay|"
+    r"k|cool|great|nice|perfect|awesome|sure|yes|yep|yeah|no|nope|nah|bye|goodbye|see you|lol|haha|done|"
+    r"go ahead|do it|send it|sounds good|got it|noted|keep|week)\b[\s!.,?🙂😊👍🙏]*$",
+    re.I,
+)
+_TOOL_INTENT = re.compile(
+    r"^(please\s+)?(list|show|add|create|make|delete|remove|update|mark|complete|move|rename|set|schedule|book|"
+    r"cancel|remind|send|reply|draft|forward|generate|draw|search the (web|internet)|google)\b.*\b("
+    r"task|tasks|project|projects|todo|to-do|reminder|reminders|meeting|meetings|event|events|calendar|email|emails|"
+    r"mail|inbox|image|picture|photo)\b",
+    re.I,
+)
+
+_lock = threading.Lock()
+_stats = {"retrieve": 0, "skip": 0, "reasons": {}, "tokens_injected": 0}
+
+
+def decide(text: str, user_id: str | None) -> tuple[bool, str]:
+    """(retrieve?, reason) for the user's latest message. Cheap: regexes plus a cached per-user chunk count."""
+    text = (text or "").strip()
+    if not text:
+        return False, "empty"
+    if not ENABLED:
+        return True, "gate_disabled"
+    mentions_docs = bool(_DOC_HINTS.search(text))
+    if not mentions_docs:
+        if "[Image:" in text:
+            return False, "image"
+        if _SMALL_TALK.match(text):
+            return False, "small_talk"
+        if _TOOL_INTENT.match(text):
+            return False, "tool_intent"
+    count = rag.document_count(user_id) if user_id else None
+    if count == 0 and not session_store.has_documents(user_id):
+        return False, "no_documents"
+    return True, "doc_hint" if mentions_docs else "default"
+
+
+def record(retrieved: bool, reason: str, ms: float = 0.0, chunks: int = 0, chars: int = 0) -> None:
+    """Log and count one gating decision (for measuring saved latency and prompt tokens)."""
+    tokens = chars // rag.CHARS_PER_TOKEN
+    with _lock:
+        _stats["retrieve" if retrieved else "skip"] += 1
+        _stats["reasons"][reason] = _stats["reasons"].get(reason, 0) + 1
+        _stats["tokens_injected"] += tokens
+    if retrieved:
+        print(
+            f"[retrieval_gate] retrieve reason={reason} ms={ms:.1f} chunks={chunks} ~tokens={tokens}",
+            flush=True,
+        )
+    else:
+        print(f"[retrieval_gate] skip reason={reason}", flush=True)
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, reasons=dict(_stats["reasons"]), enabled=ENABLED, min_similarity=MIN_SIMILARITY)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Time Docling conversions: a new DocumentConverter + temp file per document (old rag._bytes_to_text path) vs the
+# long-lived pooled converter with in-memory input (docling_pool.py). Reports converter init and first vs
+# subsequent conversion times; run twice to see the effect of the local artifact cache (PA_DOCLING_ARTIFACTS).
+# Usage: python scripts/bench_docling.py path/to/file.pdf [--runs 3]
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+
+
+def _per_document(data: bytes, ext: str) -> float:
+    from docling.document_converter import DocumentConverter
+    t0 = time.perf_counter()
+    with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
+        tmp.write(data)
+        tmp_path = tmp.name
+    try:
+        DocumentConverter().convert(tmp_path).document.export_to_markdown()
+    finally:
+        os.unlink(tmp_path)
+    return time.perf_counter() - t0
+
+
+def _pooled(data: bytes, filename: str) -> float:
+    import docling_pool
+    t0 = time.perf_counter()
+    docling_pool.convert(data, filename)
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-document vs pooled Docling conversion times.")
+    parser.add_argument("path")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    with open(args.path, "rb") as f:
+        data = f.read()
+    filename = os.path.basename(args.path)
+    try:
+        import docling  # noqa: F401
+    except ImportError:
+        print("Docling not installed.", file=sys.stderr)
+        sys.exit(1)
+
+    import docling_pool
+    per_doc = [_per_document(data, os.path.splitext(filename)[1] or ".pdf") for _ in range(args.runs)]
+    pooled = [_pooled(data, filename) for _ in range(args.runs)]
+    stats = docling_pool.stats()
+
+    print(f"file={filename} ({len(data) / 1024:.0f} KB) runs={args.runs} artifacts={docling_pool.ARTIFACTS_PATH or 'default'}")
+    print(f"  new converter per document : first {per_doc[0]:6.2f}s  subsequent median {statistics.median(per_doc[1:] or per_doc):6.2f}s")
+    print(f"  pooled converter           : first {pooled[0]:6.2f}s  subsequent median {statistics.median(pooled[1:] or pooled):6.2f}s")
+    print(f"  pooled converter init      : {stats['init_seconds'][0] if stats['init_seconds'] else 0:6.2f}s (included in pooled first)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Compare embedding backends on a fixed corpus: torch (current) vs int8-quantized ONNX (PA_EMBED_BACKEND=onnx).
+# Reports single-query latency (p50/p95), batch throughput and cosine agreement with the torch vectors
+# (agreement near 1.0 means existing Neon/Qdrant vectors stay usable without re-embedding).
+# Usage: python scripts/bench_embedding_backends.py [--runs 50] [--onnx-file onnx/model_quint8_avx2.onnx]
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+
+CORPUS = [
+    "The employee shall give one month's written notice before terminating this agreement.",
+    "Invoice INV-2041 is payable within 30 days of the invoice date.",
+    "Personal data must be deleted within 90 days after the purpose of processing has ended.",
+    "The landlord is responsible for structural repairs to the Windhoek office premises.",
+    "Clause 7.3: either party may terminate for material breach not remedied within 14 days.",
+    "The supplier will deliver the final report and source code by 31 March.",
+    "All staff must complete the annual compliance training before the end of the financial year.",
+    "Meeting notes: agreed to move the product launch to the second quarter.",
+    "The warranty period is twelve months from the date of delivery.",
+    "Expenses above N$5,000 require approval from the finance manager.",
+    "What is the notice period in my employment contract?",
+    "When is the invoice due?",
+    "Who is responsible for repairs?",
+    "Summarise the data retention policy",
+    "hi",
+    "thanks, that helps",
+]
+
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = sum(x * x for x in a) ** 0.5
+    nb = sum(y * y for y in b) ** 0.5
+    return dot / (na * nb) if na and nb else 0.0
+
+
+def _bench(model, runs: int) -> dict:
+    latencies = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        model.encode([CORPUS[i % len(CORPUS)]], show_progress_bar=False)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    batch = CORPUS * 8
+    t0 = time.perf_counter()
+    vectors = model.encode(batch, batch_size=32, show_progress_bar=False)
+    throughput = len(batch) / (time.perf_counter() - t0)
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "per_s": throughput,
+        "vectors": vectors[: len(CORPUS)].tolist(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare torch vs quantized ONNX embedding backends.")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--onnx-file", default=None, help="ONNX file inside the model repo (default PA_EMBED_ONNX_FILE)")
+    args = parser.parse_args()
+    if args.onnx_file:
+        os.environ["PA_EMBED_ONNX_FILE"] = args.onnx_file
+
+    import embeddings
+    try:
+        torch_model = embeddings.get_model(backend="torch")
+    except ImportError:
+        print("sentence-transformers not installed.", file=sys.stderr)
+        sys.exit(1)
+    onnx_model = embeddings.get_model(backend="onnx")
+    stats = embeddings.load_stats()
+    if stats.get(embeddings.model_key(embeddings.DEFAULT_MODEL, "onnx"), {}).get("backend") != "onnx":
+        print("ONNX backend unavailable (pip install 'sentence-transformers[onnx]'); nothing to compare.", file=sys.stderr)
+        sys.exit(1)
+
+    results = {"torch": _bench(torch_model, args.runs), "onnx": _bench(onnx_model, args.runs)}
+    sims = [_cosine(a, b) for a, b in zip(results["torch"]["vectors"], results["onnx"]["vectors"])]
+    dim = len(results["onnx"]["vectors"][0])
+
+    print(f"model={embeddings.DEFAULT_MODEL} onnx_file={embeddings.ONNX_FILE} dim={dim} corpus={len(CORPUS)} runs={args.runs}")
+    print(f"  {'backend':8} {'p50 ms':>8} {'p95 ms':>8} {'emb/s':>8} {'load s':>8} {'RSS +MB':>8}")
+    for backend, r in results.items():
+        s = stats.get(embeddings.model_key(embeddings.DEFAULT_MODEL, backend), {})
+        print(f"  {backend:8} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['per_s']:8.1f} "
+              f"{s.get('load_seconds', 0):8.2f} {s.get('rss_delta_mb', 0):8.0f}")
+    print(f"  speedup (p50): {results['torch']['p50_ms'] / results['onnx']['p50_ms']:.2f}x")
+    print(f"  cosine(torch, onnx): mean={statistics.mean(sims):.4f} min={min(sims):.4f}")
+    if dim != embeddings.EMBEDDING_DIM:
+        print(f"  WARNING: ONNX output dim {dim} != EMBEDDING_DIM {embeddings.EMBEDDING_DIM}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Benchmark query embedding under concurrent load: one model.encode per request (old path) vs the
+# micro-batching EmbeddingExecutor in embeddings.py. Reports embeddings/second for each.
+# Usage: python scripts/bench_embeddings.py [--concurrency 16] [--requests 256]
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+
+QUERIES = [
+    "What is the notice period in my employment contract?",
+    "Summarise the compliance policy for data retention",
+    "When is the invoice INV-2041 due?",
+    "Who signed the lease agreement for the Windhoek office?",
+    "List the deliverables in the statement of work",
+    "What does clause 7.3 say about termination?",
+    "hi",
+    "thanks, that helps",
+]
+
+
+def _run(fn, n_requests: int, concurrency: int) -> float:
+    texts = [QUERIES[i % len(QUERIES)] for i in range(n_requests)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(fn, texts))
+    return n_requests / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query embedding throughput: per-request encode vs micro-batching executor.")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=256)
+    args = parser.parse_args()
+
+    import embeddings
+    try:
+        model = embeddings.get_model()
+    except ImportError:
+        print("sentence-transformers not installed.", file=sys.stderr)
+        sys.exit(1)
+    embeddings.warm_up()
+
+    direct = _run(lambda t: model.encode([t], show_progress_bar=False), args.requests, args.concurrency)
+    batched = _run(embeddings.embed_query, args.requests, args.concurrency)
+    executor = embeddings.get_executor()
+    avg_batch = executor.texts / executor.batches if executor.batches else 0.0
+
+    print(f"model={embeddings.DEFAULT_MODEL} requests={args.requests} concurrency={args.concurrency} "
+          f"torch_threads={executor.torch_threads} window_ms={executor.window_s * 1000:.0f}")
+    print(f"  per-request encode : {direct:8.1f} embeddings/s")
+    print(f"  batched executor   : {batched:8.1f} embeddings/s  (avg batch {avg_batch:.1f})")
+    print(f"  speedup            : {batched / direct:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
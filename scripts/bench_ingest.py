@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Benchmark the Neon write path of rag.ingest_document: one INSERT ... RETURNING per chunk (old path) vs
+# rag._insert_chunks (multi-row execute_values, compact vector literals). Uses synthetic 768d vectors so the
+# embedding model is not part of the measurement. Rows are inserted for a throwaway user and deleted afterwards.
+# Usage: python scripts/bench_ingest.py [--chunks 500]
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+_ENV_PATH = os.path.join(PA_ROOT, ".env")
+
+if os.path.isfile(_ENV_PATH):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_ENV_PATH)
+    except ImportError:
+        with open(_ENV_PATH) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    k, _, v = line.partition("=")
+                    k, v = k.strip(), v.strip().strip('"').strip("'")
+                    os.environ.setdefault(k, v)
+
+
+def _per_row_insert(cur, user_id, chunks, embeddings, meta_json):
+    """The previous ingest_document loop: one round trip and one str(float) literal per chunk."""
+    ids = []
+    for content, emb in zip(chunks, embeddings):
+        vec_str = "[" + ",".join(str(x) for x in emb) + "]"
+        cur.execute(
+            """INSERT INTO documents (user_id, content, metadata, embedding, scope, expires_at)
+               VALUES (%s, %s, %s, %s::vector, %s, %s) RETURNING id""",
+            (user_id, content, meta_json, vec_str, "long_term", None),
+        )
+        ids.append(cur.fetchone()["id"])
+    return ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark per-row vs bulk chunk inserts into Neon documents.")
+    parser.add_argument("--chunks", type=int, default=500)
+    args = parser.parse_args()
+    if not os.environ.get("DATABASE_URL"):
+        print("DATABASE_URL not set.", file=sys.stderr)
+        sys.exit(1)
+
+    import rag
+    rng = random.Random(0)
+    chunks = [f"Synthetic benchmark chunk {i}. " + "lorem ipsum " * 60 for i in range(args.chunks)]
+    embeddings = [[rng.uniform(-1, 1) for _ in range(rag.EMBEDDING_DIM)] for _ in range(args.chunks)]
+    meta_json = json.dumps({"source": "bench", "filename": "bench_ingest.txt", "doc_type": "other"})
+    user_id = f"bench-ingest-{uuid.uuid4().hex[:8]}"
+
+    results = {}
+    conn = rag._get_conn()
+    try:
+        for label, fn in (
+            ("per-row", lambda cur: _per_row_insert(cur, user_id, chunks, embeddings, meta_json)),
+            ("bulk", lambda cur: rag._insert_chunks(cur, user_id, chunks, embeddings, meta_json, "long_term", None)),
+        ):
+            t0 = time.perf_counter()
+            with conn.cursor() as cur:
+                ids = fn(cur)
+            conn.commit()
+            elapsed = time.perf_counter() - t0
+            assert len(ids) == len(chunks), f"{label}: inserted {len(ids)} of {len(chunks)}"
+            results[label] = len(chunks) / elapsed
+            print(f"  {label:8} {elapsed:7.2f}s  {results[label]:8.1f} chunks/s", flush=True)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM documents WHERE user_id = %s", (user_id,))
+        conn.commit()
+        conn.close()
+    if len(results) == 2:
+        print(f"  speedup: {results['bulk'] / results['per-row']:.1f}x ({args.chunks} chunks, page size {rag.INSERT_PAGE_SIZE})")
+
+
+if __name__ == "__main__":
+    main()
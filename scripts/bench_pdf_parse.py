@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# Time PDF page-window parsing (rag._iter_pdf_windows): serial vs the process pool at several worker counts.
+# Checks that every run yields the same windows in the same order. Docling is used when installed, else PyPDF2.
+# Usage: python scripts/bench_pdf_parse.py path/to/long.pdf [--workers 2,4,8]
+
+import argparse
+import os
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+
+
+def _parse(rag, data: bytes, workers: int) -> tuple[float, list]:
+    rag._reset_parse_pool()
+    rag.PDF_PARSE_WORKERS = workers
+    rag.PDF_PARALLEL_MIN_PAGES = 0
+    if workers > 1:
+        # Start the workers outside the timed region (spawn start-up is a one-off per process lifetime)
+        pool = rag._get_parse_pool()
+        list(pool.map(abs, range(workers)))
+    t0 = time.perf_counter()
+    windows = [(first, end, len(text)) for first, end, _, text in rag._iter_pdf_windows(data)]
+    return time.perf_counter() - t0, windows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serial vs process-pool PDF parsing.")
+    parser.add_argument("path")
+    parser.add_argument("--workers", default="2,4")
+    args = parser.parse_args()
+    with open(args.path, "rb") as f:
+        data = f.read()
+
+    import rag
+    serial_s, expected = _parse(rag, data, 1)
+    pages = expected[-1][1] if expected else 0
+    print(f"file={os.path.basename(args.path)} pages={pages} window={rag.PAGES_PER_WINDOW} cpus={os.cpu_count()}")
+    print(f"  serial     : {serial_s:7.2f}s")
+    for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+        elapsed, windows = _parse(rag, data, workers)
+        same = "same output" if windows == expected else "OUTPUT DIFFERS"
+        print(f"  {workers:2d} workers : {elapsed:7.2f}s  speedup {serial_s / elapsed:5.2f}x  ({same})")
+    rag._reset_parse_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# Cross-encoder rerank (reranker.py): latency cost vs retrieval quality and agent search loops.
+# Retrieval: for each query, rag.retrieve in search order vs reranked (cold score cache, then warm), with p50/p95
+# latency; queries with an "expect" substring also report hit@k and MRR for both orders.
+# --agent: runs each question through the graph with rerank off and on and counts search_my_documents calls and LLM
+# round trips per question (needs the LLM keys in .env). Queries file: one JSON object per line,
+# {"query": "...", "expect": "text the right chunk contains"}, or plain lines (no quality metrics).
+# Usage: python scripts/bench_rerank.py --user you@example.com --queries queries.jsonl [--runs 5] [--agent]
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+_ENV_PATH = os.path.join(PA_ROOT, ".env")
+
+if os.path.isfile(_ENV_PATH):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_ENV_PATH)
+    except ImportError:
+        with open(_ENV_PATH) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    k, _, v = line.partition("=")
+                    k, v = k.strip(), v.strip().strip('"').strip("'")
+                    os.environ.setdefault(k, v)
+
+
+def _load_queries(path: str | None, query: str) -> list[dict]:
+    if not path:
+        return [{"query": query}]
+    out = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                out.append(json.loads(line) if line.startswith("{") else {"query": line})
+    return out
+
+
+def _rank(chunks: list[str], expect: str) -> int | None:
+    """1-based position of the first chunk containing expect (case-insensitive)."""
+    for i, chunk in enumerate(chunks, 1):
+        if expect.lower() in chunk.lower():
+            return i
+    return None
+
+
+def _pct(ms: list[float], p: float) -> float:
+    ms = sorted(ms)
+    return ms[int(p * (len(ms) - 1))]
+
+
+def bench_retrieval(queries: list[dict], user: str, limit: int, runs: int) -> None:
+    import rag
+    import reranker
+    from embeddings import embed_query
+
+    reranker.warm_up()
+    for _ in range(600):
+        if reranker._model is not None or not reranker._loading:
+            break
+        time.sleep(0.1)
+    if reranker._model is None:
+        print("Cross-encoder not available (sentence-transformers missing or model download failed).")
+        return
+    timings: dict[str, list[float]] = {"search order": [], "rerank cold": [], "rerank warm": []}
+    ranks: dict[str, list[int | None]] = {"search order": [], "rerank": []}
+    for q in queries:
+        vec = embed_query(q["query"])
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            plain = rag.retrieve(q["query"], user, limit, vec, rerank=False)
+            timings["search order"].append((time.perf_counter() - t0) * 1000)
+            reranker.clear()
+            t0 = time.perf_counter()
+            rag.retrieve(q["query"], user, limit, vec, rerank=True)
+            timings["rerank cold"].append((time.perf_counter() - t0) * 1000)
+            t0 = time.perf_counter()
+            reranked = rag.retrieve(q["query"], user, limit, vec, rerank=True)
+            timings["rerank warm"].append((time.perf_counter() - t0) * 1000)
+        if q.get("expect"):
+            ranks["search order"].append(_rank(plain, q["expect"]))
+            ranks["rerank"].append(_rank(reranked, q["expect"]))
+
+    print(f"user={user} queries={len(queries)} runs={runs} candidates={reranker.CANDIDATES} budget={reranker.BUDGET_MS:.0f} ms")
+    for name, ms in timings.items():
+        print(f"  {name:13} p50 {statistics.median(ms):8.1f} ms   p95 {_pct(ms, 0.95):8.1f} ms")
+    if ranks["rerank"]:
+        for name, rs in ranks.items():
+            hit = sum(r is not None for r in rs) / len(rs)
+            mrr = sum(1 / r for r in rs if r) / len(rs)
+            print(f"  {name:13} hit@{limit} {hit:.2f}   MRR {mrr:.3f}")
+    print(f"  reranker: {reranker.stats()}")
+
+
+async def _agent_counts(graph, question: str, user: str) -> tuple[int, int]:
+    """(search_my_documents calls, LLM round trips) for one question in a fresh thread."""
+    from langchain_core.messages import HumanMessage
+    config = {"configurable": {"thread_id": f"bench-rerank-{uuid.uuid4().hex[:8]}", "user_id": user}}
+    result = await graph.ainvoke({"messages": [HumanMessage(content=question)], "step_count": 0}, config=config)
+    searches = llm_calls = 0
+    for m in result.get("messages", []):
+        if getattr(m, "type", None) == "ai":
+            llm_calls += 1
+            searches += sum(1 for c in (getattr(m, "tool_calls", None) or []) if c.get("name") == "search_my_documents")
+    return searches, llm_calls
+
+
+def bench_agent(queries: list[dict], user: str) -> None:
+    import reranker
+    from graph import build_graph
+
+    os.environ["USER_ID"] = user  # rag_tools reads the user from the environment
+    graph = build_graph()
+    for enabled in (False, True):
+        reranker.ENABLED = enabled
+        searches, llm_calls, seconds = [], [], []
+        for q in queries:
+            t0 = time.perf_counter()
+            s, n = asyncio.run(_agent_counts(graph, q["query"], user))
+            seconds.append(time.perf_counter() - t0)
+            searches.append(s)
+            llm_calls.append(n)
+        print(
+            f"  agent rerank={'on ' if enabled else 'off'}  search calls/question {statistics.mean(searches):.2f}   "
+            f"LLM round trips/question {statistics.mean(llm_calls):.2f}   p50 {statistics.median(seconds):.1f} s"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cross-encoder rerank: latency vs retrieval quality and search loops.")
+    parser.add_argument("--user", default=os.environ.get("EMAIL", "default"))
+    parser.add_argument("--query", default="What is the notice period in my contract?")
+    parser.add_argument("--queries", help="JSON lines file: {\"query\": ..., \"expect\": ...} per line")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--agent", action="store_true", help="also count agent search calls / LLM round trips")
+    args = parser.parse_args()
+
+    queries = _load_queries(args.queries, args.query)
+    bench_retrieval(queries, args.user, args.limit, args.runs)
+    if args.agent:
+        bench_agent(queries, args.user)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Time rag.retrieve for one user: Neon (vector and hybrid) vs the in-memory vector_cache index (warm user).
+# The query embedding is computed once up front so only the search itself is timed.
+# Usage: python scripts/bench_retrieve.py --user you@example.com [--runs 50] [--query "notice period"]
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+_ENV_PATH = os.path.join(PA_ROOT, ".env")
+
+if os.path.isfile(_ENV_PATH):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_ENV_PATH)
+    except ImportError:
+        with open(_ENV_PATH) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    k, _, v = line.partition("=")
+                    k, v = k.strip(), v.strip().strip('"').strip("'")
+                    os.environ.setdefault(k, v)
+
+
+def _time(fn, runs: int) -> list[float]:
+    out = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000)
+    return sorted(out)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="rag.retrieve latency: Neon vs in-memory vector cache.")
+    parser.add_argument("--user", default=os.environ.get("EMAIL", "default"))
+    parser.add_argument("--query", default="What is the notice period in my contract?")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    import rag
+    import vector_cache
+    from embeddings import embed_query
+    vec = embed_query(args.query)
+
+    results = {}
+    vector_cache.ENABLED = False
+    for mode in ("vector", "hybrid"):
+        results[f"neon {mode}"] = _time(lambda: rag.retrieve(args.query, args.user, args.limit, vec, mode), args.runs)
+    expected = rag.retrieve(args.query, args.user, args.limit, vec, "vector")
+
+    vector_cache.ENABLED = True
+    vector_cache.get(args.user)
+    for _ in range(600):
+        if args.user in vector_cache._entries or args.user in vector_cache._too_large:
+            break
+        time.sleep(0.1)
+    if args.user not in vector_cache._entries:
+        print(f"User not cached (no rows, over PA_RAG_VECTOR_CACHE_MAX_CHUNKS={vector_cache.MAX_CHUNKS}, or load failed).")
+    else:
+        results["in-memory"] = _time(lambda: rag.retrieve(args.query, args.user, args.limit, vec, "vector"), args.runs)
+        same = rag.retrieve(args.query, args.user, args.limit, vec, "vector") == expected
+        print(f"in-memory top-{args.limit} matches Neon vector search: {same}")
+
+    print(f"user={args.user} runs={args.runs} cache={vector_cache.stats()}")
+    for name, ms in results.items():
+        print(f"  {name:12} p50 {statistics.median(ms):8.3f} ms   p95 {ms[int(0.95 * (len(ms) - 1))]:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
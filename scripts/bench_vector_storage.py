@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# Compare documents vector storage modes (scripts/migrate_vector_storage.py): table size, index size, query latency
+# and recall@k against exact float32 search. Each mode gets a scratch copy of the embeddings (dropped afterwards):
+#   vector          float32 + HNSW vector_cosine_ops (current default)
+#   halfvec         float16 + HNSW halfvec_cosine_ops
+#   vector+binary   float32 + bit(dim) HNSW bit_hamming_ops, candidates rescored with the float32 column
+#   halfvec+binary  float16 + bit(dim) HNSW, rescored with the float16 column
+# Searches use rag._nearest_sql, i.e. the same statement rag.retrieve runs, with the per-user filter. Queries are
+# stored chunk embeddings of random rows. By default the copy is taken from documents; --synthetic N uses random
+# vectors instead (much harder for binary quantization than real sentence embeddings, so recall is a lower bound).
+# Usage: python scripts/bench_vector_storage.py [--queries 50] [--k 5] [--synthetic 100000 --users 50]
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+_ENV_PATH = os.path.join(PA_ROOT, ".env")
+
+if os.path.isfile(_ENV_PATH):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_ENV_PATH)
+    except ImportError:
+        with open(_ENV_PATH) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    k, _, v = line.partition("=")
+                    k, v = k.strip(), v.strip().strip('"').strip("'")
+                    os.environ.setdefault(k, v)
+
+SOURCE_TABLE = "vector_storage_bench_src"
+MODES = {
+    "vector": ("vector", False),
+    "halfvec": ("halfvec", False),
+    "vector+binary": ("vector", True),
+    "halfvec+binary": ("halfvec", True),
+}
+
+
+def _connect():
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        print("DATABASE_URL not set.", file=sys.stderr)
+        sys.exit(1)
+    conn = psycopg2.connect(url, cursor_factory=RealDictCursor)
+    conn.autocommit = True
+    return conn
+
+
+def _documents_dim(cur) -> int:
+    """Dimension of documents.embedding; the active documents model's (embedding_models.py) without the table."""
+    import embedding_models
+    cur.execute(
+        """SELECT format_type(atttypid, atttypmod) AS type FROM pg_attribute
+           WHERE attrelid = to_regclass('documents') AND attname = 'embedding'"""
+    )
+    row = cur.fetchone()
+    m = re.search(r"\((\d+)\)", row["type"]) if row else None
+    return int(m.group(1)) if m else int(embedding_models.active("documents")["dim"])
+
+
+def _fill_source(cur, synthetic: int, users: int, dim: int) -> int:
+    cur.execute(f"DROP TABLE IF EXISTS {SOURCE_TABLE}")
+    if synthetic:
+        cur.execute(
+            f"""CREATE TABLE {SOURCE_TABLE} AS
+                SELECT g::bigint AS id, 'user-' || (g %% {users}) AS user_id, NULL::timestamptz AS expires_at,
+                       ARRAY(SELECT random() - 0.5 FROM generate_series(1, {dim}) WHERE g IS NOT NULL)::vector({dim}) AS embedding
+                FROM generate_series(1, %s) AS g""",
+            (synthetic,),
+        )
+    else:
+        cur.execute(
+            f"""CREATE TABLE {SOURCE_TABLE} AS
+                SELECT id, user_id, NULL::timestamptz AS expires_at, embedding::vector({dim}) AS embedding
+                FROM documents WHERE embedding IS NOT NULL AND (expires_at IS NULL OR expires_at > NOW())"""
+        )
+    cur.execute(f"CREATE INDEX ON {SOURCE_TABLE}(user_id)")
+    cur.execute(f"ANALYZE {SOURCE_TABLE}")
+    cur.execute(f"SELECT count(*) AS n FROM {SOURCE_TABLE}")
+    return cur.fetchone()["n"]
+
+
+def _build_mode(cur, name: str, storage: tuple[str, bool], dim: int) -> str:
+    vec_type, binary = storage
+    table = "vector_storage_bench_" + name.replace("+", "_")
+    bq = f", binary_quantize(embedding)::bit({dim}) AS embedding_bq" if binary else ""
+    cur.execute(f"DROP TABLE IF EXISTS {table}")
+    cur.execute(
+        f"""CREATE TABLE {table} AS
+            SELECT id, user_id, expires_at, embedding::{vec_type}({dim}) AS embedding{bq} FROM {SOURCE_TABLE}"""
+    )
+    cur.execute(f"CREATE INDEX ON {table}(user_id)")
+    if binary:
+        cur.execute(f"CREATE INDEX ON {table} USING hnsw (embedding_bq bit_hamming_ops) WITH (m = 16, ef_construction = 64)")
+    else:
+        cur.execute(f"CREATE INDEX ON {table} USING hnsw (embedding {vec_type}_cosine_ops) WITH (m = 16, ef_construction = 64)")
+    cur.execute(f"ANALYZE {table}")
+    return table
+
+
+def _sizes(cur, table: str) -> tuple[float, float]:
+    cur.execute("SELECT pg_table_size(%s) AS t, pg_indexes_size(%s) AS i", (table, table))
+    row = cur.fetchone()
+    return row["t"] / 1e6, row["i"] / 1e6
+
+
+def _run(cur, sql: str, params: dict, exact: bool = False) -> tuple[list[int], float]:
+    import rag
+    settings = "SET enable_indexscan = off; SET enable_bitmapscan = off; " if exact else rag._hnsw_settings_sql().replace("LOCAL ", "")
+    cur.execute(settings)
+    t0 = time.perf_counter()
+    cur.execute(sql, params)
+    ids = [r["id"] for r in cur.fetchall()]
+    elapsed = (time.perf_counter() - t0) * 1000
+    cur.execute("RESET ALL")
+    return ids, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vector storage modes: table/index size, latency, recall@k.")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--synthetic", type=int, default=0, help="random rows instead of a copy of documents")
+    parser.add_argument("--users", type=int, default=50, help="user_ids for --synthetic")
+    parser.add_argument("--modes", default=",".join(MODES))
+    args = parser.parse_args()
+
+    import rag
+    conn = _connect()
+    tables = [SOURCE_TABLE]
+    try:
+        with conn.cursor() as cur:
+            t0 = time.perf_counter()
+            dim = _documents_dim(cur)
+            rows = _fill_source(cur, args.synthetic, args.users, dim)
+            if not rows:
+                print("No embeddings to benchmark (empty documents table; try --synthetic 100000).")
+                return
+            print(f"{rows} rows copied in {time.perf_counter() - t0:.0f}s; rescore factor {rag.BINARY_RESCORE_FACTOR}", flush=True)
+            cur.execute(f"SELECT user_id, embedding::text AS vec FROM {SOURCE_TABLE} ORDER BY random() LIMIT %s", (args.queries,))
+            queries = [{"user_id": r["user_id"], "vec": r["vec"], "limit": args.k} for r in cur.fetchall()]
+            truth = [
+                set(_run(cur, rag._nearest_sql("id", "limit", ("vector", False), SOURCE_TABLE), q, exact=True)[0])
+                for q in queries
+            ]
+            print(f"{'mode':>15} {'table MB':>9} {'index MB':>9} {'recall@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8}")
+            for name in [m.strip() for m in args.modes.split(",") if m.strip()]:
+                storage = MODES[name]
+                t0 = time.perf_counter()
+                table = _build_mode(cur, name, storage, dim)
+                tables.append(table)
+                build_s = time.perf_counter() - t0
+                sql = rag._nearest_sql("id", "limit", storage, table)
+                _run(cur, sql, queries[0])  # warm the index into the buffer cache
+                recalls, ms = [], []
+                for q, expected in zip(queries, truth):
+                    ids, elapsed = _run(cur, sql, q)
+                    recalls.append(len(expected & set(ids)) / max(1, len(expected)))
+                    ms.append(elapsed)
+                table_mb, index_mb = _sizes(cur, table)
+                ms.sort()
+                print(
+                    f"{name:>15} {table_mb:>9.1f} {index_mb:>9.1f} {statistics.mean(recalls):>9.3f} "
+                    f"{statistics.median(ms):>8.1f} {ms[int(0.95 * (len(ms) - 1))]:>8.1f}   (built in {build_s:.0f}s)",
+                    flush=True,
+                )
+    finally:
+        with conn.cursor() as cur:
+            for table in tables:
+                cur.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# Delete expired documents (week retention) now instead of waiting for the webhook sweeper (document_gc.py).
+#   sweep [--batch 500] [--max-batches 200] [--pause-ms 200] [--vacuum auto|on|off] [--reindex auto|on|off]
+#       Deletes expired chunks and uploads in short batches, prints rows/bytes reclaimed and table size before and
+#       after. VACUUM / REINDEX CONCURRENTLY run when the churn justifies it (auto) or when forced.
+#       With PA_RAG_USER_QUOTA_MB set, users over quota first have their coldest chunks offloaded (document_usage.py).
+#   status   Expired rows waiting, table size, live/dead tuples and the last (auto)vacuum
+#   usage [--user ID] [--limit 20]   Per-user live chunks and MB vs quota, chunks never retrieved, last hit
+# Usage: python scripts/gc_documents.py sweep   (cron-friendly; exits quietly when another process is sweeping)
+
+import argparse
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+_ENV_PATH = os.path.join(PA_ROOT, ".env")
+
+if os.path.isfile(_ENV_PATH):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_ENV_PATH)
+    except ImportError:
+        with open(_ENV_PATH) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    k, _, v = line.partition("=")
+                    k, v = k.strip(), v.strip().strip('"').strip("'")
+                    os.environ.setdefault(k, v)
+
+_CHOICE = {"auto": None, "on": True, "off": False}
+
+
+def status() -> None:
+    import document_gc
+    conn = document_gc._get_conn()
+    if not conn:
+        print("DATABASE_URL not set or psycopg2 missing.", file=sys.stderr)
+        sys.exit(1)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT count(*) FILTER (WHERE expires_at < NOW()) AS expired,
+                          count(*) FILTER (WHERE expires_at > NOW()) AS expiring, count(*) AS total,
+                          COALESCE(sum(pg_column_size(documents.*)) FILTER (WHERE expires_at < NOW()), 0) AS expired_bytes
+                   FROM documents"""
+            )
+            counts = cur.fetchone()
+            cur.execute(
+                """SELECT pg_size_pretty(pg_total_relation_size('documents')) AS total_size, n_live_tup, n_dead_tup,
+                          GREATEST(last_vacuum, last_autovacuum) AS last_vacuum
+                   FROM pg_stat_user_tables WHERE relid = 'documents'::regclass"""
+            )
+            table = cur.fetchone() or {}
+    finally:
+        conn.close()
+    print(
+        f"documents: {counts['total']} rows, {counts['expired']} expired (~{counts['expired_bytes'] / 1e6:.1f} MB), "
+        f"{counts['expiring']} on week retention"
+    )
+    print(
+        f"  size {table.get('total_size')}, live {table.get('n_live_tup')}, dead {table.get('n_dead_tup')}, "
+        f"last vacuum {table.get('last_vacuum')}"
+    )
+
+
+def usage(user_id: str | None, limit: int) -> None:
+    import document_usage
+    conn = document_usage._get_conn()
+    if not conn:
+        print("DATABASE_URL not set or psycopg2 missing.", file=sys.stderr)
+        sys.exit(1)
+    try:
+        document_usage.flush()
+        rows = document_usage.usage(conn, user_id, limit)
+    finally:
+        conn.close()
+    quota = f"{document_usage.QUOTA_MB:.0f} MB" if document_usage.QUOTA_MB > 0 else "none"
+    print(f"quota {quota}, grace {document_usage.GRACE_DAYS:g} days")
+    print(f"{'user':>32} {'chunks':>8} {'MB':>8} {'never hit':>10}  last hit")
+    for r in rows:
+        print(f"{r['user_id'][:32]:>32} {r['chunks']:>8} {int(r['bytes']) / 1e6:>8.1f} {r['never_hit']:>10}  {r['last_hit'] or '-'}")
+
+
+def main() -> None:
+    import document_gc
+    import document_usage
+    parser = argparse.ArgumentParser(description="Delete expired RAG documents in batches; VACUUM/REINDEX on churn.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    p_usage = sub.add_parser("usage")
+    p_usage.add_argument("--user")
+    p_usage.add_argument("--limit", type=int, default=20)
+    p_sweep = sub.add_parser("sweep")
+    p_sweep.add_argument("--batch", type=int, default=document_gc.BATCH_SIZE)
+    p_sweep.add_argument("--max-batches", type=int, default=document_gc.MAX_BATCHES)
+    p_sweep.add_argument("--pause-ms", type=float, default=document_gc.PAUSE_MS)
+    p_sweep.add_argument("--vacuum", choices=tuple(_CHOICE), default="auto")
+    p_sweep.add_argument("--reindex", choices=tuple(_CHOICE), default="auto")
+    args = parser.parse_args()
+
+    if args.cmd == "status":
+        status()
+        return
+    if args.cmd == "usage":
+        usage(args.user, args.limit)
+        return
+    result = document_gc.sweep(args.batch, args.max_batches, args.pause_ms, _CHOICE[args.vacuum], _CHOICE[args.reindex])
+    if result.get("skipped"):
+        print(f"Skipped: {result['skipped']}.")
+        return
+    before, after = result["table_bytes_before"], result["table_bytes_after"]
+    if result["evicted"]:
+        print(f"Offloaded {result['evicted']} cold chunk(s) of users over the {document_usage.QUOTA_MB:.0f} MB quota.")
+    print(
+        f"Deleted {result['rows']} chunk(s) (~{result['bytes'] / 1e6:.1f} MB of rows) and {result['sources']} upload(s) "
+        f"for {result['users']} user(s) in {result['batches']} batch(es), {result['seconds']}s."
+    )
+    print(
+        f"documents on disk: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB; "
+        f"vacuum {'ran' if result['vacuumed'] else 'skipped'}; reindexed {', '.join(result['reindexed']) or 'nothing'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 # Create Qdrant collection for long-term memory. Run once after setting QDRANT_URL and QDRANT_API_KEY.
-# Idempotent: skips creation if collection already exists. Vector size 768 = all-mpnet-base-v2.
+# Idempotent: skips creation if collection already exists. Vector size PA_EMBED_DIM (768 = all-mpnet-base-v2); to move
+# an existing collection to another model use scripts/migrate_embeddings.py memory.
 
 import os
 import sys
@@ -23,7 +24,7 @@ if os.path.isfile(_ENV_PATH):
                     os.environ.setdefault(k, v)
 
 COLLECTION_NAME = "long_term_memory"
-VECTOR_SIZE = 768  # all-mpnet-base-v2 (same as RAG in PERSONAL_ASSISTANT_PATTERNS.md)
+VECTOR_SIZE = int(os.environ.get("PA_EMBED_DIM", "768"))  # all-mpnet-base-v2 (same as RAG in PERSONAL_ASSISTANT_PATTERNS.md)
 
 
 def main() -> None:
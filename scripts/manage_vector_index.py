@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# Manage the HNSW vector index on documents.embedding (sql/6-documents-hnsw.sql) and measure recall/latency.
+#   status                          List vector indexes on documents with sizes and build options
+#   build [--m 16] [--ef-construction 64] [--no-concurrently]
+#                                   (Re)build idx_documents_embedding_hnsw under a temporary name, then swap it for the
+#                                   old HNSW / ivfflat index in one short transaction (searches keep an index meanwhile)
+#   report [--sizes 10000,100000,1000000] [--users 50] [--queries 50] [--k 5] [--ef-search 40,100,200]
+#                                   Exact vs HNSW search on synthetic data in a scratch table (documents_index_bench,
+#                                   dropped afterwards); per-user filter as in rag.retrieve. Reports recall@k and latency.
+# Usage: python scripts/manage_vector_index.py status
+
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+_ENV_PATH = os.path.join(PA_ROOT, ".env")
+
+if os.path.isfile(_ENV_PATH):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_ENV_PATH)
+    except ImportError:
+        with open(_ENV_PATH) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    k, _, v = line.partition("=")
+                    k, v = k.strip(), v.strip().strip('"').strip("'")
+                    os.environ.setdefault(k, v)
+
+INDEX_NAME = "idx_documents_embedding_hnsw"
+BENCH_TABLE = "documents_index_bench"
+
+
+def _connect(autocommit: bool = True):
+    import psycopg2
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        print("DATABASE_URL not set.", file=sys.stderr)
+        sys.exit(1)
+    conn = psycopg2.connect(url)
+    conn.autocommit = autocommit
+    return conn
+
+
+def status() -> None:
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT i.indexname, i.indexdef, pg_size_pretty(pg_relation_size(c.oid)) AS size
+                   FROM pg_indexes i JOIN pg_class c ON c.relname = i.indexname
+                   WHERE i.tablename = 'documents' AND (i.indexdef ILIKE '%hnsw%' OR i.indexdef ILIKE '%ivfflat%')"""
+            )
+            rows = cur.fetchall()
+            cur.execute("SELECT count(*), pg_size_pretty(pg_total_relation_size('documents')) FROM documents")
+            count, total = cur.fetchone()
+            cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            ver = (cur.fetchone() or ["?"])[0]
+    finally:
+        conn.close()
+    print(f"pgvector {ver}; documents: {count} rows, {total} total (table + indexes)")
+    if not rows:
+        print("No vector index on documents. Run: python scripts/manage_vector_index.py build")
+    for name, definition, size in rows:
+        print(f"  {name} ({size}): {definition}")
+
+
+def build(m: int, ef_construction: int, concurrently: bool = True, table: str = "documents", name: str = INDEX_NAME) -> float:
+    """(Re)build HNSW with the given parameters under a temporary name, then swap it in for the old index (and the
+    legacy ivfflat one) in one short transaction, so searches keep an index throughout. Returns build seconds."""
+    cc = "CONCURRENTLY " if concurrently else ""
+    tmp = f"{name}_new"
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET maintenance_work_mem = %s", (os.environ.get("PA_INDEX_MAINTENANCE_WORK_MEM", "256MB"),))
+            cur.execute("SET max_parallel_maintenance_workers = %s", (int(os.environ.get("PA_INDEX_PARALLEL_WORKERS", "2")),))
+            # Left INVALID by an interrupted concurrent build
+            cur.execute(f"DROP INDEX {cc}IF EXISTS {tmp}")
+            # halfvec storage (scripts/migrate_vector_storage.py) needs the halfvec operator class
+            cur.execute(
+                "SELECT format_type(atttypid, atttypmod) FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'embedding'",
+                (table,),
+            )
+            opclass = "halfvec_cosine_ops" if (cur.fetchone() or [""])[0].startswith("halfvec") else "vector_cosine_ops"
+            t0 = time.perf_counter()
+            try:
+                cur.execute(
+                    f"CREATE INDEX {cc}{tmp} ON {table} USING hnsw (embedding {opclass}) WITH (m = %s, ef_construction = %s)",
+                    (m, ef_construction),
+                )
+            except BaseException:
+                try:
+                    cur.execute(f"DROP INDEX {cc}IF EXISTS {tmp}")
+                except Exception:
+                    pass  # dropped by the next build
+                raise
+            elapsed = time.perf_counter() - t0
+        conn.autocommit = False
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL lock_timeout = '10s'")
+            if table == "documents":
+                cur.execute("DROP INDEX IF EXISTS idx_documents_embedding")
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+            cur.execute(f"ALTER INDEX {tmp} RENAME TO {name}")
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Built {name} on {table} ({opclass}, m={m}, ef_construction={ef_construction}) in {elapsed:.1f}s", flush=True)
+    return elapsed
+
+
+def _documents_dim(conn) -> int:
+    """Dimension of documents.embedding, so the bench matches production; PA_EMBED_DIM (768) without the table."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+               WHERE attrelid = to_regclass('documents') AND attname = 'embedding'"""
+        )
+        row = cur.fetchone()
+    conn.commit()
+    m = re.search(r"\((\d+)\)", row[0]) if row else None
+    return int(m.group(1)) if m else int(os.environ.get("PA_EMBED_DIM", "768"))
+
+
+def _fill_bench_table(conn, size: int, users: int, dim: int) -> None:
+    """Synthetic rows: random unit-ish vectors spread over `users` user_ids, inserted in SQL to avoid client transfer."""
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cur.execute(f"CREATE TABLE {BENCH_TABLE} (id BIGSERIAL PRIMARY KEY, user_id TEXT NOT NULL, embedding vector({dim}))")
+        batch = 10000
+        for start in range(0, size, batch):
+            n = min(batch, size - start)
+            cur.execute(
+                f"""INSERT INTO {BENCH_TABLE} (user_id, embedding)
+                    SELECT 'user-' || (g %% %s), ARRAY(SELECT random() - 0.5 FROM generate_series(1, {dim}) WHERE g IS NOT NULL)::vector
+                    FROM generate_series(%s, %s) AS g""",
+                (users, start, start + n - 1),
+            )
+        cur.execute(f"CREATE INDEX ON {BENCH_TABLE}(user_id)")
+        cur.execute(f"ANALYZE {BENCH_TABLE}")
+
+
+def _supports_iterative_scan(conn) -> bool:
+    with conn.cursor() as cur:
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        ver = (cur.fetchone() or ["0"])[0]
+    conn.commit()
+    return tuple(int(x) for x in ver.split(".")[:2]) >= (0, 8)
+
+
+def _search(conn, vec: str, user_id: str, k: int, exact: bool, ef_search: int = 40, iterative: bool = True) -> tuple[list[int], float]:
+    with conn.cursor() as cur:
+        if exact:
+            settings = "SET LOCAL enable_indexscan = off; SET LOCAL enable_bitmapscan = off; "
+        else:
+            settings = f"SET LOCAL hnsw.ef_search = {ef_search}; "
+            if iterative:
+                settings += "SET LOCAL hnsw.iterative_scan = strict_order; "
+        t0 = time.perf_counter()
+        cur.execute(
+            settings + f"SELECT id FROM {BENCH_TABLE} WHERE user_id = %s ORDER BY embedding <=> %s::vector LIMIT %s",
+            (user_id, vec, k),
+        )
+        ids = [r[0] for r in cur.fetchall()]
+        elapsed = (time.perf_counter() - t0) * 1000
+    conn.commit()
+    return ids, elapsed
+
+
+def report(sizes: list[int], users: int, n_queries: int, k: int, ef_values: list[int], m: int, ef_construction: int) -> None:
+    rng = random.Random(0)
+    conn = _connect(autocommit=False)
+    try:
+        iterative = _supports_iterative_scan(conn)
+        dim = _documents_dim(conn)
+        print(f"{'rows':>9} {'mode':>14} {'recall@' + str(k):>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for size in sizes:
+            conn.autocommit = True
+            t0 = time.perf_counter()
+            _fill_bench_table(conn, size, users, dim)
+            print(f"  [{size} rows loaded in {time.perf_counter() - t0:.0f}s]", flush=True)
+            conn.autocommit = False
+            queries = [
+                ("[" + ",".join(f"{rng.uniform(-0.5, 0.5):.6f}" for _ in range(dim)) + "]", f"user-{rng.randrange(users)}")
+                for _ in range(n_queries)
+            ]
+            truth, exact_ms = [], []
+            for vec, uid in queries:
+                ids, ms = _search(conn, vec, uid, k, exact=True)
+                truth.append(set(ids))
+                exact_ms.append(ms)
+            _print_row(size, "exact", 1.0, exact_ms)
+            build(m, ef_construction, concurrently=False, table=BENCH_TABLE, name=f"{BENCH_TABLE}_hnsw")
+            for ef in ef_values:
+                recalls, ms_list = [], []
+                for (vec, uid), expected in zip(queries, truth):
+                    ids, ms = _search(conn, vec, uid, k, exact=False, ef_search=ef, iterative=iterative)
+                    recalls.append(len(expected & set(ids)) / max(1, len(expected)))
+                    ms_list.append(ms)
+                _print_row(size, f"hnsw ef={ef}", statistics.mean(recalls), ms_list)
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        conn.close()
+
+
+def _print_row(size: int, mode: str, recall: float, ms: list[float]) -> None:
+    ms = sorted(ms)
+    print(f"{size:>9} {mode:>14} {recall:>9.3f} {statistics.median(ms):>8.1f} {ms[int(0.95 * (len(ms) - 1))]:>8.1f}", flush=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the documents HNSW index.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    p_build = sub.add_parser("build")
+    p_build.add_argument("--m", type=int, default=16)
+    p_build.add_argument("--ef-construction", type=int, default=64)
+    p_build.add_argument("--no-concurrently", action="store_true", help="Faster, but blocks writes to documents")
+    p_report = sub.add_parser("report")
+    p_report.add_argument("--sizes", default="10000,100000,1000000")
+    p_report.add_argument("--users", type=int, default=50)
+    p_report.add_argument("--queries", type=int, default=50)
+    p_report.add_argument("--k", type=int, default=5)
+    p_report.add_argument("--ef-search", default="40,100,200")
+    p_report.add_argument("--m", type=int, default=16)
+    p_report.add_argument("--ef-construction", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.cmd == "status":
+        status()
+    elif args.cmd == "build":
+        build(args.m, args.ef_construction, concurrently=not args.no_concurrently)
+    elif args.cmd == "report":
+        report(
+            [int(x) for x in args.sizes.split(",") if x.strip()],
+            args.users,
+            args.queries,
+            args.k,
+            [int(x) for x in args.ef_search.split(",") if x.strip()],
+            args.m,
+            args.ef_construction,
+        )
+
+
+if __name__ == "__main__":
+    main()
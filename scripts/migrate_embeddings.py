@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# Move stored vectors to another embedding model without a reset (embedding_models.py, sql/12-embedding-models.sql).
+# The app keeps reading the old vectors until the switch; the active model is a database row every process re-reads
+# within PA_EMBED_MODEL_TTL seconds.
+#   status                                  Active model per store, migration in progress and backfill progress
+#   start --model NAME [--dim N]            Add documents.embedding_next (dimension probed from the model when omitted,
+#                                           same vector/halfvec type as embedding) and record the model being migrated to
+#   backfill [--batch 64] [--rate 0] [--limit N]
+#       Embed live chunks that have no embedding_next yet, in batches of --batch (one short UPDATE each), at most --rate
+#       rows/s (0 = as fast as the embedder goes). Resumable: stop it any time and run it again. Prints rows/s,
+#       percentage done and ETA. Chunks written by the app meanwhile are picked up by the next run or by switch.
+#   switch [--batch 64] [--rate 0] [--settle-seconds N]
+#       Catch up, build the HNSW index on embedding_next (CONCURRENTLY), then in one transaction: block writes, embed the
+#       last rows, swap the columns and index, recompute upload summaries (document_sources) and point the "documents"
+#       row at the new model. Processes still on the cached old model for up to PA_EMBED_MODEL_TTL seconds may write
+#       old-model rows; after --settle-seconds the rows written since the switch that do not record the new model
+#       (metadata.embedding_model, set by rag on insert) are re-embedded. A binary index
+#       (scripts/migrate_vector_storage.py --binary on) is dropped by the swap; re-add it afterwards.
+#   abort                                   Drop embedding_next and forget the migration
+#   memory --model NAME [--dim N] [--batch 64] [--rate 0] [--settle-seconds N] [--drop-old]
+#       Long-term memory (Qdrant): copy every point into a new collection long_term_memory_<model> with its text
+#       re-embedded (resumable: points already copied are skipped), switch the "memory" row to it, copy points written to
+#       the old collection meanwhile, then optionally delete the old collection.
+# Usage: python scripts/migrate_embeddings.py start --model all-MiniLM-L6-v2 && ... backfill --rate 50 && ... switch
+
+import argparse
+import os
+import re
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+if PA_ROOT not in sys.path:
+    sys.path.insert(0, PA_ROOT)
+_ENV_PATH = os.path.join(PA_ROOT, ".env")
+
+if os.path.isfile(_ENV_PATH):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_ENV_PATH)
+    except ImportError:
+        with open(_ENV_PATH) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    k, _, v = line.partition("=")
+                    k, v = k.strip(), v.strip().strip('"').strip("'")
+                    os.environ.setdefault(k, v)
+
+DENSE_INDEX = "idx_documents_embedding_hnsw"
+NEXT_INDEX = "idx_documents_embedding_next_hnsw"
+BINARY_INDEX = "idx_documents_embedding_bq_hnsw"
+HNSW_OPTIONS = "WITH (m = 16, ef_construction = 64)"
+PROGRESS_SECONDS = 5.0
+# Live chunks still to embed with the new model, in id order (keyset: each batch starts after the previous one)
+_TODO_WHERE = "embedding_next IS NULL AND embedding IS NOT NULL AND (expires_at IS NULL OR expires_at > NOW())"
+
+
+def _connect(autocommit: bool = True):
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        print("DATABASE_URL not set.", file=sys.stderr)
+        sys.exit(1)
+    conn = psycopg2.connect(url, cursor_factory=RealDictCursor)
+    conn.autocommit = autocommit
+    return conn
+
+
+def _columns(cur) -> dict[str, str]:
+    cur.execute(
+        """SELECT attname, format_type(atttypid, atttypmod) AS type FROM pg_attribute
+           WHERE attrelid = 'documents'::regclass AND attname LIKE 'embedding%' AND attnum > 0 AND NOT attisdropped"""
+    )
+    return {r["attname"]: r["type"] for r in cur.fetchall()}
+
+
+def _vec_type(column_type: str) -> str:
+    return "halfvec" if column_type.startswith("halfvec") else "vector"
+
+
+def _dim(column_type: str) -> int | None:
+    m = re.search(r"\((\d+)\)", column_type)
+    return int(m.group(1)) if m else None
+
+
+def _probe_dim(model: str) -> int:
+    import embeddings
+    return len(embeddings.embed_query("dimension probe", model))
+
+
+def _model_row(conn, target: str) -> dict:
+    """The embedding_models row for target, created from the current defaults (and the documents column) if missing."""
+    import embedding_models
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('embedding_models') IS NOT NULL AS ok")
+        if not cur.fetchone()["ok"]:
+            print("embedding_models table missing; run sql/12-embedding-models.sql (scripts/run_sql_migrations.py).", file=sys.stderr)
+            sys.exit(1)
+    row = embedding_models.read(conn, target)
+    if row is None:
+        row = embedding_models.defaults(target)
+        if target == "documents":
+            with conn.cursor() as cur:
+                row["dim"] = _dim(_columns(cur).get("embedding", "")) or row["dim"]
+        with conn.cursor() as cur:
+            cur.execute(
+                """INSERT INTO embedding_models (target, model, dim, location) VALUES (%s, %s, %s, %s)
+                   ON CONFLICT (target) DO NOTHING""",
+                (target, row["model"], row["dim"], row["location"]),
+            )
+        conn.commit()
+        print(f"Recorded current {target} model: {row['model']} ({row['dim']}d, {row['location']}).", flush=True)
+        row = embedding_models.read(conn, target)
+    return row
+
+
+def _set_next(conn, target: str, model: str | None, dim: int | None, location: str | None) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            """UPDATE embedding_models SET next_model = %s, next_dim = %s, next_location = %s,
+                      started_at = CASE WHEN %s::text IS NULL THEN NULL ELSE NOW() END, updated_at = NOW()
+               WHERE target = %s""",
+            (model, dim, location, model, target),
+        )
+    conn.commit()
+
+
+def _switch_row(cur, target: str, model: str, dim: int, location: str) -> None:
+    cur.execute(
+        """UPDATE embedding_models SET model = %s, dim = %s, location = %s, next_model = NULL, next_dim = NULL,
+                  next_location = NULL, switched_at = NOW(), updated_at = NOW()
+           WHERE target = %s""",
+        (model, dim, location, target),
+    )
+
+
+class _Progress:
+    """Rows/s, percentage and ETA every PROGRESS_SECONDS; sleep() keeps the average under rate rows/s."""
+
+    def __init__(self, label: str, total: int, rate: float):
+        self.label, self.total, self.rate = label, total, rate
+        self.done = 0
+        self.t0 = self._last = time.perf_counter()
+
+    def add(self, n: int) -> None:
+        self.done += n
+        now = time.perf_counter()
+        if now - self._last >= PROGRESS_SECONDS:
+            self._last = now
+            self.report()
+
+    def sleep(self) -> None:
+        if self.rate > 0:
+            ahead = self.done / self.rate - (time.perf_counter() - self.t0)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def report(self, final: bool = False) -> None:
+        elapsed = max(time.perf_counter() - self.t0, 1e-9)
+        speed = self.done / elapsed
+        if final:
+            print(f"{self.label}: {self.done} row(s) in {elapsed:.0f}s ({speed:.1f} rows/s)", flush=True)
+            return
+        pct = 100.0 * self.done / self.total if self.total else 100.0
+        eta = (self.total - self.done) / speed if speed > 0 and self.total > self.done else 0
+        print(f"  {self.label}: {self.done}/{self.total} ({pct:.1f}%), {speed:.1f} rows/s, ETA {eta:.0f}s", flush=True)
+
+
+def _embed_into(cur, rows: list[dict], column: str, model: str, vec_type: str) -> None:
+    """Embed rows' content with model and write the vectors to column (one UPDATE for the batch). Writing the live
+    embedding column also records model in metadata.embedding_model, as rag does on insert."""
+    import embeddings
+    import rag
+    from psycopg2.extras import execute_values
+    vectors = embeddings.embed_texts([r["content"] for r in rows], model)
+    stamp = ""
+    if column == "embedding":
+        stamp = ", metadata = COALESCE(d.metadata, '{}'::jsonb) || jsonb_build_object('embedding_model', %s::text)"
+        stamp = cur.mogrify(stamp, (model,)).decode().replace("%", "%%")  # execute_values formats the SQL again
+    execute_values(
+        cur,
+        f"UPDATE documents d SET {column} = v.e::{vec_type}{stamp} FROM (VALUES %s) AS v(id, e) WHERE d.id = v.id",
+        [(r["id"], rag._vec_literal(vec)) for r, vec in zip(rows, vectors)],
+        template="(%s::bigint, %s)",
+    )
+
+
+def _backfill(conn, row: dict, batch: int, rate: float, limit: int | None = None) -> int:
+    """Embed live chunks missing embedding_next with next_model, batch by batch (each its own transaction)."""
+    with conn.cursor() as cur:
+        vec_type = _vec_type(_columns(cur).get("embedding_next", ""))
+        cur.execute(f"SELECT count(*) AS n FROM documents WHERE {_TODO_WHERE}")
+        todo = int(cur.fetchone()["n"])
+    conn.commit()
+    progress = _Progress(f"backfill {row['next_model']}", min(todo, limit) if limit else todo, rate)
+    last_id = 0
+    while limit is None or progress.done < limit:
+        size = batch if limit is None else min(batch, limit - progress.done)
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT id, content FROM documents WHERE {_TODO_WHERE} AND id > %s ORDER BY id LIMIT %s", (last_id, size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            _embed_into(cur, rows, "embedding_next", row["next_model"], vec_type)
+        conn.commit()
+        last_id = rows[-1]["id"]
+        progress.add(len(rows))
+        progress.sleep()
+    progress.report(final=True)
+    return progress.done
+
+
+def _migrating(conn) -> dict:
+    row = _model_row(conn, "documents")
+    with conn.cursor() as cur:
+        has_next = "embedding_next" in _columns(cur)
+    conn.commit()
+    if not row.get("next_model") or not has_next:
+        print("No documents migration in progress; run start --model NAME first.", file=sys.stderr)
+        sys.exit(1)
+    return row
+
+
+def status() -> None:
+    import embedding_models
+    conn = _connect(autocommit=False)
+    try:
+        for target in ("documents", "memory"):
+            row = embedding_models.read(conn, target) or embedding_models.defaults(target)
+            line = f"{target}: {row['model']} ({row['dim']}d, {row['location']})"
+            if row.get("next_model"):
+                line += f" -> migrating to {row['next_model']} ({row['next_dim']}d, {row['next_location']})"
+            elif row.get("switched_at"):
+                line += f", switched {row['switched_at']}"
+            print(line)
+        with conn.cursor() as cur:
+            columns = _columns(cur)
+            for name, col_type in sorted(columns.items()):
+                print(f"  documents.{name}: {col_type}")
+            if "embedding_next" in columns:
+                cur.execute(
+                    """SELECT count(*) AS live, count(embedding_next) AS done FROM documents
+                       WHERE embedding IS NOT NULL AND (expires_at IS NULL OR expires_at > NOW())"""
+                )
+                counts = cur.fetchone()
+                pct = 100.0 * counts["done"] / counts["live"] if counts["live"] else 100.0
+                print(f"  backfilled {counts['done']}/{counts['live']} live chunk(s) ({pct:.1f}%)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def start(model: str, dim: int | None) -> None:
+    conn = _connect(autocommit=False)
+    try:
+        row = _model_row(conn, "documents")
+        if model == row["model"]:
+            print(f"documents already use {model}.", file=sys.stderr)
+            sys.exit(1)
+        dim = dim or _probe_dim(model)
+        with conn.cursor() as cur:
+            columns = _columns(cur)
+            existing = columns.get("embedding_next")
+            if existing and (row.get("next_model") != model or _dim(existing) != dim):
+                print(f"embedding_next exists for {row.get('next_model')}; run abort first.", file=sys.stderr)
+                sys.exit(1)
+            vec_type = _vec_type(columns.get("embedding", ""))
+            cur.execute(f"ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedding_next {vec_type}({dim})")
+        conn.commit()
+        _set_next(conn, "documents", model, dim, "embedding")
+    finally:
+        conn.close()
+    print(f"Migrating documents: {row['model']} -> {model} ({vec_type}({dim})). Next: backfill, then switch.", flush=True)
+
+
+def backfill(batch: int, rate: float, limit: int | None) -> None:
+    conn = _connect(autocommit=False)
+    try:
+        _backfill(conn, _migrating(conn), batch, rate, limit)
+    finally:
+        conn.close()
+    status()
+
+
+def switch(batch: int, rate: float, settle_seconds: float) -> None:
+    import embedding_models
+    conn = _connect(autocommit=False)
+    try:
+        row = _migrating(conn)
+        model, dim = row["next_model"], row["next_dim"]
+        _backfill(conn, row, batch, rate)
+        with conn.cursor() as cur:
+            vec_type = _vec_type(_columns(cur)["embedding_next"])
+        conn.commit()
+        conn.autocommit = True
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute("SET maintenance_work_mem = %s", (os.environ.get("PA_INDEX_MAINTENANCE_WORK_MEM", "256MB"),))
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {NEXT_INDEX} ON documents USING hnsw (embedding_next {vec_type}_cosine_ops) {HNSW_OPTIONS}")
+        print(f"Built {NEXT_INDEX} in {time.perf_counter() - t0:.0f}s", flush=True)
+        conn.autocommit = False
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            # Reads go on while the rows written since the catch-up are embedded; writers wait for the swap
+            cur.execute("LOCK TABLE documents IN EXCLUSIVE MODE")
+            cur.execute(f"SELECT id, content FROM documents WHERE {_TODO_WHERE} ORDER BY id")
+            rest = cur.fetchall()
+            for i in range(0, len(rest), batch):
+                _embed_into(cur, rest[i:i + batch], "embedding_next", model, vec_type)
+            cur.execute("SELECT COALESCE(max(id), 0) AS max_id FROM documents")
+            max_id = cur.fetchone()["max_id"]
+            cur.execute(f"DROP INDEX IF EXISTS {BINARY_INDEX}")
+            cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_bq")  # generated from embedding
+            cur.execute("ALTER TABLE documents DROP COLUMN embedding")
+            cur.execute("ALTER TABLE documents RENAME COLUMN embedding_next TO embedding")
+            cur.execute(f"ALTER INDEX {NEXT_INDEX} RENAME TO {DENSE_INDEX}")
+            cur.execute("SELECT to_regclass('document_sources') IS NOT NULL AS ok")
+            if cur.fetchone()["ok"]:
+                cur.execute(f"ALTER TABLE document_sources ALTER COLUMN summary_embedding TYPE vector({dim}) USING NULL")
+                cur.execute(
+                    """UPDATE document_sources s SET summary_embedding =
+                         (SELECT AVG(embedding)::vector FROM documents WHERE id = ANY(s.chunk_ids))
+                       WHERE s.status = 'ready'"""
+                )
+            _switch_row(cur, "documents", model, dim, "embedding")
+        conn.commit()
+        print(f"Switched documents to {model} ({vec_type}({dim})) in {time.perf_counter() - t0:.1f}s under lock "
+              f"({len(rest)} row(s) embedded at the switch).", flush=True)
+        embedding_models.invalidate()
+        _settle(conn, max_id, model, vec_type, batch, settle_seconds)
+    finally:
+        conn.close()
+    status()
+
+
+def _settle(conn, max_id: int, model: str, vec_type: str, batch: int, settle_seconds: float) -> None:
+    """Re-embed rows written after the switch by processes that still had the old model cached: those whose
+    metadata.embedding_model is not model (rows from processes on older code record none and are re-embedded too)."""
+    print(f"Waiting {settle_seconds:.0f}s for running processes to pick up the new model...", flush=True)
+    time.sleep(settle_seconds)
+    progress = _Progress(f"settle {model}", 0, 0)
+    last_id = max_id
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT id, content FROM documents
+                   WHERE id > %s AND metadata->>'embedding_model' IS DISTINCT FROM %s ORDER BY id LIMIT %s""",
+                (last_id, model, batch),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+            _embed_into(cur, rows, "embedding", model, vec_type)
+        conn.commit()
+        last_id = rows[-1]["id"]
+        progress.add(len(rows))
+    progress.report(final=True)
+
+
+def abort() -> None:
+    conn = _connect(autocommit=False)
+    try:
+        row = _model_row(conn, "documents")
+        with conn.cursor() as cur:
+            cur.execute(f"DROP INDEX IF EXISTS {NEXT_INDEX}")
+            cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_next")
+        conn.commit()
+        _set_next(conn, "documents", None, None, None)
+    finally:
+        conn.close()
+    print(f"Dropped embedding_next{' for ' + row['next_model'] if row.get('next_model') else ''}; documents stay on {row['model']}.")
+
+
+def _copy_points(client, source: str, target: str, model: str, batch: int, rate: float, label: str) -> int:
+    """Copy source points missing from target, re-embedding payload["data"] with model."""
+    import embeddings
+    from qdrant_client.models import PointStruct
+    progress = _Progress(label, client.count(source).count, rate)
+    offset = None
+    copied = 0
+    while True:
+        points, offset = client.scroll(source, limit=batch, offset=offset, with_payload=True, with_vectors=False)
+        if not points:
+            break
+        present = {p.id for p in client.retrieve(target, ids=[p.id for p in points], with_payload=False)}
+        todo = [p for p in points if p.id not in present and p.payload and p.payload.get("data")]
+        if todo:
+            vectors = embeddings.embed_texts([p.payload["data"] for p in todo], model)
+            client.upsert(target, points=[PointStruct(id=p.id, vector=v, payload=p.payload) for p, v in zip(todo, vectors)])
+            copied += len(todo)
+        progress.add(len(points))
+        if todo:
+            progress.sleep()
+        if offset is None:
+            break
+    progress.report(final=True)
+    return copied
+
+
+def memory(model: str, dim: int | None, batch: int, rate: float, settle_seconds: float, drop_old: bool) -> None:
+    import embedding_models
+    url = os.environ.get("QDRANT_URL")
+    if not url:
+        print("QDRANT_URL not set.", file=sys.stderr)
+        sys.exit(1)
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import Distance, VectorParams
+    from memory import COLLECTION_NAME
+    client = QdrantClient(url=url, api_key=os.environ.get("QDRANT_API_KEY") or None)
+    conn = _connect(autocommit=False)
+    try:
+        row = _model_row(conn, "memory")
+        if model == row["model"]:
+            print(f"memory already uses {model}.", file=sys.stderr)
+            sys.exit(1)
+        dim = dim or _probe_dim(model)
+        old = row["location"]
+        new = f"{COLLECTION_NAME}_{re.sub(r'[^a-z0-9]+', '_', model.lower()).strip('_')}"
+        if not any(c.name == new for c in client.get_collections().collections):
+            client.create_collection(new, vectors_config=VectorParams(size=dim, distance=Distance.COSINE))
+            print(f"Created Qdrant collection '{new}' (vector_size={dim}).", flush=True)
+        _set_next(conn, "memory", model, dim, new)
+        _copy_points(client, old, new, model, batch, rate, f"copy {old} -> {new}")
+        with conn.cursor() as cur:
+            _switch_row(cur, "memory", model, dim, new)
+        conn.commit()
+        embedding_models.invalidate()
+        print(f"Switched memory to {model} ('{new}').", flush=True)
+        print(f"Waiting {settle_seconds:.0f}s for running processes to pick up the new collection...", flush=True)
+        time.sleep(settle_seconds)
+        _copy_points(client, old, new, model, batch, 0, "settle")
+    finally:
+        conn.close()
+    if drop_old:
+        client.delete_collection(old)
+        print(f"Deleted old collection '{old}'.", flush=True)
+
+
+def main() -> None:
+    import embedding_models
+    settle_default = embedding_models.TTL_SECONDS * 2
+    parser = argparse.ArgumentParser(description="Re-embed documents / long-term memory with another model and switch reads to it.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    sub.add_parser("abort")
+    p_start = sub.add_parser("start")
+    p_start.add_argument("--model", required=True)
+    p_start.add_argument("--dim", type=int, help="default: probe the model")
+    for name in ("backfill", "switch", "memory"):
+        p = sub.add_parser(name)
+        p.add_argument("--batch", type=int, default=64)
+        p.add_argument("--rate", type=float, default=0, help="max rows/s (0 = unlimited)")
+        if name == "backfill":
+            p.add_argument("--limit", type=int, help="stop after this many rows")
+        else:
+            p.add_argument("--settle-seconds", type=float, default=settle_default)
+        if name == "memory":
+            p.add_argument("--model", required=True)
+            p.add_argument("--dim", type=int, help="default: probe the model")
+            p.add_argument("--drop-old", action="store_true")
+    args = parser.parse_args()
+
+    if args.cmd == "status":
+        status()
+    elif args.cmd == "abort":
+        abort()
+    elif args.cmd == "start":
+        start(args.model, args.dim)
+    elif args.cmd == "backfill":
+        backfill(args.batch, args.rate, args.limit)
+    elif args.cmd == "switch":
+        switch(args.batch, args.rate, args.settle_seconds)
+    else:
+        memory(args.model, args.dim, args.batch, args.rate, args.settle_seconds, args.drop_old)
+
+
+if __name__ == "__main__":
+    main()
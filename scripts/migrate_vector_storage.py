@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# Convert documents.embedding storage (rag.py detects the result at startup; needs pgvector 0.7+ for halfvec/bit).
+#   status                                  Column type, binary index, table and index sizes
+#   convert --type halfvec|vector [--binary on|off] [--batch 5000] [--no-concurrently]
+#       --type      float16 halfvec (half the bytes per row and per index entry) or float32 vector. Rows are copied
+#                   into a new column in batches (short transactions), then the columns are swapped under a brief
+#                   exclusive lock that also converts rows written meanwhile, and the HNSW index is rebuilt.
+#       --binary on adds embedding_bq bit(dim) (binary_quantize, generated) with an HNSW bit_hamming_ops index and
+#                   drops the dense HNSW index: searches pick candidates by Hamming distance and rescore them with
+#                   embedding. Adding the generated column rewrites the table once. --binary off reverses it.
+# Restart the app afterwards (rag reads the storage once per process). Compare modes: python scripts/bench_vector_storage.py
+# Usage: python scripts/migrate_vector_storage.py convert --type halfvec --binary on
+
+import argparse
+import os
+import re
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PA_ROOT = os.path.dirname(SCRIPT_DIR)
+_ENV_PATH = os.path.join(PA_ROOT, ".env")
+
+if os.path.isfile(_ENV_PATH):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(_ENV_PATH)
+    except ImportError:
+        with open(_ENV_PATH) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#") and "=" in line:
+                    k, _, v = line.partition("=")
+                    k, v = k.strip(), v.strip().strip('"').strip("'")
+                    os.environ.setdefault(k, v)
+
+DENSE_INDEX = "idx_documents_embedding_hnsw"
+BINARY_INDEX = "idx_documents_embedding_bq_hnsw"
+HNSW_OPTIONS = "WITH (m = 16, ef_construction = 64)"
+
+
+def _connect(autocommit: bool = True):
+    import psycopg2
+    url = os.environ.get("DATABASE_URL")
+    if not url:
+        print("DATABASE_URL not set.", file=sys.stderr)
+        sys.exit(1)
+    conn = psycopg2.connect(url)
+    conn.autocommit = autocommit
+    return conn
+
+
+def _columns(cur) -> dict[str, str]:
+    cur.execute(
+        """SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute
+           WHERE attrelid = 'documents'::regclass AND attname LIKE 'embedding%' AND attnum > 0 AND NOT attisdropped"""
+    )
+    return dict(cur.fetchall())
+
+
+def _dim(column_type: str) -> int | None:
+    m = re.search(r"\((\d+)\)", column_type)
+    return int(m.group(1)) if m else None
+
+
+def _check_pgvector(cur) -> None:
+    cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+    ver = (cur.fetchone() or ["0"])[0]
+    if tuple(int(x) for x in ver.split(".")[:2]) < (0, 7):
+        print(f"pgvector {ver} has no halfvec/bit support; upgrade to 0.7+ (ALTER EXTENSION vector UPDATE).", file=sys.stderr)
+        sys.exit(1)
+
+
+def status() -> None:
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            columns = _columns(cur)
+            cur.execute(
+                """SELECT count(*), pg_size_pretty(pg_table_size('documents')), pg_size_pretty(pg_indexes_size('documents'))
+                   FROM documents"""
+            )
+            count, table_size, index_size = cur.fetchone()
+            cur.execute(
+                """SELECT i.indexname, pg_size_pretty(pg_relation_size(c.oid)) FROM pg_indexes i
+                   JOIN pg_class c ON c.relname = i.indexname
+                   WHERE i.tablename = 'documents' AND i.indexdef ILIKE '%hnsw%'"""
+            )
+            indexes = cur.fetchall()
+    finally:
+        conn.close()
+    print(f"documents: {count} rows, table {table_size}, all indexes {index_size}")
+    for name, col_type in sorted(columns.items()):
+        print(f"  column {name}: {col_type}")
+    for name, size in indexes:
+        print(f"  index {name}: {size}")
+
+
+def _convert_type(conn, target: str, dim: int, batch: int) -> None:
+    """Batched copy into embedding_new, then swap columns under a short ACCESS EXCLUSIVE lock."""
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedding_new {target}({dim})")
+    total = 0
+    t0 = time.perf_counter()
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""UPDATE documents SET embedding_new = embedding::{target}({dim}) WHERE id IN (
+                        SELECT id FROM documents WHERE embedding_new IS NULL AND embedding IS NOT NULL LIMIT %s)""",
+                (batch,),
+            )
+            n = cur.rowcount
+        total += n
+        if n:
+            print(f"  converted {total} row(s) ({time.perf_counter() - t0:.0f}s)", flush=True)
+        if n < batch:
+            break
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("LOCK TABLE documents IN ACCESS EXCLUSIVE MODE")
+            cur.execute(f"UPDATE documents SET embedding_new = embedding::{target}({dim}) WHERE embedding_new IS NULL AND embedding IS NOT NULL")
+            cur.execute(f"DROP INDEX IF EXISTS {BINARY_INDEX}")
+            cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_bq")  # generated from embedding
+            cur.execute(f"DROP INDEX IF EXISTS {DENSE_INDEX}")
+            cur.execute("ALTER TABLE documents DROP COLUMN embedding")
+            cur.execute("ALTER TABLE documents RENAME COLUMN embedding_new TO embedding")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+    print(f"Swapped documents.embedding to {target}({dim}).", flush=True)
+
+
+def convert(target: str, binary: str | None, batch: int, concurrently: bool) -> None:
+    conn = _connect()
+    cc = "CONCURRENTLY " if concurrently else ""
+    try:
+        with conn.cursor() as cur:
+            _check_pgvector(cur)
+            columns = _columns(cur)
+            cur.execute("SET maintenance_work_mem = %s", (os.environ.get("PA_INDEX_MAINTENANCE_WORK_MEM", "256MB"),))
+        dim = _dim(columns.get("embedding", ""))
+        if dim is None:
+            print(f"documents.embedding has no fixed dimension ({columns.get('embedding')}); cannot convert.", file=sys.stderr)
+            sys.exit(1)
+        current = "halfvec" if columns.get("embedding", "").startswith("halfvec") else "vector"
+        had_binary = "embedding_bq" in columns
+        binary_on = had_binary if binary is None else binary == "on"
+        if target != current:
+            _convert_type(conn, target, dim, batch)
+        with conn.cursor() as cur:
+            if binary_on:
+                if not had_binary or target != current:
+                    t0 = time.perf_counter()
+                    cur.execute(
+                        f"""ALTER TABLE documents ADD COLUMN IF NOT EXISTS embedding_bq bit({dim})
+                            GENERATED ALWAYS AS (binary_quantize(embedding)::bit({dim})) STORED"""
+                    )
+                    print(f"Added embedding_bq in {time.perf_counter() - t0:.0f}s", flush=True)
+                cur.execute(f"CREATE INDEX {cc}IF NOT EXISTS {BINARY_INDEX} ON documents USING hnsw (embedding_bq bit_hamming_ops) {HNSW_OPTIONS}")
+                # Rescoring reads only the candidate rows, so the dense index no longer needs to fit in memory
+                cur.execute(f"DROP INDEX {cc}IF EXISTS {DENSE_INDEX}")
+            else:
+                cur.execute(f"CREATE INDEX {cc}IF NOT EXISTS {DENSE_INDEX} ON documents USING hnsw (embedding {target}_cosine_ops) {HNSW_OPTIONS}")
+                if had_binary:
+                    cur.execute(f"DROP INDEX {cc}IF EXISTS {BINARY_INDEX}")
+                    cur.execute("ALTER TABLE documents DROP COLUMN IF EXISTS embedding_bq")
+    finally:
+        conn.close()
+    print(f"Storage is now {target}{' + binary index' if binary_on else ''}. Restart the app so rag picks it up.", flush=True)
+    status()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert documents.embedding between vector, halfvec and binary-indexed storage.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status")
+    p_convert = sub.add_parser("convert")
+    p_convert.add_argument("--type", choices=("vector", "halfvec"), required=True)
+    p_convert.add_argument("--binary", choices=("on", "off"), help="default: keep the current setting")
+    p_convert.add_argument("--batch", type=int, default=5000)
+    p_convert.add_argument("--no-concurrently", action="store_true", help="Faster index builds, but blocks writes")
+    args = parser.parse_args()
+
+    if args.cmd == "status":
+        status()
+    else:
+        convert(args.type, args.binary, args.batch, concurrently=not args.no_concurrently)
+
+
+if __name__ == "__main__":
+    main()
@@ -42,6 +42,14 @@ def reset_neon() -> None:
         "2-rag-documents.sql",
         "3-user-profiles.sql",
         "4-onboarding-fields.sql",
+        "6-documents-hnsw.sql",
+        "7-documents-fts.sql",
+        "8-documents-content-hash.sql",
+        "9-ingest-jobs.sql",
+        "10-document-sources.sql",
+        "11-document-hits.sql",
+        "12-embedding-models.sql",
+        "13-document-gc-state.sql",
     ]
     for name in order:
         path = os.path.join(SQL_DIR, name)
@@ -86,10 +94,11 @@ def reset_qdrant() -> None:
     client = QdrantClient(url=url, api_key=api_key)
     coll = "long_term_memory"
     names = [c.name for c in client.get_collections().collections]
-    if coll in names:
-        client.delete_collection(coll)
-        print(f"  Qdrant: deleted collection '{coll}'.", flush=True)
-    else:
+    # Also collections created by scripts/migrate_embeddings.py memory (long_term_memory_<model>)
+    for name in [n for n in names if n == coll or n.startswith(coll + "_")]:
+        client.delete_collection(name)
+        print(f"  Qdrant: deleted collection '{name}'.", flush=True)
+    if coll not in names:
         print(f"  Qdrant: collection '{coll}' did not exist.", flush=True)
     print("Qdrant reset done. Run: python scripts/init_qdrant.py to recreate the collection.", flush=True)
 
@@ -34,7 +34,7 @@ def main():
         print("Install psycopg2-binary: pip install psycopg2-binary", file=sys.stderr)
         sys.exit(1)
     # Reminders = calendar only (Arcade); no DB reminders table
-    order = ["0-drop-all.sql", "0-extensions.sql", "1-projects-tasks.sql", "2-rag-documents.sql", "3-user-profiles.sql", "4-onboarding-fields.sql"]
+    order = ["0-drop-all.sql", "0-extensions.sql", "1-projects-tasks.sql", "2-rag-documents.sql", "3-user-profiles.sql", "4-onboarding-fields.sql", "6-documents-hnsw.sql", "7-documents-fts.sql", "8-documents-content-hash.sql", "9-ingest-jobs.sql", "10-document-sources.sql", "11-document-hits.sql", "12-embedding-models.sql", "13-document-gc-state.sql"]
     for name in order:
         path = os.path.join(SQL_DIR, name)
         if not os.path.isfile(path):
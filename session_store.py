@@ -0,0 +1,162 @@
+# In-memory RAG for documents uploaded "just to ask about them" (rag.ingest_session_document). Chunks and their
+# embeddings stay in this process, per user, for TTL_SECONDS after the last upload or search, with no Neon writes;
+# rag.retrieve_scored merges their hits with the persistent ones. If the user replies keep/week, the webhook calls
+# rag.persist_session_document, which writes the stored embeddings to documents (nothing is embedded twice).
+# Session hits carry negative ids (never a documents row) and session=True. Bounded by MAX_CHUNKS per user and
+# BUDGET_MB per process (least recently used user evicted first). A restart drops every session document.
+# Enable for Telegram uploads with PA_RAG_SESSION_UPLOADS=1; needs numpy (installed with sentence-transformers).
+
+import itertools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+ENABLED = (os.environ.get("PA_RAG_SESSION_UPLOADS") or "0").strip() == "1"
+TTL_SECONDS = float(os.environ.get("PA_RAG_SESSION_TTL", "21600"))
+MAX_CHUNKS = int(os.environ.get("PA_RAG_SESSION_MAX_CHUNKS", "5000"))
+BUDGET_MB = float(os.environ.get("PA_RAG_SESSION_MB", "128"))
+MAX_FILE_MB = float(os.environ.get("PA_RAG_SESSION_MAX_FILE_MB", "5"))  # larger uploads use the durable ingest queue
+
+_users: "OrderedDict[str, dict[str, SessionDocument]]" = OrderedDict()
+_touched: dict[str, float] = {}
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_stats = {"added": 0, "searches": 0, "hits": 0, "persisted": 0, "expired": 0, "evictions": 0}
+
+
+class SessionDocument:
+    """One uploaded document: chunk texts, hashes, negative chunk ids and the unit-norm embedding matrix (n x dim)."""
+
+    def __init__(self, doc_id: str, filename: str, file_hash: str, meta_json: str, chunks: list[str], hashes: list[str], embeddings):
+        import numpy as np
+        self.doc_id = doc_id
+        self.filename = filename
+        self.file_hash = file_hash
+        self.meta_json = meta_json
+        self.chunks = chunks
+        self.hashes = hashes
+        self.embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1)
+        norms = np.linalg.norm(self.embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = self.embeddings / norms
+        self.ids = [-next(_ids) for _ in chunks]
+        self.created_at = time.time()
+        self.nbytes = int(self.embeddings.nbytes + self.matrix.nbytes + sum(len(c) for c in chunks))
+
+
+def _expire_locked(now: float) -> None:
+    for user_id in [u for u, t in _touched.items() if now - t >= TTL_SECONDS]:
+        docs = _users.pop(user_id, {})
+        _touched.pop(user_id, None)
+        _stats["expired"] += len(docs)
+
+
+def _evict_locked() -> None:
+    budget = BUDGET_MB * 1024 * 1024
+    total = sum(d.nbytes for docs in _users.values() for d in docs.values())
+    while len(_users) > 1 and total > budget:
+        user_id, docs = _users.popitem(last=False)
+        _touched.pop(user_id, None)
+        total -= sum(d.nbytes for d in docs.values())
+        _stats["evictions"] += len(docs)
+
+
+def add(user_id: str, filename: str, file_hash: str, meta_json: str, chunks: list[str], hashes: list[str], embeddings) -> SessionDocument:
+    """Store a document for user_id (replacing an earlier upload of the same file). Raises ValueError past MAX_CHUNKS."""
+    doc = SessionDocument(f"s{next(_ids)}", filename, file_hash, meta_json, chunks, hashes, embeddings)
+    now = time.time()
+    with _lock:
+        _expire_locked(now)
+        docs = _users.setdefault(user_id, {})
+        for old_id in [d.doc_id for d in docs.values() if d.file_hash == file_hash]:
+            del docs[old_id]
+        if sum(len(d.chunks) for d in docs.values()) + len(chunks) > MAX_CHUNKS:
+            raise ValueError(f"session documents are limited to {MAX_CHUNKS} chunks per user")
+        docs[doc.doc_id] = doc
+        _users.move_to_end(user_id)
+        _touched[user_id] = now
+        _stats["added"] += 1
+        _evict_locked()
+    return doc
+
+
+def has_documents(user_id: str) -> bool:
+    with _lock:
+        _expire_locked(time.time())
+        return bool(_users.get(user_id))
+
+
+def documents(user_id: str) -> list[SessionDocument]:
+    with _lock:
+        _expire_locked(time.time())
+        return list(_users.get(user_id, {}).values())
+
+
+def search(user_id: str, query_vector, limit: int) -> list[dict]:
+    """Top-limit session chunks by cosine similarity, as rag hits (id < 0, content, distance, lexical, session)."""
+    import numpy as np
+    now = time.time()
+    with _lock:
+        _expire_locked(now)
+        docs = list(_users.get(user_id, {}).values())
+        if docs:
+            _touched[user_id] = now
+            _users.move_to_end(user_id)
+        _stats["searches"] += 1
+    q = np.asarray(query_vector, dtype=np.float32)
+    norm = float(np.linalg.norm(q)) if q.size else 0.0
+    if not docs or norm == 0.0 or limit <= 0:
+        return []
+    scored: list[tuple[float, int, str]] = []
+    for doc in docs:
+        scores = doc.matrix @ (q / norm)
+        k = min(limit, len(scores))
+        for i in np.argpartition(-scores, k - 1)[:k] if k < len(scores) else range(len(scores)):
+            scored.append((float(scores[i]), doc.ids[i], doc.chunks[i]))
+    scored.sort(key=lambda s: -s[0])
+    hits = [
+        {"id": chunk_id, "content": content, "distance": 1.0 - score, "lexical": False, "session": True}
+        for score, chunk_id, content in scored[:limit]
+        if math.isfinite(score)
+    ]
+    with _lock:
+        _stats["hits"] += len(hits)
+    return hits
+
+
+def pop(user_id: str, doc_id: str) -> SessionDocument | None:
+    """Remove and return a session document (to persist it); None if it expired or was evicted."""
+    with _lock:
+        _expire_locked(time.time())
+        docs = _users.get(user_id, {})
+        doc = docs.pop(doc_id, None)
+        if not docs:
+            _users.pop(user_id, None)
+            _touched.pop(user_id, None)
+        if doc is not None:
+            _stats["persisted"] += 1
+    return doc
+
+
+def clear(user_id: str | None = None) -> None:
+    with _lock:
+        if user_id is None:
+            _users.clear()
+            _touched.clear()
+        else:
+            _users.pop(user_id, None)
+            _touched.pop(user_id, None)
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(
+            _stats,
+            enabled=ENABLED,
+            users=len(_users),
+            documents=sum(len(docs) for docs in _users.values()),
+            mb=round(sum(d.nbytes for docs in _users.values() for d in docs.values()) / (1024 * 1024), 1),
+            ttl_seconds=TTL_SECONDS,
+        )
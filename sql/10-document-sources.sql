@@ -0,0 +1,48 @@
+-- One row per uploaded document (rag.ingest_document): filename, file hash, chunk ids/count, a short preview and a
+-- summary embedding (mean of the chunk embeddings). documents.source_id points at the upload that first stored a
+-- chunk; chunk_ids also lists chunks reused from earlier uploads (content-addressed, sql/8). Listing and deleting
+-- an upload touch this table instead of scanning documents.metadata; rag.retrieve mode "two_stage" ranks sources
+-- by summary embedding first, then chunks within the best ones. Backfills one source per (user, filename). Idempotent.
+CREATE TABLE IF NOT EXISTS document_sources (
+  id BIGSERIAL PRIMARY KEY,
+  user_id TEXT NOT NULL,
+  filename TEXT NOT NULL DEFAULT '',
+  file_hash TEXT,
+  doc_type TEXT,
+  status TEXT NOT NULL DEFAULT 'ingesting' CHECK (status IN ('ingesting', 'ready')),
+  chunk_count INT NOT NULL DEFAULT 0,
+  chunk_ids BIGINT[] NOT NULL DEFAULT '{}',
+  summary TEXT,
+  summary_embedding vector(768),
+  scope TEXT DEFAULT 'long_term' CHECK (scope IN ('long_term', 'session')),
+  expires_at TIMESTAMPTZ,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_document_sources_user ON document_sources(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_document_sources_user_hash ON document_sources(user_id, file_hash);
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS source_id BIGINT REFERENCES document_sources(id) ON DELETE CASCADE;
+CREATE INDEX IF NOT EXISTS idx_documents_source_id ON documents(source_id);
+
+-- Backfill: existing chunks grouped by user and metadata filename (file hash unknown for these)
+WITH groups AS (
+  SELECT user_id,
+         COALESCE(metadata->>'filename', '') AS filename,
+         MIN(metadata->>'doc_type') AS doc_type,
+         array_agg(id ORDER BY id) AS ids,
+         left((array_agg(content ORDER BY id))[1], 300) AS summary,
+         AVG(embedding) AS summary_embedding,
+         MIN(scope) AS scope,
+         CASE WHEN bool_or(expires_at IS NULL) THEN NULL ELSE MAX(expires_at) END AS expires_at,
+         MIN(created_at) AS created_at
+  FROM documents
+  WHERE source_id IS NULL
+  GROUP BY user_id, COALESCE(metadata->>'filename', '')
+), inserted AS (
+  INSERT INTO document_sources (user_id, filename, doc_type, status, chunk_count, chunk_ids, summary, summary_embedding, scope, expires_at, created_at)
+  SELECT user_id, filename, doc_type, 'ready', cardinality(ids), ids, summary, summary_embedding, scope, expires_at, created_at
+  FROM groups
+  RETURNING id, chunk_ids
+)
+UPDATE documents d SET source_id = inserted.id FROM inserted WHERE d.id = ANY(inserted.chunk_ids);
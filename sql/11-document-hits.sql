@@ -0,0 +1,11 @@
+-- Per-chunk retrieval hits (document_usage.py): hit_count and last_hit_at for each chunk rag.retrieve returned.
+-- Kept out of documents on purpose: counting a hit upserts a small row here instead of writing a new version of a
+-- wide documents row (content + embedding) and its index entries. Hits are buffered in the app and flushed in
+-- batches. Per-user storage quotas evict the coldest chunks first (oldest last hit, else oldest upload).
+CREATE TABLE IF NOT EXISTS document_hits (
+  document_id BIGINT PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+  user_id TEXT NOT NULL,
+  hit_count BIGINT NOT NULL DEFAULT 0,
+  last_hit_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_document_hits_user ON document_hits(user_id, last_hit_at);
@@ -0,0 +1,17 @@
+-- Which embedding model produced each vector store (embedding_models.py): "documents" = documents.embedding,
+-- "memory" = the Qdrant long-term memory collection named in location. next_* are set while
+-- scripts/migrate_embeddings.py backfills a second column / collection with a new model. Readers keep using
+-- model/location until the tool switches the row; for documents that happens in the same transaction as the column swap.
+-- Without a row, the app uses PA_EMBED_MODEL / PA_EMBED_DIM (default all-mpnet-base-v2, 768).
+CREATE TABLE IF NOT EXISTS embedding_models (
+  target TEXT PRIMARY KEY CHECK (target IN ('documents', 'memory')),
+  model TEXT NOT NULL,
+  dim INT NOT NULL,
+  location TEXT NOT NULL,
+  next_model TEXT,
+  next_dim INT,
+  next_location TEXT,
+  started_at TIMESTAMPTZ,
+  switched_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
@@ -0,0 +1,9 @@
+-- Sweeper state shared by every process (document_gc.py): rows deleted from documents since the HNSW index was last
+-- rebuilt. Kept in the database so the REINDEX threshold survives restarts and deploys and counts the sweeps of
+-- every uvicorn worker. One row; without the table each process counts only its own sweeps.
+CREATE TABLE IF NOT EXISTS document_gc_state (
+  id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+  churn_since_reindex BIGINT NOT NULL DEFAULT 0,
+  reindexed_at TIMESTAMPTZ,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
@@ -0,0 +1,5 @@
+-- Replace the ivfflat (lists = 1, effectively a brute-force scan) index on documents.embedding with HNSW.
+-- For existing databases; fresh installs get HNSW from 2-rag-documents.sql. Rebuild with other m/ef_construction:
+-- python scripts/manage_vector_index.py build --m 16 --ef-construction 64
+DROP INDEX IF EXISTS idx_documents_embedding;
+CREATE INDEX IF NOT EXISTS idx_documents_embedding_hnsw ON documents USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
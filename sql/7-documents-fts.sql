@@ -0,0 +1,4 @@
+-- Full-text search on documents.content for hybrid retrieval (rag.retrieve mode "hybrid": lexical + vector, fused with RRF).
+-- Catches exact identifiers (clause numbers, invoice IDs, names) that cosine search misses. Idempotent.
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+CREATE INDEX IF NOT EXISTS idx_documents_content_tsv ON documents USING gin (content_tsv);
@@ -0,0 +1,5 @@
+-- Content-addressed chunks: rag.ingest_document reuses a user's existing row (and embedding) for identical chunk text
+-- instead of re-embedding and inserting a duplicate. Backfills existing rows. Idempotent.
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash TEXT;
+UPDATE documents SET content_hash = encode(sha256(convert_to(content, 'UTF8')), 'hex') WHERE content_hash IS NULL;
+CREATE INDEX IF NOT EXISTS idx_documents_user_content_hash ON documents(user_id, content_hash);
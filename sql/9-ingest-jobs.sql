@@ -0,0 +1,23 @@
+-- Durable document ingestion queue: the Telegram webhook enqueues and returns at once; an in-app worker
+-- (ingest_jobs.py, started by telegram_bot/webhook.py) claims jobs with FOR UPDATE SKIP LOCKED.
+-- update_id is unique so a Telegram redelivery of the same update never creates a second job.
+-- resume_page / document_ids are saved after each committed page window so a crashed job resumes where it stopped.
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+  id BIGSERIAL PRIMARY KEY,
+  chat_id TEXT NOT NULL,
+  user_id TEXT NOT NULL,
+  file_id TEXT NOT NULL,
+  file_unique_id TEXT,
+  filename TEXT,
+  update_id BIGINT UNIQUE,
+  status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed')),
+  attempts INT NOT NULL DEFAULT 0,
+  resume_page INT NOT NULL DEFAULT 0,
+  total_pages INT,
+  document_ids BIGINT[] NOT NULL DEFAULT '{}',
+  result TEXT,
+  locked_at TIMESTAMPTZ,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_pending ON ingest_jobs(created_at) WHERE status IN ('queued', 'running');
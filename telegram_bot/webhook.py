@@ -1,9 +1,10 @@
 # Telegram webhook handler. See PERSONAL_ASSISTANT_PATTERNS.md C.8, §6.6, §8.5a.
 # Production: Postgres checkpointer (DATABASE_URL) so conversation history persists across restarts.
 
+import asyncio
 import os
 import tempfile
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager
 
 # Load .env from project root so ARCADE_API_KEY etc. are set before graph/tools import
 _webhook_dir = os.path.dirname(os.path.abspath(__file__))
@@ -28,35 +29,75 @@ if os.path.isfile(_env_path):
 from fastapi import FastAPI, Request, Header, BackgroundTasks
 from fastapi.responses import JSONResponse
 
-# chat_id -> list of document row ids awaiting retention choice (keep permanent vs auto-offload after 1 week)
-_pending_retention: dict[str, list[int]] = {}
+# chat_id -> (upload's document row ids, the rows it inserted) awaiting retention choice (keep permanent vs auto-offload after 1 week)
+_pending_retention: dict[str, tuple[list[int], list[int]]] = {}
+# chat_id -> (user_id, session_store document id) for an in-memory upload the user may still keep (PA_RAG_SESSION_UPLOADS)
+_pending_session: dict[str, tuple[str, str]] = {}
 
 
 @asynccontextmanager
 async def _lifespan(app: FastAPI):
     """Production: use Postgres checkpointer when DATABASE_URL is set so conversation history persists."""
-    db_url = (os.environ.get("DATABASE_URL") or "").strip()
-    if db_url:
-        try:
-            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
-            async with AsyncPostgresSaver.from_conn_string(db_url) as checkpointer:
-                await checkpointer.setup()
-                from graph import build_graph
-                app.state.graph = build_graph(checkpointer)
-                print("[webhook] Using Postgres checkpointer (conversation history persists).", flush=True)
-                yield
-        except Exception as e:
-            print(f"[webhook] Postgres checkpointer failed, using MemorySaver: {e}", flush=True)
-            from graph import build_graph
-            app.state.graph = build_graph()
-            yield
-    else:
-        from graph import build_graph
-        app.state.graph = build_graph()
-        print("[webhook] DATABASE_URL not set; using MemorySaver (conversation history in-memory only).", flush=True)
+    # Warm the shared embedding model in the background so /health answers at once and the first message skips the load.
+    if (os.environ.get("PA_EMBED_WARMUP") or "1").strip() != "0":
+        import embedding_models
+        from embeddings import warm_up
+        # The model documents are stored with (embedding_models.py), which differs from the default after a migration
+        asyncio.get_running_loop().run_in_executor(None, lambda: warm_up(embedding_models.active("documents")["model"]))
+    # Optional: load the Docling converter (layout models) before the first upload instead of during it
+    if (os.environ.get("PA_DOCLING_WARMUP") or "0").strip() == "1":
+        import docling_pool
+        asyncio.get_running_loop().run_in_executor(None, docling_pool.warm_up)
+    # Optional cross-encoder rerank (reranker.py): load it now so the first searches are not served in vector order
+    import reranker
+    if reranker.ENABLED:
+        reranker.warm_up()
+    # Durable ingestion queue (ingest_jobs.py): the webhook only enqueues documents; this worker parses/embeds them
+    worker = None
+    if (os.environ.get("DATABASE_URL") or "").strip() and (os.environ.get("PA_INGEST_WORKER") or "1").strip() != "0":
+        from ingest_jobs import worker_loop
+        worker = asyncio.create_task(worker_loop(_process_ingest_job))
+    # Expired-document sweeper (document_gc.py): deletes "week" retention chunks in small batches, VACUUM/REINDEX on churn
+    import document_gc
+    sweeper = None
+    if (os.environ.get("DATABASE_URL") or "").strip() and document_gc.ENABLED:
+        sweeper = asyncio.create_task(document_gc.gc_loop())
+    # Retrieval hit counts (document_usage.py) are buffered in memory and written in batches, off the retrieve path
+    import document_usage
+    hit_flusher = None
+    if (os.environ.get("DATABASE_URL") or "").strip() and document_usage.TRACKING:
+        hit_flusher = asyncio.create_task(document_usage.flush_loop())
     tz = (os.environ.get("DEFAULT_TIMEZONE") or "Africa/Windhoek").strip() or "Africa/Windhoek"
     print(f"[webhook] DEFAULT_TIMEZONE={tz}", flush=True)
-    yield
+    try:
+        # One yield on every path; the Postgres checkpointer stays open on the exit stack until shutdown
+        async with AsyncExitStack() as stack:
+            from graph import build_graph
+            db_url = (os.environ.get("DATABASE_URL") or "").strip()
+            graph = None
+            if db_url:
+                try:
+                    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+                    async with AsyncExitStack() as setup:
+                        checkpointer = await setup.enter_async_context(AsyncPostgresSaver.from_conn_string(db_url))
+                        await checkpointer.setup()
+                        graph = build_graph(checkpointer)
+                        stack.push_async_exit(setup.pop_all())
+                    print("[webhook] Using Postgres checkpointer (conversation history persists).", flush=True)
+                except Exception as e:
+                    print(f"[webhook] Postgres checkpointer failed, using MemorySaver: {e}", flush=True)
+            else:
+                print("[webhook] DATABASE_URL not set; using MemorySaver (conversation history in-memory only).", flush=True)
+            app.state.graph = graph or build_graph()
+            yield
+    finally:
+        if worker:
+            worker.cancel()
+        if sweeper:
+            sweeper.cancel()
+        if hit_flusher:
+            hit_flusher.cancel()
+            document_usage.flush()
 
 
 app = FastAPI(lifespan=_lifespan)
@@ -78,7 +119,28 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"ok": True, "status": "healthy"}
+    import docling_pool
+    import document_gc
+    import document_usage
+    import query_cache
+    import reranker
+    import retrieval_gate
+    import session_store
+    import vector_cache
+    from embeddings import load_stats
+    return {
+        "ok": True,
+        "status": "healthy",
+        "embeddings": load_stats(),
+        "docling": docling_pool.stats(),
+        "document_gc": document_gc.stats(),
+        "document_usage": document_usage.stats(),
+        "vector_cache": vector_cache.stats(),
+        "query_cache": query_cache.stats(),
+        "retrieval_gate": retrieval_gate.stats(),
+        "session_store": session_store.stats(),
+        "reranker": reranker.stats(),
+    }
 
 
 @app.get("/cron/send-reminders")
@@ -154,6 +216,129 @@ async def _process_agent_turn(chat_id: str, text: str) -> None:
             print(f"[webhook] Failed to send error to user: {e2}", flush=True)
 
 
+async def _download_file(file_id: str) -> bytes:
+    """Download a Telegram file (document) to memory via a temp file."""
+    from telegram_bot.client import get_bot
+    tg_file = await get_bot().get_file(file_id)
+    with tempfile.NamedTemporaryFile(suffix="", delete=False) as tmp:
+        tmp.close()
+        await tg_file.download_to_drive(tmp.name)
+        with open(tmp.name, "rb") as f:
+            data = f.read()
+        try:
+            os.unlink(tmp.name)
+        except OSError:
+            pass
+    return data
+
+
+async def _process_session_upload(chat_id: str, user_id: str, file_id: str, filename: str) -> None:
+    """Ingest an upload into session_store (searchable at once, no database writes) and offer to keep it."""
+    from rag import ingest_session_document
+    from telegram_bot.client import send_message
+    try:
+        doc_bytes = await _download_file(file_id)
+        status, doc_id = await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: ingest_session_document(
+                doc_bytes, user_id, {"source": "telegram", "filename": filename, "doc_type": "other"}
+            ),
+        )
+        if doc_id is None:
+            await send_message(status, chat_id=chat_id)
+            return
+        import session_store
+        _pending_session[chat_id] = (user_id, doc_id)
+        hours = session_store.TTL_SECONDS / 3600
+        await send_message(
+            f"✓ {status} Ask me anything about it.\n\nIt stays in memory for about {hours:.0f} h. Reply **keep** to save it "
+            "permanently, or **week** to keep it for 7 days.",
+            chat_id=chat_id,
+        )
+        print(f"[webhook] Session upload for chat_id={chat_id} file={filename}: {status}", flush=True)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        try:
+            await send_message(f"I couldn't read that document: {str(e)[:200]}", chat_id=chat_id)
+        except Exception:
+            pass
+
+
+async def _process_ingest_job(job: dict) -> None:
+    """Download a queued Telegram document and ingest it, resuming from the job's last committed page window.
+    Sends the start, progress (long documents) and completion messages; records progress on the job row."""
+    import ingest_jobs
+    from rag import ingest_document
+    from telegram_bot.client import send_message
+    chat_id = job["chat_id"]
+    job_id = job.get("id")
+    filename = job.get("filename") or "document"
+    start_page = int(job.get("resume_page") or 0)
+    prior_ids = [int(i) for i in (job.get("document_ids") or [])]
+    try:
+        if start_page == 0 and int(job.get("attempts") or 1) <= 1:
+            await send_message(f"Got {filename}. Adding it to your documents; I'll message you when it's done.", chat_id=chat_id)
+        doc_bytes = await _download_file(job["file_id"])
+        loop = asyncio.get_running_loop()
+        reported = {"quarter": 0}
+
+        def _on_progress(progress: dict) -> None:
+            # Runs in the ingest thread after each committed page window
+            if job_id is not None:
+                ids = list(dict.fromkeys(prior_ids + progress["ids"]))
+                ingest_jobs.save_progress(job_id, progress["resume_page"], progress.get("total_pages"), ids)
+            # Tell the user about long documents at each 25% of pages
+            total = progress.get("total_pages") or 0
+            if total < 40:
+                return
+            quarter = progress["pages_done"] * 4 // total
+            if 0 < quarter < 4 and quarter > reported["quarter"]:
+                reported["quarter"] = quarter
+                asyncio.run_coroutine_threadsafe(
+                    send_message(f"… {progress['pages_done']}/{total} pages of {filename} processed", chat_id=chat_id), loop
+                )
+
+        # Parse/embed/insert off the event loop so other chats are not blocked
+        status, inserted_ids, new_ids = await loop.run_in_executor(
+            None,
+            lambda: ingest_document(
+                bytes_content=doc_bytes,
+                user_id=job.get("user_id") or chat_id,
+                metadata={"source": "telegram", "filename": filename, "doc_type": "other"},
+                start_page=start_page,
+                on_progress=_on_progress,
+            ),
+        )
+        inserted_ids = list(dict.fromkeys(prior_ids + inserted_ids))
+        # A store error raises (and the job is requeued below); a parse error part-way returns the chunks before it
+        complete = status.startswith("Added") or "is already in your documents" in status
+        if job_id is not None:
+            await asyncio.to_thread(ingest_jobs.finish, job_id, status, inserted_ids, not complete)
+        if complete and inserted_ids:
+            # Reused rows (content another upload already stored) are never given an earlier expiry
+            _pending_retention[chat_id] = (inserted_ids, new_ids)
+            await send_message(
+                f"✓ {status}\n\nKeep this document permanently or auto-remove after a week? Reply **keep** for permanent, **week** for auto-remove after 7 days.",
+                chat_id=chat_id,
+            )
+        else:
+            await send_message(f"✓ {status}" if status.startswith("Added") else status, chat_id=chat_id)
+        print(f"[webhook] RAG ingest job {job_id} for chat_id={chat_id} file={filename}: {status}", flush=True)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        # Transient failures (download, connection) go back on the queue; tell the user only when we give up
+        requeued = job_id is not None and await asyncio.to_thread(ingest_jobs.release, job_id, f"{type(e).__name__}: {e}")
+        if requeued:
+            print(f"[webhook] Ingest job {job_id} requeued after error: {e}", flush=True)
+            return
+        try:
+            await send_message(f"I couldn't add that document: {str(e)[:200]}", chat_id=chat_id)
+        except Exception:
+            pass
+
+
 @app.post("/webhook")
 async def webhook(
     request: Request,
@@ -172,47 +357,33 @@ async def webhook(
     message = body.get("message") or body.get("edited_message") or {}
     chat = message.get("chat") or {}
     chat_id = str(chat.get("id") or "")
-    # If message.document: download → RAG ingest (§8.5a) → send "Added …" and return
+    # If message.document: enqueue a durable ingest job (ingest_jobs.py) and return; the worker downloads,
+    # ingests (§8.5a) and messages the user. A redelivered update maps to the same job, so nothing is ingested twice.
     doc = message.get("document") or {}
     if doc.get("file_id"):
-        try:
-            from telegram_bot.client import get_bot, send_message
-            bot = get_bot()
-            tg_file = await bot.get_file(doc["file_id"])
-            with tempfile.NamedTemporaryFile(suffix="", delete=False) as tmp:
-                tmp.close()
-                await tg_file.download_to_drive(tmp.name)
-                with open(tmp.name, "rb") as f:
-                    doc_bytes = f.read()
-                try:
-                    os.unlink(tmp.name)
-                except OSError:
-                    pass
-            filename = doc.get("file_name") or "document"
-            user_id = os.environ.get("EMAIL", "") or chat_id
-            from rag import ingest_document
-            status, inserted_ids = ingest_document(
-                bytes_content=doc_bytes,
-                user_id=user_id,
-                metadata={"source": "telegram", "filename": filename, "doc_type": "other"},
+        filename = doc.get("file_name") or "document"
+        user_id = os.environ.get("EMAIL", "") or chat_id
+        # Session uploads (session_store.py): small files are kept in memory until the user replies keep/week
+        import session_store
+        if session_store.ENABLED and (doc.get("file_size") or 0) <= session_store.MAX_FILE_MB * 1024 * 1024:
+            background_tasks.add_task(_process_session_upload, chat_id, user_id, doc["file_id"], filename)
+            return {"ok": True}
+        from ingest_jobs import enqueue
+        job_id, created = await asyncio.to_thread(
+            enqueue,
+            chat_id=chat_id,
+            user_id=user_id,
+            file_id=doc["file_id"],
+            filename=filename,
+            file_unique_id=doc.get("file_unique_id"),
+            update_id=body.get("update_id"),
+        )
+        if job_id is None:
+            # No queue (DATABASE_URL unset or unreachable): ingest in the background of this request instead
+            background_tasks.add_task(
+                _process_ingest_job, {"id": None, "chat_id": chat_id, "user_id": user_id, "file_id": doc["file_id"], "filename": filename}
             )
-            if inserted_ids:
-                _pending_retention[chat_id] = inserted_ids
-                await send_message(
-                    f"✓ {status}\n\nKeep this document permanently or auto-remove after a week? Reply **keep** for permanent, **week** for auto-remove after 7 days.",
-                    chat_id=chat_id,
-                )
-            else:
-                await send_message(f"✓ {status}" if status.startswith("Added") else status, chat_id=chat_id)
-            print(f"[webhook] RAG ingest for chat_id={chat_id} file={filename}: {status}", flush=True)
-        except Exception as e:
-            import traceback
-            traceback.print_exc()
-            try:
-                from telegram_bot.client import send_message
-                await send_message(f"I couldn't add that document: {str(e)[:200]}", chat_id=chat_id)
-            except Exception:
-                pass
+        print(f"[webhook] Ingest job {job_id} for chat_id={chat_id} file={filename} ({'queued' if created else 'already queued'})", flush=True)
         return {"ok": True}
     # If message.voice / message.audio: download → STT → use transcript as text
     text = (message.get("text") or "").strip()
@@ -313,14 +484,29 @@ async def webhook(
     if allowed_chat and chat_id != allowed_chat:
         print(f"[webhook] Skipping: chat_id {chat_id} != TELEGRAM_CHAT_ID {allowed_chat}", flush=True)
         return {"ok": True}
+    # Handle the keep/week choice for an in-memory session upload: write its chunks (already embedded) to Neon
+    if chat_id in _pending_session:
+        raw_lower = text.strip().lower()
+        keep = raw_lower in ("keep", "permanent", "p", "permanently")
+        if keep or raw_lower in ("week", "w", "1 week", "7 days", "auto", "offload"):
+            from datetime import datetime, timedelta, timezone
+            from rag import persist_session_document
+            from telegram_bot.client import send_message
+            user_id, doc_id = _pending_session.pop(chat_id)
+            expires = None if keep else datetime.now(timezone.utc) + timedelta(days=7)
+            status, ids = await asyncio.to_thread(persist_session_document, user_id, doc_id, expires)
+            if ids:
+                status += " Kept permanently." if keep else " It will auto-remove after 7 days."
+            await send_message(status, chat_id=chat_id)
+            return {"ok": True}
     # Handle retention choice after document upload (keep permanent vs auto-offload after 1 week)
     if chat_id in _pending_retention:
         raw_lower = text.strip().lower()
         if raw_lower in ("keep", "permanent", "p", "permanently"):
             from rag import update_documents_retention
             from telegram_bot.client import send_message
-            update_documents_retention(_pending_retention[chat_id], None)
-            del _pending_retention[chat_id]
+            ids, new_ids = _pending_retention.pop(chat_id)
+            update_documents_retention(ids, None, new_ids)
             await send_message("Done. Document kept permanently.", chat_id=chat_id)
             return {"ok": True}
         if raw_lower in ("week", "w", "1 week", "7 days", "auto", "offload"):
@@ -328,8 +514,8 @@ async def webhook(
             from rag import update_documents_retention
             from telegram_bot.client import send_message
             expires = datetime.now(timezone.utc) + timedelta(days=7)
-            update_documents_retention(_pending_retention[chat_id], expires)
-            del _pending_retention[chat_id]
+            ids, new_ids = _pending_retention.pop(chat_id)
+            update_documents_retention(ids, expires, new_ids)
             await send_message("Done. Document will auto-remove after 7 days.", chat_id=chat_id)
             return {"ok": True}
     # "Can you see images?" shortcut: reply directly so we never say "no" (no LLM needed)
@@ -0,0 +1,70 @@
+# Tests for doc_parsers.py — fast parsers for plain-text and structured uploads, and their streaming windows in rag.py.
+
+import json
+
+import pytest
+
+import doc_parsers
+
+
+def test_registry_dispatches_by_extension():
+    assert doc_parsers.parser_for("Notes.MD") is doc_parsers.parse_text
+    assert doc_parsers.parser_for("report.csv") is doc_parsers.parse_csv
+    assert doc_parsers.parser_for("page.htm") is doc_parsers.parse_html
+    assert doc_parsers.parser_for("contract.pdf") is None  # layout-heavy: Docling
+    assert doc_parsers.parser_for("README") is None
+
+
+def test_text_decoding_falls_back_from_utf8():
+    assert doc_parsers.decode_text("﻿café".encode("utf-8")) == "café"
+    assert doc_parsers.decode_text("café".encode("cp1252")) == "café"
+
+
+def test_csv_rows_keep_header_context():
+    data = b"name,role,start\nAna,MD,2021\nBen,,2023\n"
+    (section,) = doc_parsers.iter_sections(data, "staff.csv")
+    assert section.splitlines() == ["name: Ana | role: MD | start: 2021", "name: Ben | start: 2023"]
+
+
+def test_csv_streams_sections(monkeypatch):
+    monkeypatch.setattr(doc_parsers, "ROWS_PER_SECTION", 10)
+    data = ("id,value\n" + "".join(f"{i},v{i}\n" for i in range(25))).encode()
+    sections = list(doc_parsers.iter_sections(data, "big.csv"))
+    assert [len(s.splitlines()) for s in sections] == [10, 10, 5]
+
+
+def test_html_strips_markup_and_scripts():
+    html = b"<html><head><title>t</title><style>p{}</style></head><body><h1>Policy</h1><script>var x=1;</script><p>Keep &amp; delete after <b>90</b> days.</p></body></html>"
+    text = "\n".join(doc_parsers.iter_sections(html, "policy.html"))
+    assert text.splitlines() == ["Policy", "Keep & delete after 90 days."]
+
+
+def test_json_flattens_to_paths():
+    data = json.dumps({"invoice": {"id": "INV-2041", "lines": [{"amount": 5000}]}, "paid": None}).encode()
+    (section,) = doc_parsers.iter_sections(data, "invoice.json")
+    assert section.splitlines() == ["invoice.id: INV-2041", "invoice.lines[0].amount: 5000", "paid:"]
+
+
+def test_xlsx_rows():
+    openpyxl = pytest.importorskip("openpyxl")
+    import io
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Budget"
+    ws.append(["item", "amount"])
+    ws.append(["laptop", 15000])
+    buf = io.BytesIO()
+    wb.save(buf)
+    (section,) = doc_parsers.iter_sections(buf.getvalue(), "budget.xlsx")
+    assert section.splitlines() == ["## Budget", "item: laptop | amount: 15000"]
+
+
+def test_section_windows_resume_and_total(monkeypatch):
+    """Fast-parser sections become streaming windows; total is only known at the last one."""
+    from rag import _iter_page_windows
+    monkeypatch.setattr(doc_parsers, "ROWS_PER_SECTION", 10)
+    data = ("id,value\n" + "".join(f"{i},v{i}\n" for i in range(25))).encode()
+    windows = [(first, end, total) for first, end, total, _ in _iter_page_windows(data, "big.csv")]
+    assert windows == [(0, 1, None), (1, 2, None), (2, 3, 3)]
+    resumed = [(first, end, total) for first, end, total, _ in _iter_page_windows(data, "big.csv", start_page=2)]
+    assert resumed == [(2, 3, 3)]
@@ -0,0 +1,78 @@
+# Tests for docling_pool.py — long-lived Docling converters with in-memory input.
+# A fake docling package stands in for the real one (models are too heavy for unit tests).
+
+import sys
+import threading
+import types
+
+import pytest
+
+import docling_pool
+
+
+class _FakeConverter:
+    def __init__(self, **kwargs):
+        self.sources = []
+
+    def initialize_pipeline(self, fmt):
+        pass
+
+    def convert(self, source, page_range=None):
+        self.sources.append((source, page_range))
+        data = source.stream.read().decode()
+        document = types.SimpleNamespace(export_to_markdown=lambda: f"# {source.name}\n{data}")
+        return types.SimpleNamespace(document=document)
+
+
+@pytest.fixture
+def fake_docling(monkeypatch):
+    """Install a minimal fake docling package and reset the pool."""
+    created = []
+
+    def _factory(**kwargs):
+        conv = _FakeConverter(**kwargs)
+        created.append(conv)
+        return conv
+
+    converter_mod = types.ModuleType("docling.document_converter")
+    converter_mod.DocumentConverter = _factory
+    models_mod = types.ModuleType("docling.datamodel.base_models")
+    models_mod.DocumentStream = lambda name, stream: types.SimpleNamespace(name=name, stream=stream)
+    models_mod.InputFormat = types.SimpleNamespace(PDF="pdf")
+    for name, mod in {
+        "docling": types.ModuleType("docling"),
+        "docling.datamodel": types.ModuleType("docling.datamodel"),
+        "docling.datamodel.base_models": models_mod,
+        "docling.document_converter": converter_mod,
+    }.items():
+        monkeypatch.setitem(sys.modules, name, mod)
+    monkeypatch.setattr(docling_pool, "ARTIFACTS_PATH", "")
+    monkeypatch.setattr(docling_pool, "_idle", docling_pool.queue.LifoQueue())
+    monkeypatch.setattr(docling_pool, "_created", 0)
+    return created
+
+
+def test_converter_reused_across_documents(fake_docling):
+    """The converter (and its models) is built once, not per document; input never touches disk."""
+    assert docling_pool.convert(b"first", "a.pdf") == "# a.pdf\nfirst"
+    assert docling_pool.convert(b"second", "b.pdf", page_range=(1, 8)) == "# b.pdf\nsecond"
+    assert len(fake_docling) == 1
+    assert [r for _, r in fake_docling[0].sources] == [None, (1, 8)]
+    assert docling_pool.stats()["conversions"] >= 2
+
+
+def test_pool_never_exceeds_size(fake_docling, monkeypatch):
+    monkeypatch.setattr(docling_pool, "POOL_SIZE", 2)
+    threads = [threading.Thread(target=docling_pool.convert, args=(b"x", f"{i}.pdf")) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert 1 <= len(fake_docling) <= 2
+
+
+def test_warm_up_without_docling(monkeypatch):
+    monkeypatch.setitem(sys.modules, "docling.document_converter", None)
+    monkeypatch.setattr(docling_pool, "_idle", docling_pool.queue.LifoQueue())
+    monkeypatch.setattr(docling_pool, "_created", 0)
+    assert docling_pool.warm_up() is None
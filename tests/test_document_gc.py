@@ -0,0 +1,114 @@
+"""Tests for the expired-document sweeper (document_gc.py): maintenance thresholds and the loop; no DB needed."""
+
+import asyncio
+
+import pytest
+
+
+def test_needs_vacuum_thresholds():
+    from document_gc import needs_vacuum
+    assert not needs_vacuum(0, 10_000, 0, ratio=0.1)
+    assert not needs_vacuum(500, 10_000, 0, ratio=0.1)
+    assert needs_vacuum(1_000, 10_000, 0, ratio=0.1)
+    # Dead tuples left by earlier sweeps count even when this one deleted little
+    assert needs_vacuum(10, 10_000, 2_000, ratio=0.1)
+    # Table emptied entirely
+    assert needs_vacuum(300, 0, 0, ratio=0.1)
+
+
+def test_needs_reindex_uses_churn_since_last_rebuild():
+    from document_gc import needs_reindex
+    assert not needs_reindex(0, 0)
+    assert not needs_reindex(2_000, 10_000, ratio=0.3)
+    assert needs_reindex(3_000, 10_000, ratio=0.3)
+
+
+def test_sweep_without_database_is_skipped(monkeypatch):
+    import document_gc
+    monkeypatch.setattr(document_gc, "_get_conn", lambda: None)
+    assert document_gc.sweep() == {"skipped": "no_database"}
+
+
+def test_gc_loop_survives_failed_sweeps(monkeypatch):
+    import document_gc
+    calls = []
+
+    def sweep():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("neon unavailable")
+        return {"rows": 0}
+
+    monkeypatch.setattr(document_gc, "sweep", sweep)
+
+    async def main():
+        task = asyncio.create_task(document_gc.gc_loop(interval_seconds=0.01))
+        for _ in range(200):
+            if len(calls) >= 3:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert len(calls) >= 3
+    assert document_gc.stats()["last_error"] == "ConnectionError: neon unavailable"
+
+
+class _StateConn:
+    """Stands in for a RealDictCursor connection to document_gc_state; error is raised by every execute."""
+
+    def __init__(self, error=None):
+        self.churn, self.error, self.sql = 0, error, []
+
+    def cursor(self):
+        conn = self
+
+        class _Cur:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                if conn.error:
+                    raise conn.error
+                conn.sql.append(sql)
+                conn.churn = 0 if sql.lstrip().startswith("UPDATE") else conn.churn + params[0]
+
+            def fetchone(self):
+                return {"churn_since_reindex": conn.churn}
+
+        return _Cur()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_churn_is_shared_through_the_database(monkeypatch):
+    """Churn lives in document_gc_state, so a restarted process (fresh _stats) continues the count."""
+    import document_gc
+    monkeypatch.setattr(document_gc, "_state_supported", True)
+    monkeypatch.setitem(document_gc._stats, "churn_since_reindex", 0)
+    conn = _StateConn()
+    assert document_gc._add_churn(conn, 400) == 400
+    monkeypatch.setitem(document_gc._stats, "churn_since_reindex", 0)  # restart
+    assert document_gc._add_churn(conn, 100) == 500
+    document_gc._reset_churn(conn)
+    assert document_gc._add_churn(conn, 0) == 0
+
+
+def test_churn_falls_back_to_process_count_without_state_table(monkeypatch):
+    psycopg2 = pytest.importorskip("psycopg2")
+    import document_gc
+    monkeypatch.setattr(document_gc, "_state_supported", True)
+    monkeypatch.setitem(document_gc._stats, "churn_since_reindex", 0)
+    conn = _StateConn(error=psycopg2.errors.UndefinedTable("document_gc_state"))
+    assert document_gc._add_churn(conn, 300) == 300
+    assert document_gc._add_churn(conn, 200) == 500
+    assert document_gc._state_supported is False
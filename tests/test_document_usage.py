@@ -0,0 +1,51 @@
+"""Tests for retrieval hit buffering (document_usage.py); database writes are patched, no DB needed."""
+
+import pytest
+
+
+@pytest.fixture
+def usage(monkeypatch):
+    import document_usage
+    monkeypatch.setattr(document_usage, "TRACKING", True)
+    monkeypatch.setattr(document_usage, "_hits_supported", True)
+    monkeypatch.setattr(document_usage, "_pending", {})
+    return document_usage
+
+
+class _FailingConn:
+    def cursor(self):
+        raise ConnectionError("neon unavailable")
+
+    def close(self):
+        pass
+
+
+def test_record_buffers_hits_and_ignores_session_chunks(usage):
+    usage.record("u1", [1, 2, -5])
+    usage.record("u1", [2])
+    assert {k: v[:2] for k, v in usage._pending.items()} == {1: ["u1", 1], 2: ["u1", 2]}
+
+
+def test_record_starts_background_flush_when_buffer_is_full(usage, monkeypatch):
+    started = []
+    monkeypatch.setattr(usage, "MAX_PENDING", 2)
+    monkeypatch.setattr(usage, "_flushing", False)
+    monkeypatch.setattr(usage.threading, "Thread", lambda target, **kw: type("T", (), {"start": lambda self: started.append(target)})())
+    usage.record("u1", [1])
+    assert started == []
+    usage.record("u1", [2, 3])
+    assert started == [usage.flush]
+
+
+def test_failed_flush_keeps_hits_for_next_time(usage, monkeypatch):
+    monkeypatch.setattr(usage, "_get_conn", lambda: _FailingConn())
+    usage.record("u1", [7, 7, 8])
+    assert usage.flush() == 0
+    assert usage._pending[7][1] == 2 and usage._pending[8][1] == 1
+    monkeypatch.setattr(usage, "_get_conn", lambda: None)  # no database: buffered hits are dropped
+    assert usage.flush() == 0
+    assert usage._pending == {}
+
+
+def test_quota_disabled_evicts_nothing(usage):
+    assert usage.enforce_quotas(quota_mb=0) == {"users": {}, "chunks": 0, "bytes": 0}
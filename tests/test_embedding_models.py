@@ -0,0 +1,77 @@
+"""Tests for the active embedding model registry (embedding_models.py); database reads are patched, no DB needed."""
+
+import pytest
+
+
+@pytest.fixture
+def models(monkeypatch):
+    import embedding_models
+    monkeypatch.setattr(embedding_models, "_cache", {})
+    monkeypatch.setattr(embedding_models, "_refreshing", set())
+    return embedding_models
+
+
+class _Conn:
+    """Stands in for a RealDictCursor connection; records how often the row was read."""
+
+    def __init__(self, row):
+        self.row, self.reads = row, 0
+
+    def cursor(self):
+        conn = self
+
+        class _Cur:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                conn.reads += 1
+
+            def fetchone(self):
+                return conn.row
+
+        return _Cur()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_defaults_without_database(models, monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    info = models.active("documents")
+    assert info["model"] == models.DEFAULT_MODEL and info["dim"] == models.EMBEDDING_DIM
+    assert info["location"] == "embedding"
+    assert models.active("memory")["location"] == "long_term_memory"
+
+
+def test_row_is_cached_for_ttl(models, monkeypatch):
+    conn = _Conn({"target": "documents", "model": "new-model", "dim": 384, "location": "embedding", "next_model": None})
+    assert models.active("documents", conn)["model"] == "new-model"
+    assert models.active("documents", conn)["dim"] == 384
+    assert conn.reads == 1
+    monkeypatch.setattr(models, "TTL_SECONDS", 0)
+    models.active("documents", conn)
+    assert conn.reads == 2
+
+
+def test_model_switch_drops_rag_caches(models, monkeypatch):
+    import rag
+    cleared = []
+    monkeypatch.setattr(rag, "_documents_model", "old-model")
+    monkeypatch.setattr(rag, "_vector_storage", ("vector", True))
+    monkeypatch.setattr(rag.query_cache, "clear", lambda: cleared.append("query_cache"))
+    monkeypatch.setattr(rag.vector_cache, "invalidate", lambda user_id=None: cleared.append("vector_cache"))
+    monkeypatch.setattr(rag.session_store, "clear", lambda user_id=None: cleared.append("session_store"))
+    conn = _Conn({"target": "documents", "model": "new-model", "dim": 384, "location": "embedding"})
+    assert rag._embedding_model(conn) == "new-model"
+    assert rag._vector_storage is None
+    assert sorted(cleared) == ["query_cache", "session_store", "vector_cache"]
+    cleared.clear()
+    assert rag._embedding_model(conn) == "new-model"
+    assert cleared == []
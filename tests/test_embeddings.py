@@ -0,0 +1,182 @@
+# Tests for embeddings.py — process-wide embedding model registry (RAG + memory).
+# Unit tests use a fake model; the real-model test runs only when sentence-transformers is installed.
+
+import os
+import threading
+
+import pytest
+
+import embeddings
+
+
+class _FakeModel:
+    def __init__(self, name):
+        self.name = name
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(len(texts))
+        return [[float(len(t))] * 768 for t in texts]
+
+
+@pytest.fixture
+def fake_sentence_transformers(monkeypatch):
+    """Replace SentenceTransformer with a counting fake and reset the registry."""
+    import sys
+    import types
+    created = []
+
+    def _factory(name):
+        created.append(name)
+        return _FakeModel(name)
+
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = _factory
+    monkeypatch.setitem(sys.modules, "sentence_transformers", module)
+    monkeypatch.setattr(embeddings, "_models", {})
+    monkeypatch.setattr(embeddings, "_load_stats", {})
+    monkeypatch.setattr(embeddings, "_executors", {})
+    return created
+
+
+def test_get_model_loads_once(fake_sentence_transformers):
+    """Repeated calls (every agent turn) reuse the same instance."""
+    first = embeddings.get_model()
+    second = embeddings.get_model()
+    assert first is second
+    assert fake_sentence_transformers == [embeddings.DEFAULT_MODEL]
+
+
+def test_get_model_thread_safe(fake_sentence_transformers):
+    """Concurrent first calls (webhook warm-up + first message) load the model only once."""
+    threads = [threading.Thread(target=embeddings.get_model) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert fake_sentence_transformers == [embeddings.DEFAULT_MODEL]
+
+
+def test_warm_up_reports_stats(fake_sentence_transformers):
+    stats = embeddings.warm_up()
+    assert stats["model"] == embeddings.DEFAULT_MODEL
+    assert stats["load_seconds"] >= 0
+    assert "rss_mb" in stats and "first_encode_seconds" in stats
+    assert embeddings.DEFAULT_MODEL in embeddings.load_stats()
+
+
+def test_rag_embedder_uses_registry(fake_sentence_transformers):
+    from rag import _get_embedder
+    assert _get_embedder() is embeddings.get_model()
+
+
+def test_embed_query_and_texts(fake_sentence_transformers):
+    assert embeddings.embed_texts([]) == []
+    vectors = embeddings.embed_texts(["a", "b"])
+    assert len(vectors) == 2 and len(vectors[0]) == embeddings.EMBEDDING_DIM
+    assert len(embeddings.embed_query("hello")) == embeddings.EMBEDDING_DIM
+
+
+def test_memory_store_shares_model(fake_sentence_transformers):
+    """Memory (Qdrant) and RAG embed with one model instance, not two copies."""
+    from memory import QdrantMemoryStore
+    store = QdrantMemoryStore.__new__(QdrantMemoryStore)
+    store._embed("remember this")
+    embeddings.embed_query("rag query")
+    assert fake_sentence_transformers == [embeddings.DEFAULT_MODEL]
+
+
+def test_executor_batches_concurrent_requests(fake_sentence_transformers):
+    """Requests inside the batch window share one encode call; each future gets its own vectors back."""
+    executor = embeddings.EmbeddingExecutor(window_ms=200, max_batch=64, torch_threads=0)
+    futures = [executor.submit(["x" * (i + 1)]) for i in range(10)]
+    results = [f.result(timeout=5) for f in futures]
+    for i, vectors in enumerate(results):
+        assert len(vectors) == 1 and vectors[0][0] == float(i + 1)
+    model = embeddings.get_model()
+    assert sum(model.calls) == 10
+    assert len(model.calls) < 10
+
+
+def test_executor_survives_cancelled_future(fake_sentence_transformers):
+    """A future cancelled while queued is skipped; the worker thread keeps serving later submits."""
+    executor = embeddings.EmbeddingExecutor(window_ms=200, max_batch=64, torch_threads=0)
+    kept = executor.submit(["abc"])
+    cancelled = executor.submit(["abcdef"])
+    assert cancelled.cancel()
+    assert kept.result(timeout=5)[0][0] == 3.0
+    assert executor.submit(["ab"]).result(timeout=5)[0][0] == 2.0
+    assert embeddings.get_model().calls == [1, 1]
+
+
+def test_server_request_cancelled_mid_wait_keeps_executor(fake_sentence_transformers):
+    """embedding_server awaits asyncio.wrap_future(submit()); a cancelled request must not break later ones."""
+    import asyncio
+
+    async def _scenario():
+        executor = embeddings.get_executor()
+        waiting = asyncio.ensure_future(asyncio.wrap_future(executor.submit(["gone"])))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        return await asyncio.wait_for(asyncio.wrap_future(executor.submit(["abcd"])), timeout=5)
+
+    assert asyncio.run(_scenario())[0][0] == 4.0
+
+
+def test_executor_propagates_import_error(monkeypatch):
+    """Missing sentence-transformers surfaces as ImportError from the future (rag.ingest_document relies on it)."""
+    import sys
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)
+    monkeypatch.setattr(embeddings, "_models", {})
+    executor = embeddings.EmbeddingExecutor(torch_threads=0)
+    with pytest.raises(ImportError):
+        executor.submit(["text"]).result(timeout=5)
+
+
+def test_remote_server_roundtrip(fake_sentence_transformers, tmp_path, monkeypatch):
+    """Workers with PA_EMBED_SOCKET embed on the shared server; vectors survive the float32 wire format."""
+    import asyncio
+    import time
+    import embedding_server
+
+    path = str(tmp_path / "embed.sock")
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(embedding_server.serve(path))
+
+    def _run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(path):
+            break
+        time.sleep(0.02)
+    monkeypatch.setenv("PA_EMBED_SOCKET", path)
+    monkeypatch.setattr(embeddings, "_remote_pool", None)
+    vectors = embeddings.embed_texts(["ab", "abcd"])
+    assert [v[0] for v in vectors] == [2.0, 4.0]
+    assert len(vectors[1]) == embeddings.EMBEDDING_DIM
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(timeout=5)
+    assert not os.path.exists(path)
+
+
+def test_remote_falls_back_in_process(fake_sentence_transformers, tmp_path, monkeypatch):
+    """No server listening: embed in-process instead of failing the turn."""
+    monkeypatch.setenv("PA_EMBED_SOCKET", str(tmp_path / "missing.sock"))
+    monkeypatch.setattr(embeddings, "_remote_pool", None)
+    assert embeddings.embed_query("abc")[0] == 3.0
+
+
+def test_onnx_backend_falls_back_to_torch(fake_sentence_transformers):
+    """PA_EMBED_BACKEND=onnx without onnxruntime (fake factory rejects backend=) still yields a working model."""
+    model = embeddings.get_model(backend="onnx")
+    assert model is embeddings.get_model(backend="onnx")
+    stats = embeddings.load_stats()[embeddings.model_key(embeddings.DEFAULT_MODEL, "onnx")]
+    assert stats["backend"] == "torch"
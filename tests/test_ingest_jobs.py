@@ -0,0 +1,59 @@
+"""Tests for the ingestion job queue worker (ingest_jobs.worker_loop); queue functions are patched, no DB needed."""
+
+import asyncio
+
+import pytest
+
+
+def _run_worker(monkeypatch, jobs, process):
+    """Run worker_loop until every queued job has been handed to process; returns released (job_id, error) pairs."""
+    import ingest_jobs
+    pending = list(jobs)
+    released = []
+    monkeypatch.setattr(ingest_jobs, "claim", lambda: pending.pop(0) if pending else None)
+    monkeypatch.setattr(ingest_jobs, "release", lambda job_id, error: released.append((job_id, error)) or True)
+
+    async def main():
+        task = asyncio.create_task(ingest_jobs.worker_loop(process, poll_seconds=0.01))
+        for _ in range(200):
+            if not pending:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    return released
+
+
+def test_worker_processes_jobs_in_claim_order(monkeypatch):
+    seen = []
+
+    async def process(job):
+        seen.append(job["id"])
+
+    released = _run_worker(monkeypatch, [{"id": 1, "attempts": 1}, {"id": 2, "attempts": 1}], process)
+    assert seen == [1, 2]
+    assert released == []
+
+
+def test_worker_requeues_job_when_process_raises(monkeypatch):
+    async def process(job):
+        if job["id"] == 1:
+            raise ConnectionError("telegram download failed")
+
+    released = _run_worker(monkeypatch, [{"id": 1, "attempts": 1}, {"id": 2, "attempts": 1}], process)
+    assert released == [(1, "ConnectionError: telegram download failed")]
+
+
+def test_enqueue_without_database_returns_no_job(monkeypatch):
+    import ingest_jobs
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    assert ingest_jobs.enqueue("chat", "user", "file-id", "a.pdf", update_id=1) == (None, False)
+
+
+def test_notify_without_worker_is_noop():
+    import ingest_jobs
+    ingest_jobs.notify()
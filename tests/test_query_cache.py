@@ -0,0 +1,43 @@
+# Tests for query_cache.py — rag.retrieve result cache with per-user corpus versions.
+
+import pytest
+
+import query_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(query_cache, "ENABLED", True)
+    monkeypatch.setattr(query_cache, "_entries", query_cache.OrderedDict())
+    monkeypatch.setattr(query_cache, "_versions", {})
+
+
+def test_normalized_queries_share_an_entry():
+    query_cache.put("u", "What is the notice period?", 5, "hybrid", [0.1], [{"id": 3}, {"id": 1}], query_cache.version("u"))
+    assert query_cache.get("u", "  what is the NOTICE   period ", 5, "hybrid") == ([0.1], [{"id": 3}, {"id": 1}])
+    assert query_cache.get("u", "what is the notice period", 3, "hybrid") == (None, None)  # limit is part of the key
+    assert query_cache.get("other", "what is the notice period", 5, "hybrid") == (None, None)
+
+
+def test_corpus_change_invalidates_hits_but_keeps_embedding():
+    v = query_cache.version("u")
+    query_cache.put("u", "invoice due", 5, "vector", [0.2], [{"id": 7}], v)
+    query_cache.bump("u")  # ingest / retention update
+    assert query_cache.get("u", "invoice due", 5, "vector") == ([0.2], None)
+
+
+def test_result_computed_during_ingest_is_not_served():
+    v = query_cache.version("u")
+    query_cache.bump("u")  # ingest commits while the search runs
+    query_cache.put("u", "invoice due", 5, "vector", [0.2], [{"id": 7}], v)
+    assert query_cache.get("u", "invoice due", 5, "vector")[1] is None
+
+
+def test_ttl_and_lru(monkeypatch):
+    monkeypatch.setattr(query_cache, "MAX_ENTRIES", 2)
+    for q in ("a", "b", "c"):
+        query_cache.put("u", q, 5, "vector", [0.0], [{"id": 1}], 0)
+    assert query_cache.get("u", "a", 5, "vector") == (None, None)
+    assert query_cache.get("u", "c", 5, "vector")[1] == [{"id": 1}]
+    monkeypatch.setattr(query_cache, "TTL_SECONDS", -1)
+    assert query_cache.get("u", "c", 5, "vector") == (None, None)
@@ -28,3 +28,129 @@ def test_retrieve_with_real_db():
     for item in result:
         assert isinstance(item, str)
         assert len(item) > 0
+
+
+def test_vec_literal_float32_precision():
+    """Vector literals keep float32 precision (what pgvector stores) without full float64 repr."""
+    from rag import _vec_literal
+    literal = _vec_literal([0.1234567891234, -1.0, 3e-8])
+    assert literal == "[0.1234568,-1,3e-08]"
+
+
+def test_chunk_hash_is_content_address():
+    from rag import _chunk_hash
+    assert _chunk_hash("clause 7.3") == _chunk_hash("clause 7.3")
+    assert _chunk_hash("clause 7.3") != _chunk_hash("clause 7.4")
+    assert len(_chunk_hash("x")) == 64
+
+
+def test_chunk_windows_stream_with_resume_point():
+    """Streaming split: last chunk of a window carries into the next; resume_page points at the window to re-parse."""
+    from rag import _iter_chunk_windows
+    windows = [
+        (0, 8, 16, "alpha " * 400),
+        (8, 16, 16, "omega " * 400),
+    ]
+    out = list(_iter_chunk_windows(iter(windows)))
+    chunks = [c for batch, _ in out for c in batch]
+    assert chunks and all(len(c) <= 800 for c in chunks)
+    assert out[0][1]["resume_page"] == 0  # carry from window 0 not yet committed
+    assert out[-1][1] == {"pages_done": 16, "total_pages": 16, "resume_page": 16}
+    assert any("alpha" in c and "omega" in c for c in chunks)  # chunk spans the page boundary
+    # Line-structured pages (the splitter's "\n" separator) must not hand the carry back as its own chunk
+    lines = [(0, 8, 16, "alpha line of text\n" * 60), (8, 16, 16, "omega line of text\n" * 60)]
+    chunks = [c for batch, _ in _iter_chunk_windows(iter(lines)) for c in batch]
+    assert any("alpha" in c and "omega" in c for c in chunks)
+
+
+def test_ordered_map_keeps_order_and_bounds_in_flight():
+    """Parallel PDF parsing yields windows in page order with at most `lookahead` tasks submitted ahead."""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from rag import _ordered_map
+    submitted = []
+
+    def consume(items):
+        for i in items:
+            submitted.append(i)
+            yield i
+
+    def work(i):
+        time.sleep(0.01 * (5 - i % 5))  # later items finish first
+        return i * 10
+
+    with ThreadPoolExecutor(4) as pool:
+        out = []
+        for item, future in _ordered_map(pool, work, consume(range(10)), lookahead=3):
+            assert len(submitted) - len(out) <= 3 + 1  # the window being consumed + lookahead queued behind it
+            out.append((item, future.result()))
+    assert out == [(i, i * 10) for i in range(10)]
+
+
+def test_ordered_map_surfaces_submit_errors_as_futures():
+    from rag import _ordered_map
+
+    class _Broken:
+        def submit(self, fn, item):
+            raise RuntimeError("pool broken")
+
+    results = list(_ordered_map(_Broken(), str, iter([1, 2]), lookahead=2))
+    assert [item for item, _ in results] == [1, 2]
+    assert all(isinstance(f.exception(), RuntimeError) for _, f in results)
+
+
+def _hit(i, content, distance, lexical=False):
+    return {"id": i, "content": content, "distance": distance, "lexical": lexical}
+
+
+def test_select_context_cutoffs_keep_lexical_matches():
+    """[Telegram] Weak vector matches are not injected as document context; full-text matches always are."""
+    from rag import select_context
+    hits = [
+        _hit(1, "notice period is thirty days", 0.30),
+        _hit(2, "termination requires written notice", 0.45),
+        _hit(3, "invoice INV-2291 total", 0.80, lexical=True),
+        _hit(4, "holiday party menu", 0.85),
+    ]
+    assert [h["id"] for h in select_context(hits, 5, min_similarity=0.25)] == [1, 2, 3]
+    assert [h["id"] for h in select_context(hits, 5, relative_cutoff=0.1)] == [1, 3]
+
+
+def test_select_context_mmr_skips_near_duplicates():
+    from rag import select_context
+    clause = "either party may terminate this agreement with thirty days written notice to the other party"
+    hits = [
+        _hit(1, clause, 0.20),
+        _hit(2, clause + " in writing", 0.21),  # overlapping neighbour chunk
+        _hit(3, "the notice must be delivered to the registered office address", 0.30),
+    ]
+    assert [h["id"] for h in select_context(hits, 2)] == [1, 2]
+    assert [h["id"] for h in select_context(hits, 2, mmr_lambda=0.5)] == [1, 3]
+
+
+def test_select_context_token_budget():
+    from rag import select_context
+    hits = [_hit(1, "a" * 400, 0.2), _hit(2, "b" * 400, 0.2), _hit(3, "c" * 40, 0.3)]
+    assert [h["id"] for h in select_context(hits, 5, max_tokens=120)] == [1, 3]  # 100 + 10 tokens
+    assert [h["id"] for h in select_context(hits, 5, max_tokens=10)] == [1]  # best chunk always kept
+
+
+def test_search_sql_follows_vector_storage():
+    """halfvec storage casts the query to halfvec; a binary index picks candidates by Hamming distance, then rescores."""
+    from rag import BINARY_RESCORE_FACTOR, _HYBRID_SQL, _VECTOR_SQL, _sql
+    assert "%(vec)s::vector" in _sql(_VECTOR_SQL, ("vector", False))
+    half = _sql(_VECTOR_SQL, ("halfvec", False))
+    assert "::vector" not in half and "ORDER BY embedding <=> %(vec)s::halfvec" in half
+    binary = _sql(_HYBRID_SQL, ("halfvec", True))
+    assert f"embedding_bq <~> binary_quantize(%(vec)s::halfvec)::bit(768) LIMIT %(candidates)s * {BINARY_RESCORE_FACTOR}" in binary
+    assert "ORDER BY distance LIMIT %(candidates)s" in binary
+
+
+def test_session_hits_merge_by_distance():
+    """Session-document hits interleave with Neon hits by distance; lexical-only Neon hits keep their place."""
+    from rag import _merge_session_hits
+    neon = [_hit(1, "a", 0.2), {"id": 2, "content": "b", "distance": None, "lexical": True}, _hit(3, "c", 0.5)]
+    session = [_hit(-1, "s1", 0.1), _hit(-2, "s2", 0.4)]
+    assert [h["id"] for h in _merge_session_hits(neon, session, 10)] == [-1, 1, 2, -2, 3]
+    assert [h["id"] for h in _merge_session_hits(neon, session, 3)] == [-1, 1, 2]
+    assert [h["id"] for h in _merge_session_hits([], session, 5)] == [-1, -2]
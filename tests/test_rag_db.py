@@ -20,6 +20,13 @@ def conn():
             pass
 
 
+def _cleanup_user(conn, user_id):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM documents WHERE user_id = %s", (user_id,))
+        cur.execute("DELETE FROM document_sources WHERE user_id = %s", (user_id,))
+    conn.commit()
+
+
 def test_neon_connection(conn):
     """Test that we can connect to Neon PostgreSQL."""
     assert conn is not None
@@ -55,7 +62,7 @@ def test_rag_ingest_and_retrieve(conn):
     test_filename = "test_python.txt"
     
     # Ingest
-    status, ids = ingest_document(
+    status, ids, _ = ingest_document(
         bytes_content=test_content,
         user_id=test_user,
         scope="test",
@@ -99,3 +106,201 @@ def test_vector_similarity_search(conn):
     print(f"✅ Vector similarity search found {len(rows)} documents")
     for row in rows:
         print(f"   - Similarity: {row['similarity']:.3f}")
+
+
+def test_hybrid_retrieve_finds_identifier(conn):
+    """Hybrid mode: an exact identifier (invoice number) is found via the lexical ranking."""
+    from rag import ingest_document, retrieve
+    import uuid
+
+    test_user = f"test-hybrid-{uuid.uuid4().hex[:8]}"
+    invoice = f"INV{uuid.uuid4().hex[:6].upper()}"
+    status, ids, _ = ingest_document(
+        bytes_content=f"Invoice {invoice} for consulting services is payable within 30 days.".encode(),
+        user_id=test_user,
+        metadata={"filename": "invoice.txt", "source": "pytest"},
+    )
+    try:
+        assert ids, f"Failed to ingest: {status}"
+        results = retrieve(invoice, user_id=test_user, limit=3, mode="hybrid")
+        assert any(invoice in r for r in results)
+    finally:
+        _cleanup_user(conn, test_user)
+
+
+def test_reingest_reuses_chunks(conn):
+    """Re-sending the same document reuses stored rows (no re-embed, no duplicate rows)."""
+    from rag import embedding_model, ingest_document
+    import uuid
+
+    test_user = f"test-reingest-{uuid.uuid4().hex[:8]}"
+    content = f"Lease agreement {uuid.uuid4().hex}: rent is due on the first day of each month.".encode()
+    try:
+        _, first_ids, _ = ingest_document(bytes_content=content, user_id=test_user, metadata={"filename": "lease.txt"})
+        status, second_ids, _ = ingest_document(bytes_content=content, user_id=test_user, metadata={"filename": "lease.txt"})
+        assert first_ids and second_ids == first_ids
+        assert "already in your documents" in status  # same file: document_sources short-circuit
+        # Same text, different bytes (UTF-8 BOM): parsed again, every chunk reused by content hash
+        status, third_ids, _ = ingest_document(bytes_content=b"\xef\xbb\xbf" + content, user_id=test_user, metadata={"filename": "lease-copy.txt"})
+        assert third_ids == first_ids
+        assert "0 new" in status
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) AS n FROM documents WHERE user_id = %s", (test_user,))
+            assert cur.fetchone()["n"] == len(first_ids)
+            # Inserts record their model, so scripts/migrate_embeddings.py can find rows written with a stale one
+            cur.execute("SELECT DISTINCT metadata->>'embedding_model' AS model FROM documents WHERE user_id = %s", (test_user,))
+            assert [r["model"] for r in cur.fetchall()] == [embedding_model()]
+    finally:
+        _cleanup_user(conn, test_user)
+
+
+def test_document_sources_list_and_delete(conn):
+    """One document_sources row per upload; deleting it removes its chunks but keeps chunks another upload reuses."""
+    from rag import delete_document, ingest_document, list_documents
+    import uuid
+
+    test_user = f"test-sources-{uuid.uuid4().hex[:8]}"
+    shared = f"Shared clause {uuid.uuid4().hex}: notice period is thirty days."
+    try:
+        _, first_ids, _ = ingest_document(bytes_content=shared.encode(), user_id=test_user, metadata={"filename": "a.txt"})
+        _, second_ids, _ = ingest_document(bytes_content=("\ufeff" + shared).encode(), user_id=test_user, metadata={"filename": "b.txt"})
+        docs = {d["filename"]: d for d in list_documents(test_user)}
+        assert set(docs) == {"a.txt", "b.txt"}
+        assert docs["a.txt"]["status"] == "ready" and docs["a.txt"]["chunk_count"] == len(first_ids)
+        assert delete_document(test_user, docs["a.txt"]["id"])["filename"] == "a.txt"
+        assert [d["filename"] for d in list_documents(test_user)] == ["b.txt"]
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) AS n FROM documents WHERE id = ANY(%s)", (second_ids,))
+            assert cur.fetchone()["n"] == len(second_ids)  # moved to b.txt, not cascaded
+        assert delete_document(test_user, docs["b.txt"]["id"]) is not None
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) AS n FROM documents WHERE user_id = %s", (test_user,))
+            assert cur.fetchone()["n"] == 0
+    finally:
+        _cleanup_user(conn, test_user)
+
+
+def test_document_gc_deletes_expired_chunks(conn):
+    """document_gc.sweep removes expired chunks and uploads and leaves permanent ones."""
+    import document_gc
+    from datetime import datetime, timedelta, timezone
+    from rag import ingest_document, list_documents
+    import uuid
+
+    test_user = f"test-gc-{uuid.uuid4().hex[:8]}"
+    past = datetime.now(timezone.utc) - timedelta(days=1)
+    try:
+        _, expired_ids, _ = ingest_document(
+            bytes_content=f"Old memo {uuid.uuid4().hex}: parking moves to level 3.".encode(),
+            user_id=test_user, metadata={"filename": "old.txt"}, expires_at=past,
+        )
+        _, kept_ids, _ = ingest_document(
+            bytes_content=f"Policy {uuid.uuid4().hex}: leave requests need two weeks notice.".encode(),
+            user_id=test_user, metadata={"filename": "policy.txt"},
+        )
+        result = document_gc.sweep(vacuum=False, reindex=False)
+        if result.get("skipped") == "locked":
+            pytest.skip("another process is sweeping")
+        assert result["rows"] >= len(expired_ids) and result["bytes"] > 0
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM documents WHERE user_id = %s", (test_user,))
+            assert sorted(r["id"] for r in cur.fetchall()) == sorted(kept_ids)
+        assert [d["filename"] for d in list_documents(test_user)] == ["policy.txt"]
+    finally:
+        _cleanup_user(conn, test_user)
+
+
+def test_quota_evicts_cold_chunks_first(conn):
+    """Retrieved chunks are counted in document_hits; over quota, never-retrieved chunks are offloaded first."""
+    import document_usage
+    from rag import ingest_document, retrieve_scored
+    import uuid
+
+    test_user = f"test-quota-{uuid.uuid4().hex[:8]}"
+    try:
+        _, cold_ids, _ = ingest_document(
+            bytes_content=f"Cafeteria menu {uuid.uuid4().hex}: soup on Mondays.".encode(),
+            user_id=test_user, metadata={"filename": "menu.txt"},
+        )
+        _, hot_ids, _ = ingest_document(
+            bytes_content=f"Expense policy {uuid.uuid4().hex}: receipts within 30 days.".encode(),
+            user_id=test_user, metadata={"filename": "expenses.txt"},
+        )
+        hits = retrieve_scored("expense policy receipts", test_user, limit=1, mode="vector")
+        assert [h["id"] for h in hits] == hot_ids[:1]
+        assert document_usage.flush() >= 1
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_column_size(d.*) AS bytes FROM documents d WHERE id = %s", (hot_ids[0],))
+            hot_bytes = cur.fetchone()["bytes"]
+        conn.commit()
+        result = document_usage.enforce_quotas(quota_mb=(hot_bytes + 1) / (1024 * 1024), grace_days=0)
+        assert result["users"][test_user][0] == len(cold_ids)
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id FROM documents WHERE user_id = %s AND (expires_at IS NULL OR expires_at > NOW())", (test_user,)
+            )
+            assert [r["id"] for r in cur.fetchall()] == hot_ids
+        conn.commit()
+    finally:
+        _cleanup_user(conn, test_user)
+
+
+def test_reupload_restores_evicted_chunks(conn):
+    """An upload partly offloaded by the quota sweep is ingested again when re-sent, not reported as stored."""
+    from rag import ingest_document
+    import uuid
+
+    test_user = f"test-restore-{uuid.uuid4().hex[:8]}"
+    content = "\n\n".join(f"Section {i} {uuid.uuid4().hex}: " + "policy text " * 60 for i in range(3)).encode()
+    try:
+        _, ids, _ = ingest_document(bytes_content=content, user_id=test_user, metadata={"filename": "policy.txt"})
+        assert len(ids) > 1
+        with conn.cursor() as cur:  # what document_usage.enforce_quotas does to a cold chunk
+            cur.execute("UPDATE documents SET expires_at = NOW() - interval '1 second' WHERE id = %s", (ids[0],))
+        conn.commit()
+        status, again_ids, again_new = ingest_document(bytes_content=content, user_id=test_user, metadata={"filename": "policy.txt"})
+        assert status.startswith("Added") and "1 new" in status
+        assert again_ids[1:] == ids[1:] and len(again_new) == 1 and again_new[0] not in ids
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT count(*) AS n FROM documents WHERE id = ANY(%s) AND (expires_at IS NULL OR expires_at > NOW())",
+                (again_ids,),
+            )
+            assert cur.fetchone()["n"] == len(again_ids)
+        conn.commit()
+        status, _, _ = ingest_document(bytes_content=content, user_id=test_user, metadata={"filename": "policy.txt"})
+        assert "already in your documents" in status
+    finally:
+        _cleanup_user(conn, test_user)
+
+
+def test_week_retention_never_expires_chunks_a_kept_upload_shares(conn):
+    """Re-uploading kept content and replying "week" must not let the sweeper delete the kept upload's chunks."""
+    import document_gc
+    from datetime import datetime, timedelta, timezone
+    from rag import ingest_document, list_documents, update_documents_retention
+    import uuid
+
+    test_user = f"test-retention-{uuid.uuid4().hex[:8]}"
+    shared = f"Handbook {uuid.uuid4().hex}: the office closes at 18:00 on Fridays."
+    elapsed_week = datetime.now(timezone.utc) - timedelta(days=1)  # a "week" reply whose week has passed
+    try:
+        _, kept_ids, kept_new = ingest_document(bytes_content=shared.encode(), user_id=test_user, metadata={"filename": "a.txt"})
+        update_documents_retention(kept_ids, None, kept_new)
+        _, week_ids, week_new = ingest_document(
+            bytes_content=("\ufeff" + shared).encode(), user_id=test_user, metadata={"filename": "b.txt"}
+        )
+        assert week_ids == kept_ids and week_new == []
+        update_documents_retention(week_ids, elapsed_week, week_new)
+        result = document_gc.sweep(vacuum=False, reindex=False)
+        if result.get("skipped") == "locked":
+            pytest.skip("another process is sweeping")
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id FROM documents WHERE user_id = %s AND (expires_at IS NULL OR expires_at > NOW())", (test_user,)
+            )
+            assert sorted(r["id"] for r in cur.fetchall()) == sorted(kept_ids)
+        conn.commit()
+        assert "a.txt" in [d["filename"] for d in list_documents(test_user)]
+    finally:
+        _cleanup_user(conn, test_user)
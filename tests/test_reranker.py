@@ -0,0 +1,60 @@
+# Tests for reranker.py — cross-encoder rerank stage of rag.retrieve_scored (score cache, latency budget).
+
+import time
+
+import pytest
+
+import reranker
+
+
+class _FakeCrossEncoder:
+    """Scores a pair by how many query words the chunk contains; records calls, optionally slow."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.pairs = []
+
+    def predict(self, pairs):
+        time.sleep(self.delay)
+        self.pairs.extend(pairs)
+        return [sum(w in chunk for w in query.split()) for query, chunk in pairs]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = _FakeCrossEncoder()
+    monkeypatch.setattr(reranker, "_model", fake)
+    reranker.clear()
+    yield fake
+    reranker.clear()
+
+
+HITS = [
+    {"id": 1, "content": "holiday schedule", "distance": 0.2},
+    {"id": 2, "content": "notice period is thirty days", "distance": 0.3},
+    {"id": 3, "content": "the notice must be written", "distance": 0.4},
+]
+
+
+def test_rerank_orders_by_score_and_caches_pairs(model):
+    ranked = reranker.rerank("notice period", HITS)
+    assert [h["id"] for h in ranked] == [2, 3, 1]
+    assert ranked[0]["rerank_score"] == 2
+    assert len(model.pairs) == 3
+    # Same query (modulo case/spacing): every pair comes from the cache
+    assert [h["id"] for h in reranker.rerank("Notice  period?", HITS)] == [2, 3, 1]
+    assert len(model.pairs) == 3
+
+
+def test_rerank_over_budget_keeps_search_order(model):
+    model.delay = 0.2
+    assert reranker.rerank("notice period", HITS, budget_ms=20) is None
+    time.sleep(0.3)  # the late scores still fill the cache
+    assert [h["id"] for h in reranker.rerank("notice period", HITS, budget_ms=20)] == [2, 3, 1]
+
+
+def test_rerank_without_model_returns_none(monkeypatch):
+    monkeypatch.setattr(reranker, "_model", None)
+    monkeypatch.setattr(reranker, "warm_up", lambda: None)
+    assert reranker.rerank("notice period", HITS) is None
+    assert reranker.rerank("notice period", []) == []
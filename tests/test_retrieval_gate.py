@@ -0,0 +1,49 @@
+# Tests for retrieval_gate.py — per-turn decision whether call_agent fetches document context.
+
+import pytest
+
+import rag
+import retrieval_gate
+
+
+@pytest.fixture
+def docs(monkeypatch):
+    """Stub the cached per-user chunk count (no DB)."""
+    counts = {"user": 12}
+    monkeypatch.setattr(rag, "document_count", lambda user_id: counts.get(user_id, 0))
+    monkeypatch.setattr(retrieval_gate, "ENABLED", True)
+    return counts
+
+
+@pytest.mark.parametrize("text", ["hi", "Thanks!", "ok 👍", "good morning", "yes", "do it"])
+def test_small_talk_skips(docs, text):
+    assert retrieval_gate.decide(text, "user") == (False, "small_talk")
+
+
+@pytest.mark.parametrize("text", ["list my tasks", "Create a task to call Ben tomorrow", "schedule a meeting with Ana on Friday"])
+def test_tool_commands_skip(docs, text):
+    assert retrieval_gate.decide(text, "user") == (False, "tool_intent")
+
+
+def test_document_mentions_always_retrieve(docs):
+    assert retrieval_gate.decide("thanks, what does the contract say about notice?", "user") == (True, "doc_hint")
+    assert retrieval_gate.decide("send an email summarising the report", "user") == (True, "doc_hint")
+
+
+def test_questions_retrieve_by_default(docs):
+    assert retrieval_gate.decide("When is the office lease up for renewal?", "user") == (True, "default")
+
+
+def test_users_without_documents_skip(docs):
+    assert retrieval_gate.decide("When is the lease up for renewal?", "new-user") == (False, "no_documents")
+
+
+def test_unknown_count_does_not_skip(monkeypatch):
+    monkeypatch.setattr(rag, "document_count", lambda user_id: None)  # DB unavailable
+    assert retrieval_gate.decide("When is the lease up?", "user") == (True, "default")
+
+
+def test_disabled_gate_always_retrieves(docs, monkeypatch):
+    monkeypatch.setattr(retrieval_gate, "ENABLED", False)
+    assert retrieval_gate.decide("hi", "user") == (True, "gate_disabled")
+    assert retrieval_gate.decide("", "user") == (False, "empty")
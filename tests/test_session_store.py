@@ -0,0 +1,52 @@
+# Tests for session_store.py — in-memory per-user session documents (NumPy); no embedding model or Neon needed.
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import session_store
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    monkeypatch.setattr(session_store, "_users", session_store.OrderedDict())
+    monkeypatch.setattr(session_store, "_touched", {})
+
+
+def _add(user="u1", filename="memo.txt", file_hash="h1", vectors=((1, 0), (0, 1))):
+    chunks = [f"{filename} chunk {i}" for i in range(len(vectors))]
+    return session_store.add(user, filename, file_hash, "{}", chunks, [f"{file_hash}-{i}" for i in range(len(chunks))], vectors)
+
+
+def test_search_ranks_by_cosine_with_negative_ids():
+    _add(vectors=[(1, 0), (0.7, 0.7), (0, 1)])
+    hits = session_store.search("u1", [1, 0.1], 2)
+    assert [h["content"] for h in hits] == ["memo.txt chunk 0", "memo.txt chunk 1"]
+    assert all(h["id"] < 0 and h["session"] for h in hits)
+    assert hits[0]["distance"] < hits[1]["distance"]
+    assert session_store.search("other-user", [1, 0], 2) == []
+
+
+def test_same_file_replaces_earlier_upload_and_chunk_cap(monkeypatch):
+    _add()
+    _add()
+    assert len(session_store.documents("u1")) == 1
+    monkeypatch.setattr(session_store, "MAX_CHUNKS", 3)
+    with pytest.raises(ValueError):
+        _add(filename="big.txt", file_hash="h2")
+
+
+def test_documents_expire_after_ttl(monkeypatch):
+    _add()
+    assert session_store.has_documents("u1")
+    monkeypatch.setattr(session_store, "TTL_SECONDS", 0)
+    assert not session_store.has_documents("u1")
+    assert session_store.search("u1", [1, 0], 2) == []
+
+
+def test_pop_removes_document_for_persisting():
+    doc = _add()
+    popped = session_store.pop("u1", doc.doc_id)
+    assert popped is doc and popped.embeddings.shape == (2, 2)
+    assert not session_store.has_documents("u1")
+    assert session_store.pop("u1", doc.doc_id) is None
@@ -0,0 +1,90 @@
+# Tests for vector_cache.py — per-user in-memory vector index (NumPy); Neon loads are replaced by direct inserts.
+
+import math
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import vector_cache
+
+
+def _index(vectors, contents=None, expires=None):
+    n = len(vectors)
+    return vector_cache.UserIndex(
+        np.arange(1, n + 1, dtype=np.int64),
+        contents or [f"chunk {i}" for i in range(n)],
+        np.array(vectors, dtype=np.float32),
+        np.array(expires or [math.inf] * n, dtype=np.float64),
+    )
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(vector_cache, "ENABLED", True)
+    monkeypatch.setattr(vector_cache, "_entries", vector_cache.OrderedDict())
+    monkeypatch.setattr(vector_cache, "_too_large", {})
+    monkeypatch.setattr(vector_cache, "_generation", {})
+    monkeypatch.setattr(vector_cache, "_loading", set())
+    loads = []
+    monkeypatch.setattr(vector_cache.threading, "Thread", lambda target, args, **kw: type("T", (), {"start": lambda self: loads.append(args)})())
+    return loads
+
+
+def test_search_ranks_by_cosine():
+    index = _index([[1, 0], [0.7, 0.7], [0, 1], [-1, 0]])
+    assert index.search([1, 0.1], 2) == ["chunk 0", "chunk 1"]
+    assert index.search([0, 5], 10) == ["chunk 2", "chunk 1", "chunk 0", "chunk 3"]
+
+
+def test_parse_pgvector_text():
+    m = vector_cache._parse_vectors(["[1,2,3]", "[4.5,-1e-3,0]"])
+    assert m.shape == (2, 3) and m[1, 1] == pytest.approx(-0.001)
+
+
+def test_miss_schedules_one_background_load(cache):
+    assert vector_cache.get("u1") is None
+    assert vector_cache.get("u1") is None  # already loading
+    assert cache == [("u1", 0)]
+
+
+def test_hit_after_load_and_invalidate_drops(cache):
+    vector_cache._entries["u1"] = _index([[1, 0]])
+    assert vector_cache.get("u1") is not None
+    vector_cache.invalidate("u1")
+    assert "u1" not in vector_cache._entries
+    assert vector_cache._generation["u1"] == 1
+
+
+def test_expired_chunk_forces_reload(cache):
+    vector_cache._entries["u1"] = _index([[1, 0]], expires=[time.time() - 1])
+    assert vector_cache.get("u1") is None
+    assert cache == [("u1", 0)]
+
+
+def test_lru_eviction_under_budget(cache, monkeypatch):
+    a, b = _index([[1.0] * 256] * 100), _index([[1.0] * 256] * 100)
+    monkeypatch.setattr(vector_cache, "BUDGET_MB", (a.nbytes * 1.5) / (1024 * 1024))
+    with vector_cache._lock:
+        vector_cache._entries["old"] = a
+        vector_cache._entries["new"] = b
+        vector_cache._evict_locked()
+    assert list(vector_cache._entries) == ["new"]
+
+
+def test_similarities_by_id_skips_unknown():
+    index = _index([[1, 0], [0, 1], [-1, 0]])
+    sims = index.similarities([1, 0], [3, 9, 1])
+    assert sims == {3: pytest.approx(-1.0), 1: pytest.approx(1.0)}
+
+
+def test_hybrid_fuses_cached_vector_ranking_with_lexical_rows():
+    import rag
+    index = _index([[1, 0], [0.7, 0.7], [0, 1], [-1, 0]])
+    lexical_rows = [{"id": 4, "content": "chunk 3"}, {"id": 2, "content": "chunk 1"}]
+    hits = rag._fuse_cached(index, [1, 0], lexical_rows, candidates=2, limit=3)
+    # id 2 is in both rankings; id 4 is lexical-only and gets its distance from the index
+    assert [h["id"] for h in hits] == [2, 1, 4]
+    assert [h["lexical"] for h in hits] == [True, False, True]
+    assert hits[2]["distance"] == pytest.approx(2.0)
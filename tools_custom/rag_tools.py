@@ -3,6 +3,7 @@
 import os
 from langchain_core.tools import tool
 
+from rag import delete_document, list_documents
 from rag import retrieve as rag_retrieve
 
 
@@ -31,6 +32,53 @@ def suggest_email_body_from_context(purpose: str, recipient: str = "") -> str:
     return "Suggested points from your documents:\n\n" + "\n\n".join(f"• {c}" for c in chunks)
 
 
+def _describe(doc: dict) -> str:
+    keep = f"until {doc['expires_at']:%Y-%m-%d}" if doc.get("expires_at") else "kept permanently"
+    state = "" if doc.get("status") == "ready" else ", still processing"
+    return f"#{doc['id']} {doc.get('filename') or 'untitled'} ({doc.get('chunk_count') or 0} chunks, {keep}{state})"
+
+
+@tool
+def list_my_documents() -> str:
+    """List the documents the user has uploaded (number, filename, size, retention).
+    Call when the user asks which documents or files they have, or before deleting one."""
+    import session_store
+    user_id = _get_user_id()
+    docs = list_documents(user_id)
+    session_docs = session_store.documents(user_id)
+    if not docs and not session_docs:
+        return "You have no uploaded documents."
+    lines = ["Your documents:"] + [_describe(d) for d in docs] if docs else []
+    if session_docs:
+        lines.append("In memory for this conversation only (reply keep to save):")
+        lines += [f"{d.filename or 'untitled'} ({len(d.chunks)} chunks)" for d in session_docs]
+    return "\n".join(lines)
+
+
+@tool
+def delete_my_document(document: str) -> str:
+    """Delete one uploaded document and all its passages. document is its number from list_my_documents (e.g. "12"
+    or "#12") or its filename. Confirm with the user before calling."""
+    user_id = _get_user_id()
+    ref = document.strip().lstrip("#")
+    docs = list_documents(user_id)
+    if ref.isdigit():
+        matches = [d for d in docs if d["id"] == int(ref)]
+    else:
+        name = ref.lower()
+        matches = [d for d in docs if (d.get("filename") or "").lower() == name] or [
+            d for d in docs if name and name in (d.get("filename") or "").lower()
+        ]
+    if not matches:
+        return f"No document matching {document!r}. Use list_my_documents to see them."
+    if len(matches) > 1:
+        return "Several documents match; ask the user which one:\n" + "\n".join(_describe(d) for d in matches)
+    deleted = delete_document(user_id, matches[0]["id"])
+    if deleted is None:
+        return "Could not delete that document. Try again later."
+    return f"Deleted {deleted.get('filename') or 'the document'} ({deleted.get('chunk_count') or 0} chunks)."
+
+
 def get_rag_tools():
     """Return list of RAG tools for the agent."""
-    return [search_my_documents, suggest_email_body_from_context]
+    return [search_my_documents, suggest_email_body_from_context, list_my_documents, delete_my_document]
@@ -0,0 +1,185 @@
+# Optional per-user in-memory vector index for RAG (rag.retrieve). For users with up to MAX_CHUNKS chunks, their
+# non-expired chunk embeddings are held as one normalised float32 NumPy matrix and ranked with a single
+# matrix-vector product: no Neon vector scan for warm users (hybrid retrieval fuses this ranking with a lexical-only
+# Postgres query). Matrices load lazily in a background thread (the first query still goes to Postgres), live in an
+# LRU bounded by BUDGET_MB, and are dropped when rag ingests or changes retention for the user, when a cached chunk
+# expires, and after TTL_SECONDS (bounds staleness across processes).
+# Enable with PA_RAG_VECTOR_CACHE=1; needs numpy (installed with sentence-transformers).
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+ENABLED = (os.environ.get("PA_RAG_VECTOR_CACHE") or "0").strip() == "1"
+MAX_CHUNKS = int(os.environ.get("PA_RAG_VECTOR_CACHE_MAX_CHUNKS", "20000"))
+BUDGET_MB = float(os.environ.get("PA_RAG_VECTOR_CACHE_MB", "256"))
+TTL_SECONDS = float(os.environ.get("PA_RAG_VECTOR_CACHE_TTL", "600"))
+
+_entries: "OrderedDict[str, UserIndex]" = OrderedDict()
+_too_large: dict[str, float] = {}  # user_id -> time checked; users over MAX_CHUNKS stay on Postgres until TTL
+_generation: dict[str, int] = {}  # bumped by invalidate(); a load started before a bump is discarded
+_loading: set[str] = set()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "invalidations": 0}
+
+
+class UserIndex:
+    """One user's chunks: ids, contents, unit-norm embedding matrix (n x dim) and per-row expiry (epoch, inf = never)."""
+
+    def __init__(self, ids, contents: list[str], matrix, expires):
+        import numpy as np
+        self.ids = ids
+        self.contents = contents
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = (matrix / norms).astype(np.float32, copy=False)
+        self.expires = expires
+        self.next_expiry = float(expires.min()) if len(expires) else math.inf
+        self.loaded_at = time.time()
+        self.nbytes = int(self.matrix.nbytes + ids.nbytes + expires.nbytes + sum(len(c) for c in contents))
+
+    def fresh(self, now: float) -> bool:
+        return now < self.next_expiry and now - self.loaded_at < TTL_SECONDS
+
+    def top_scored(self, query_vector, limit: int) -> list[tuple[int, float]]:
+        """(row position, cosine similarity) of the top-limit chunks, best first (same order as ORDER BY embedding <=> query)."""
+        import numpy as np
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if not len(self.ids) or norm == 0.0 or limit <= 0:
+            return []
+        scores = self.matrix @ (q / norm)
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        return [(int(i), float(scores[i])) for i in top[np.argsort(-scores[top], kind="stable")]]
+
+    def similarities(self, query_vector, ids) -> dict[int, float]:
+        """Cosine similarity to query_vector of the given chunk ids that are in the index (ids are loaded ORDER BY id)."""
+        import numpy as np
+        q = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        wanted = np.asarray(list(ids), dtype=np.int64)
+        if not len(self.ids) or not len(wanted) or norm == 0.0:
+            return {}
+        pos = np.minimum(np.searchsorted(self.ids, wanted), len(self.ids) - 1)
+        found = self.ids[pos] == wanted
+        scores = self.matrix[pos[found]] @ (q / norm)
+        return {int(i): float(s) for i, s in zip(wanted[found], scores)}
+
+    def search(self, query_vector, limit: int) -> list[str]:
+        """Top-limit chunk texts by cosine similarity."""
+        return [self.contents[i] for i, _ in self.top_scored(query_vector, limit)]
+
+
+def _parse_vectors(texts: list[str]):
+    """pgvector text ('[0.1,0.2,...]') rows to an (n x dim) float32 matrix in one parse."""
+    import numpy as np
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    flat = np.array(",".join(t.strip()[1:-1] for t in texts).split(","), dtype=np.float32)
+    return flat.reshape(len(texts), -1)
+
+
+def _load(user_id: str, generation: int) -> None:
+    import numpy as np
+    from rag import _get_conn
+    try:
+        conn = _get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """SELECT id, content, embedding::text AS embedding, EXTRACT(EPOCH FROM expires_at) AS expires
+                       FROM documents
+                       WHERE user_id = %s AND embedding IS NOT NULL AND (expires_at IS NULL OR expires_at > NOW())
+                       ORDER BY id LIMIT %s""",
+                    (user_id, MAX_CHUNKS + 1),
+                )
+                rows = cur.fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+        if len(rows) > MAX_CHUNKS:
+            with _lock:
+                _too_large[user_id] = time.time()
+            return
+        entry = UserIndex(
+            np.array([r["id"] for r in rows], dtype=np.int64),
+            [r["content"] for r in rows],
+            _parse_vectors([r["embedding"] for r in rows]),
+            np.array([float(r["expires"]) if r["expires"] is not None else math.inf for r in rows], dtype=np.float64),
+        )
+        with _lock:
+            if _generation.get(user_id, 0) != generation:
+                return  # invalidated while loading
+            _entries[user_id] = entry
+            _entries.move_to_end(user_id)
+            _stats["loads"] += 1
+            _evict_locked()
+        print(f"[vector_cache] Loaded {len(rows)} chunk(s) for {user_id} ({entry.nbytes / 1e6:.1f} MB)", flush=True)
+    except Exception as e:
+        print(f"[vector_cache] Load failed for {user_id}: {e}", flush=True)
+    finally:
+        with _lock:
+            _loading.discard(user_id)
+
+
+def _evict_locked() -> None:
+    budget = BUDGET_MB * 1024 * 1024
+    total = sum(e.nbytes for e in _entries.values())
+    while _entries and total > budget:
+        _, evicted = _entries.popitem(last=False)
+        total -= evicted.nbytes
+        _stats["evictions"] += 1
+
+
+def get(user_id: str) -> UserIndex | None:
+    """The user's in-memory index when warm and fresh; otherwise None, scheduling a background load."""
+    if not ENABLED:
+        return None
+    now = time.time()
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None and entry.fresh(now):
+            _entries.move_to_end(user_id)
+            _stats["hits"] += 1
+            return entry
+        if entry is not None:
+            del _entries[user_id]  # a chunk expired or TTL passed: reload
+        _stats["misses"] += 1
+        checked = _too_large.get(user_id)
+        if checked is not None and now - checked < TTL_SECONDS:
+            return None
+        if user_id in _loading:
+            return None
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            return None
+        _loading.add(user_id)
+        generation = _generation.get(user_id, 0)
+    threading.Thread(target=_load, args=(user_id, generation), daemon=True, name="vector-cache-load").start()
+    return None
+
+
+def invalidate(user_id: str | None = None) -> None:
+    """Drop cached data for user_id (all users when None). Called by rag after ingest and retention updates."""
+    with _lock:
+        users = list(set(_entries) | set(_too_large) | set(_loading)) if user_id is None else [user_id]
+        for uid in users:
+            _generation[uid] = _generation.get(uid, 0) + 1
+            if _entries.pop(uid, None) is not None:
+                _stats["invalidations"] += 1
+            _too_large.pop(uid, None)
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(
+            _stats,
+            enabled=ENABLED,
+            users=len(_entries),
+            mb=round(sum(e.nbytes for e in _entries.values()) / (1024 * 1024), 1),
+            budget_mb=BUDGET_MB,
+        )